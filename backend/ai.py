@@ -0,0 +1,296 @@
+"""Server-side AI opponent for the line drawing phase
+
+Iterative-deepening alpha-beta (paranoid minimax: the AI against everyone
+else) over a flat encoding of the board: one byte per line and a side count
+per cell, with Zobrist hashing into a transposition table. Available boxes
+are taken greedily without using up depth, moves that hand the opponent a box
+are searched last, and leaves are scored by the chain of boxes the player to
+move can take right away. Boards larger than ``AI_SEARCH_MAX_CELLS`` are
+played greedily instead. Searches run in a process pool so they never block
+the event loop.
+"""
+
+import asyncio
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+from board import EMPTY, PackedBoard
+
+
+EXACT, LOWER, UPPER = 0, 1, 2
+_TT_MAX_ENTRIES = 1 << 20
+# Above this many cells a node costs too much to search in any useful budget
+SEARCH_MAX_CELLS = int(os.environ.get('AI_SEARCH_MAX_CELLS', 400))
+
+
+class _Timeout(Exception):
+    pass
+
+
+class Geometry:
+    """Line/cell incidence for one board size
+
+    Line ``i < h_count`` is horizontal line ``(i % size, i // size)``;
+    the rest are vertical lines laid out like ``PackedBoard.v_lines``.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self.h_count = (size + 1) * size
+        self.line_count = 2 * self.h_count
+
+        line_cells: List[Tuple[int, ...]] = []
+        for y in range(size + 1):
+            for x in range(size):
+                line_cells.append(tuple(cy * size + x for cy in (y - 1, y) if 0 <= cy < size))
+        for y in range(size):
+            for x in range(size + 1):
+                line_cells.append(tuple(y * size + cx for cx in (x - 1, x) if 0 <= cx < size))
+        self.line_cells = line_cells
+
+        cell_lines = [[] for _ in range(size * size)]
+        for line, cells in enumerate(line_cells):
+            for cell in cells:
+                cell_lines[cell].append(line)
+        self.cell_lines = [tuple(lines) for lines in cell_lines]
+
+        rng = random.Random(size)
+        self.zobrist = [rng.getrandbits(64) for _ in range(self.line_count)]
+        self.player_keys = [rng.getrandbits(64) for _ in range(4)]
+
+    def line_coords(self, line: int) -> Tuple[bool, int, int]:
+        if line < self.h_count:
+            return True, line % self.size, line // self.size
+        line -= self.h_count
+        return False, line % (self.size + 1), line // (self.size + 1)
+
+
+@lru_cache(maxsize=None)
+def geometry(size: int) -> Geometry:
+    return Geometry(size)
+
+
+class Searcher:
+    """Alpha-beta search from one position, for one root player"""
+
+    def __init__(self, board: PackedBoard, root_player: int, player_count: int, deadline: float):
+        self.geo = geo = geometry(board.size)
+        self.drawn = bytearray(
+            [owner != EMPTY for owner in board.h_lines] + [owner != EMPTY for owner in board.v_lines]
+        )
+        self.sides = bytearray(len(geo.cell_lines))
+        for cell, lines in enumerate(geo.cell_lines):
+            self.sides[cell] = sum(self.drawn[line] for line in lines)
+        self.remaining = self.drawn.count(0)
+        self.key = 0
+        for line, drawn in enumerate(self.drawn):
+            if drawn:
+                self.key ^= geo.zobrist[line]
+
+        self.root = root_player
+        self.player_count = player_count
+        self.deadline = deadline
+        self.nodes = 0
+        self.tt: Dict[int, Tuple[int, int, int, int]] = {}
+
+    # Board updates
+    def _draw(self, line: int) -> int:
+        """Draw a line and return the number of boxes it completes"""
+        self.drawn[line] = 1
+        self.remaining -= 1
+        self.key ^= self.geo.zobrist[line]
+        gained = 0
+        for cell in self.geo.line_cells[line]:
+            self.sides[cell] += 1
+            if self.sides[cell] == 4:
+                gained += 1
+        return gained
+
+    def _erase(self, line: int):
+        self.drawn[line] = 0
+        self.remaining += 1
+        self.key ^= self.geo.zobrist[line]
+        for cell in self.geo.line_cells[line]:
+            self.sides[cell] -= 1
+
+    def ordered_moves(self, first: int = -1) -> List[int]:
+        """Free lines to search: a single capture if one is available (boxes are
+        taken greedily, in any order), otherwise safe moves before sacrifices"""
+        captures, safe, sacrifices = [], [], []
+        sides, line_cells = self.sides, self.geo.line_cells
+        for line, drawn in enumerate(self.drawn):
+            if drawn:
+                continue
+            counts = [sides[cell] for cell in line_cells[line]]
+            if 3 in counts:
+                captures.append(line)
+            elif line == first:
+                continue
+            elif 2 in counts:
+                sacrifices.append(line)
+            else:
+                safe.append(line)
+        if captures:
+            return [first] if first in captures else captures[:1]
+        moves = safe + sacrifices
+        if first >= 0 and not self.drawn[first]:
+            moves.insert(0, first)
+        return moves
+
+    def _chain_value(self) -> int:
+        """Boxes the player to move can take in a row right now"""
+        taken = []
+        sides, line_cells, cell_lines, drawn = self.sides, self.geo.line_cells, self.geo.cell_lines, self.drawn
+        boxes = 0
+        progress = True
+        while progress:
+            progress = False
+            for cell, count in enumerate(sides):
+                if count == 3:
+                    line = next(line for line in cell_lines[cell] if not drawn[line])
+                    boxes += self._draw(line)
+                    taken.append(line)
+                    progress = True
+        for line in reversed(taken):
+            self._erase(line)
+        return boxes
+
+    # Search
+    def search(self, depth: int, alpha: int, beta: int, player: int) -> int:
+        """Net boxes (root minus opponents) still to be won from this position"""
+        # Every node scans all lines, so the clock is cheap next to it
+        self.nodes += 1
+        if time.monotonic() > self.deadline:
+            raise _Timeout()
+        if self.remaining == 0:
+            return 0
+
+        maximizing = player == self.root
+        key = self.key ^ self.geo.player_keys[player]
+        entry = self.tt.get(key)
+        best_line = -1
+        if entry is not None:
+            entry_depth, value, flag, best_line = entry
+            if entry_depth >= depth:
+                if flag == EXACT:
+                    return value
+                if flag == LOWER and value >= beta:
+                    return value
+                if flag == UPPER and value <= alpha:
+                    return value
+
+        if depth <= 0:
+            chain = self._chain_value()
+            return chain if maximizing else -chain
+
+        original_alpha, original_beta = alpha, beta
+        best = -10 ** 6 if maximizing else 10 ** 6
+        for line in self.ordered_moves(best_line):
+            gained = self._draw(line)
+            if gained:
+                # Captures keep the turn and do not use up depth
+                value = (gained if maximizing else -gained) + self.search(
+                    depth, alpha - gained if maximizing else alpha + gained,
+                    beta - gained if maximizing else beta + gained, player)
+            else:
+                value = self.search(depth - 1, alpha, beta, (player + 1) % self.player_count)
+            self._erase(line)
+
+            if maximizing:
+                if value > best:
+                    best, best_line = value, line
+                alpha = max(alpha, value)
+            else:
+                if value < best:
+                    best, best_line = value, line
+                beta = min(beta, value)
+            if alpha >= beta:
+                break
+
+        if best <= original_alpha:
+            flag = UPPER
+        elif best >= original_beta:
+            flag = LOWER
+        else:
+            flag = EXACT
+        if len(self.tt) >= _TT_MAX_ENTRIES:
+            self.tt.clear()
+        self.tt[key] = (depth, best, flag, best_line)
+        return best
+
+    def best_move(self, max_depth: Optional[int] = None) -> Dict[str, Any]:
+        """Iterative deepening until the deadline or ``max_depth``"""
+        moves = self.ordered_moves()
+        if not moves:
+            raise ValueError("No free lines left")
+        best_line, best_value, completed = moves[0], 0, 0
+        depth = 1
+        try:
+            # A capture is always taken; only a real choice is worth searching
+            while len(moves) > 1 and (max_depth is None or depth <= max_depth):
+                value = self.search(depth, -10 ** 6, 10 ** 6, self.root)
+                entry = self.tt.get(self.key ^ self.geo.player_keys[self.root])
+                if entry is not None and entry[3] >= 0:
+                    best_line = entry[3]
+                best_value, completed = value, depth
+                if depth >= self.remaining:
+                    break
+                depth += 1
+        except _Timeout:
+            pass
+        return self._result(best_line, best_value, completed)
+
+    def greedy_move(self) -> Dict[str, Any]:
+        """A capture if there is one, else a line that gives nothing away"""
+        moves = self.ordered_moves()
+        if not moves:
+            raise ValueError("No free lines left")
+        return self._result(moves[0], 0, 0)
+
+    def _result(self, best_line: int, best_value: int, completed: int) -> Dict[str, Any]:
+        is_horizontal, x, y = self.geo.line_coords(best_line)
+        return {
+            "is_horizontal": is_horizontal,
+            "x": x,
+            "y": y,
+            "value": best_value,
+            "depth": completed,
+            "nodes": self.nodes,
+        }
+
+
+def choose_line(board_bytes: bytes, player_id: int, player_count: int, time_budget: float,
+                max_depth: Optional[int] = None) -> Dict[str, Any]:
+    """Pick a line for ``player_id``; runs in a worker process"""
+    board = PackedBoard.from_bytes(board_bytes)
+    searcher = Searcher(board, player_id, player_count, time.monotonic() + time_budget)
+    if board.size * board.size > SEARCH_MAX_CELLS:
+        return searcher.greedy_move()
+    return searcher.best_move(max_depth)
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=int(os.environ.get('AI_WORKERS', 2)))
+    return _pool
+
+
+def shutdown_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(cancel_futures=True)
+        _pool = None
+
+
+async def find_move(board: PackedBoard, player_id: int, player_count: int, time_budget: float) -> Dict[str, Any]:
+    """Search for a move in the process pool without blocking the event loop"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_pool(), choose_line, board.to_bytes(), player_id, player_count, time_budget)
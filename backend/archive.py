@@ -0,0 +1,129 @@
+"""Background archival of finished and abandoned games
+
+A periodic sweep keeps the hot ``games`` collection down to games that are
+still being played:
+
+- finished games idle for ``finished_after`` seconds, and active games idle
+  for ``stale_after`` seconds, are moved to the archive as a compact record
+  (final score plus the packed move log) and their moves and snapshots are
+  dropped
+- waiting rooms nobody joined within ``waiting_ttl`` seconds are deleted
+- status checks older than ``status_check_ttl`` seconds are deleted
+
+A period or age of 0 disables that part.
+"""
+
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from movelog import pack_moves
+
+
+logger = logging.getLogger(__name__)
+
+
+def archive_record(game: Dict[str, Any], moves, reason: str) -> Dict[str, Any]:
+    """Archived form of a game: who played, the final score and every move"""
+    players = [
+        {"id": p["id"], "element": p["element"], "is_ai": p.get("is_ai", False), "territories": p.get("territories", 0)}
+        for p in game.get("players", [])
+    ]
+    scores = [p["territories"] for p in players]
+    best = max(scores, default=0)
+    winners = [p["id"] for p in players if p["territories"] == best]
+    return {
+        "id": game["id"],
+        "room_code": game.get("room_code"),
+        "map_size": game.get("map_size"),
+        "reason": reason,
+        "game_status": game.get("game_status"),
+        "players": players,
+        "winner": winners[0] if len(winners) == 1 and game.get("game_status") == "finished" else None,
+        "move_count": game.get("move_count", 0),
+        "moves": pack_moves(moves),
+        "created_at": game.get("created_at"),
+        "updated_at": game.get("updated_at"),
+        "archived_at": datetime.utcnow(),
+    }
+
+
+class Archiver:
+    def __init__(self, storage, cache, interval: float = 60, finished_after: float = 3600,
+                 stale_after: float = 7 * 86400, waiting_ttl: float = 1800, status_check_ttl: float = 7 * 86400,
+                 batch_size: int = 100):
+        self.storage = storage
+        self.cache = cache
+        self.interval = interval
+        self.finished_after = finished_after
+        self.stale_after = stale_after
+        self.waiting_ttl = waiting_ttl
+        self.status_check_ttl = status_check_ttl
+        self.batch_size = batch_size
+        self._task: Optional[asyncio.Task] = None
+
+    async def retire(self, listed: Dict[str, Any], reason: str, archive: bool = True) -> bool:
+        """Archive (or just delete) a game unless it changed since it was listed"""
+        game_id = listed["id"]
+        try:
+            return await self._retire(game_id, listed, reason, archive)
+        finally:
+            self.cache.discard_lock(game_id)
+
+    async def _retire(self, game_id: str, listed: Dict[str, Any], reason: str, archive: bool) -> bool:
+        async with self.cache.lock(game_id):
+            await self.cache.flush_game(game_id)
+            game = await self.storage.get_game_summary(game_id)
+            if game is None or (game.get("version") or 0) != (listed.get("version") or 0):
+                return False
+            if archive:
+                moves = await self.storage.list_moves(game_id, 0, game.get("move_count") or 0)
+                await self.storage.save_archive(archive_record(game, moves, reason))
+            if not await self.storage.delete_game(game_id, game.get("version") or 0):
+                # Another worker wrote to it meanwhile; the stale archive record
+                # is replaced whenever the game is archived for good
+                return False
+            self.cache.invalidate(game_id)
+            await self.storage.delete_history(game_id)
+        return True
+
+    async def sweep(self) -> Dict[str, int]:
+        """One pass over every idle category, at most ``batch_size`` games each"""
+        now = datetime.utcnow()
+        counts = {"finished": 0, "abandoned": 0, "expired": 0, "status_checks": 0}
+        passes = (
+            ("finished", self.finished_after, "finished", True),
+            ("active", self.stale_after, "abandoned", True),
+            ("waiting", self.waiting_ttl, "expired", False),
+        )
+        for game_status, idle_seconds, reason, archive in passes:
+            if idle_seconds <= 0:
+                continue
+            games = await self.storage.list_idle_games(
+                game_status, now - timedelta(seconds=idle_seconds), self.batch_size)
+            for game in games:
+                counts[reason] += await self.retire(game, reason, archive)
+        if self.status_check_ttl > 0:
+            counts["status_checks"] = await self.storage.expire_status_checks(
+                now - timedelta(seconds=self.status_check_ttl))
+        return counts
+
+    async def _sweep_forever(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                counts = await self.sweep()
+                if any(counts.values()):
+                    logger.info("Archive sweep: %s", counts)
+            except Exception:
+                logger.exception("Archive sweep failed")
+
+    def start(self):
+        if self.interval > 0 and self._task is None:
+            self._task = asyncio.create_task(self._sweep_forever())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
@@ -0,0 +1,312 @@
+"""Army phase rules: moving armies between cells, combat and reinforcement
+
+Mirrors the army phase of the client (frontend/app/game.tsx):
+
+- a player moves all but one army from an owned cell holding more than one
+  to an adjacent cell (orthogonal; a wind cell also reaches two cells out in
+  a straight line and one cell diagonally)
+- moving onto a neutral or own cell adds the armies there and claims it;
+  attacking an enemy cell takes it if the attack beats the defence, and
+  otherwise the defenders lose as many armies as attacked
+- wind attacks with one extra army, water cells defend with one extra, and
+  fire spreads to the neutral cells around a cell it takes
+- when the turn passes, the next player's pool grows by a third of their
+  territories (at least one) and every cell they own gains an army (two for
+  water); earth first regrows, with a 30% chance per owned earth cell, onto
+  a neutral neighbour
+- holding 60% of the board wins
+
+The randomness of earth regrowth comes from a seed (the move's sequence
+number on the server) so replaying the move log gives the same board.
+
+Moves and reinforcement only touch the cells they change: the board keeps
+owned-cell counts and the earth cells bordering neutral ground up to date,
+and gives every cell its owner's reinforcement lazily (see board.py).
+Queries over the whole board (legal moves, the frontier and the greedy
+choice) are done with NumPy on zero-copy views of the PackedBoard arrays.
+"""
+
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from board import EMPTY, MAX_ARMIES, PackedBoard, element_code
+from engine import IllegalMove
+
+
+FIRE, WATER, EARTH, WIND = (element_code(name) for name in ('fire', 'water', 'earth', 'wind'))
+WIN_SHARE = 0.6
+EARTH_REGROW_CHANCE = 0.3
+
+# (dx, dy) steps a cell can move to, in the client's order
+ORTHOGONAL = ((-1, 0), (1, 0), (0, -1), (0, 1))
+WIND_ONLY = ((-2, 0), (2, 0), (0, -2), (0, 2), (-1, -1), (1, -1), (-1, 1), (1, 1))
+
+
+class ArmyResult(NamedTuple):
+    claimed: Tuple[Tuple[int, int], ...]  # (x, y) of cells the mover newly owns, fire spread included
+    conquered: bool  # the target cell changed hands
+    game_over: bool
+    regrown: Tuple[Tuple[int, int], ...] = ()  # (x, y) of cells earth regrowth gave the next player
+
+
+def winner(territories: Sequence[int], cell_count: int) -> Optional[int]:
+    """Player holding at least WIN_SHARE of the board, if any"""
+    threshold = int(cell_count * WIN_SHARE)
+    for player_id, held in enumerate(territories):
+        if held >= threshold:
+            return player_id
+    return None
+
+
+def move_cells(data: Dict[str, Any]) -> Tuple[int, int, int, int]:
+    """(from_x, from_y, to_x, to_y) of an army move's ``{"from": {x, y}, "to": {x, y}}`` data"""
+    try:
+        source, target = data["from"], data["to"]
+        return int(source["x"]), int(source["y"]), int(target["x"]), int(target["y"])
+    except (KeyError, TypeError, ValueError):
+        raise IllegalMove("Army moves need integer from.x, from.y, to.x and to.y")
+
+
+def neighbor(values: np.ndarray, dx: int, dy: int, fill) -> np.ndarray:
+    """``out[y, x] = values[y + dy, x + dx]``, ``fill`` where that is off the board"""
+    height, width = values.shape
+    out = np.full_like(values, fill)
+    out[max(0, -dy):height - max(0, dy), max(0, -dx):width - max(0, dx)] = \
+        values[max(0, dy):height - max(0, -dy), max(0, dx):width - max(0, -dx)]
+    return out
+
+
+def start_turn(board: PackedBoard, elements: Sequence[Optional[str]], player_id: int, armies: List[int],
+               territories: List[int], seed: int) -> Tuple[Tuple[int, int], ...]:
+    """Reinforce the player whose turn starts after a line move passed it
+
+    The one place the drawing phase applies reinforcement, shared by the
+    server, move-log replay and the simulator; army moves do the same in
+    ``ArmyEngine.end_turn``. ``armies`` (the players' pools) and
+    ``territories`` are updated in place; returns the cells earth regrew.
+    """
+    engine = ArmyEngine(board, elements, armies=armies)
+    regrown = engine.reinforce(player_id, seed)
+    territories[player_id] += len(regrown)
+    armies[:] = engine.armies
+    return regrown
+
+
+def regrowth_rolls(seed: int, draws: np.ndarray, total: int) -> np.ndarray:
+    """Whether each of the given draws of ``rng.random(total) < EARTH_REGROW_CHANCE`` succeeds
+
+    Matches drawing all ``total`` numbers from ``default_rng(seed)`` but
+    skips ahead to the sorted ``draws`` when there are only a few of them
+    (a skip costs about as much as drawing a few hundred numbers).
+    """
+    rng = np.random.default_rng(seed)
+    if len(draws) * 256 > total:
+        return rng.random(total)[draws] < EARTH_REGROW_CHANCE
+    bit_generator = rng.bit_generator
+    rolls = np.empty(len(draws), dtype=bool)
+    position = 0
+    for k, draw in enumerate(draws.tolist()):
+        bit_generator.advance(draw - position)
+        rolls[k] = rng.random() < EARTH_REGROW_CHANCE
+        position = draw + 1
+    return rolls
+
+
+class ArmyEngine:
+    """Applies army moves on a PackedBoard and advances the turn"""
+
+    def __init__(self, board: PackedBoard, elements: Sequence[Optional[str]], current_player: int = 0,
+                 armies: Optional[Sequence[int]] = None):
+        self.board = board
+        self.elements = list(elements)
+        self.current_player = current_player
+        self.armies: List[int] = list(armies) if armies is not None else [3] * len(self.elements)
+
+        # Read-only views; writes go through the board so its indexes stay in sync
+        shape = (board.size, board.size)
+        self.owner = np.frombuffer(board.cell_owner, dtype=np.uint8).reshape(shape)
+        self.element = np.frombuffer(board.cell_element, dtype=np.uint8).reshape(shape)
+
+    @property
+    def player_count(self) -> int:
+        return len(self.elements)
+
+    @property
+    def territories(self) -> List[int]:
+        return [self.board.owned_count(player_id) for player_id in range(self.player_count)]
+
+    @property
+    def winner(self) -> Optional[int]:
+        return winner(self.territories, self.board.size * self.board.size)
+
+    def reach(self, x: int, y: int) -> Tuple[Tuple[int, int], ...]:
+        return ORTHOGONAL + WIND_ONLY if self.element[y, x] == WIND else ORTHOGONAL
+
+    def is_legal(self, player_id: int, from_x: int, from_y: int, to_x: int, to_y: int) -> bool:
+        size = self.board.size
+        return (
+            player_id == self.current_player
+            and 0 <= from_x < size and 0 <= from_y < size
+            and 0 <= to_x < size and 0 <= to_y < size
+            and self.owner[from_y, from_x] == player_id
+            and self.board.armies(from_y * size + from_x) > 1
+            and (to_x - from_x, to_y - from_y) in self.reach(from_x, from_y)
+        )
+
+    def move(self, player_id: int, from_x: int, from_y: int, to_x: int, to_y: int, seed: int = 0) -> ArmyResult:
+        """Move armies, resolve combat, then pass the turn and reinforce the next player"""
+        if not self.is_legal(player_id, from_x, from_y, to_x, to_y):
+            raise IllegalMove(f"Armies cannot move from {from_x}-{from_y} to {to_x}-{to_y} for player {player_id}")
+
+        board = self.board
+        source, target = board.cell_index(from_x, from_y), board.cell_index(to_x, to_y)
+        element = element_code(self.elements[player_id])
+        attacking = board.armies(source) - 1
+        if element == WIND:
+            attacking += 1
+        board.set_armies(source, 1)
+
+        claimed = []
+        defender = self.owner[to_y, to_x]
+        if defender == EMPTY or defender == player_id:
+            if defender == EMPTY:
+                claimed.append((to_x, to_y))
+            board.claim(target, player_id, element, board.armies(target) + attacking)
+            conquered = False
+        else:
+            defending = board.armies(target) or 1
+            if self.element[to_y, to_x] == WATER:
+                defending += 1
+            conquered = attacking > defending
+            if conquered:
+                claimed.append((to_x, to_y))
+                board.claim(target, player_id, element, attacking - defending)
+            else:
+                board.set_armies(target, defending - attacking)
+
+        if element == FIRE and (defender == EMPTY or defender == player_id or conquered):
+            claimed.extend(self._spread_fire(to_x, to_y, player_id))
+
+        game_over = self.winner is not None
+        regrown = () if game_over else self.end_turn(seed)
+        return ArmyResult(tuple(claimed), conquered, game_over, regrown)
+
+    def _spread_fire(self, x: int, y: int, player_id: int) -> List[Tuple[int, int]]:
+        spread = []
+        size = self.board.size
+        for dx, dy in ORTHOGONAL:
+            nx, ny = x + dx, y + dy
+            if 0 <= nx < size and 0 <= ny < size and self.owner[ny, nx] == EMPTY:
+                self.board.claim(ny * size + nx, player_id, FIRE, 1)
+                spread.append((nx, ny))
+        return spread
+
+    def end_turn(self, seed: int = 0) -> Tuple[Tuple[int, int], ...]:
+        self.current_player = (self.current_player + 1) % self.player_count
+        return self.reinforce(self.current_player, seed)
+
+    def reinforce(self, player_id: int, seed: int = 0) -> Tuple[Tuple[int, int], ...]:
+        """Start-of-turn growth for a player: army pool, earth regrowth, one army (two for water) per cell
+
+        Returns the (x, y) of the cells earth regrowth claimed. The per-cell
+        armies are given by raising the player's reinforcement total, so this
+        costs the same however much of the board they own.
+        """
+        element = element_code(self.elements[player_id])
+        self.armies[player_id] += max(1, self.board.owned_count(player_id) // 3)
+        regrown = self._regrow_earth(player_id, seed) if element == EARTH else ()
+        self.board.reinforce_cells(player_id, 2 if element == WATER else 1)
+        return regrown
+
+    def _regrow_earth(self, player_id: int, seed: int) -> Tuple[Tuple[int, int], ...]:
+        """Each earth cell tries its neighbours in order and claims the first neutral one it rolls for
+
+        Cells regrow at the same time, so two earth cells rolling for the
+        same neutral cell claim it once. The rolls are those of
+        ``default_rng(seed).random((4, size, size))``, direction first, but
+        only the ones for earth cells that border neutral ground are drawn.
+        """
+        board = self.board
+        size = board.size
+        edges = np.fromiter(board.earth_edges(player_id), dtype=np.intp)
+        if len(edges) == 0:
+            return ()
+        owner = np.frombuffer(board.cell_owner, dtype=np.uint8)
+        ys, xs = np.divmod(edges, size)
+        draws, cells, targets = [], [], []  # every neutral neighbour of an edge cell, by direction
+        for direction, (dx, dy) in enumerate(ORTHOGONAL):
+            tx, ty = xs + dx, ys + dy
+            inside = (tx >= 0) & (tx < size) & (ty >= 0) & (ty < size)
+            target = (ty * size + tx)[inside]
+            neutral = owner[target] == EMPTY
+            draws.append(direction * size * size + edges[inside][neutral])
+            cells.append(edges[inside][neutral])
+            targets.append(target[neutral])
+        draws, cells, targets = np.concatenate(draws), np.concatenate(cells), np.concatenate(targets)
+        order = np.argsort(draws)
+        rolled = regrowth_rolls(seed, draws[order], len(ORTHOGONAL) * size * size)
+
+        # Draws are ordered by direction, so a cell's first success is its first direction that rolled
+        cells, targets = cells[order][rolled], targets[order][rolled]
+        _, first = np.unique(cells, return_index=True)
+        regrown = np.unique(targets[first])
+        board.claim_cells(regrown, player_id, EARTH, 1)
+        return tuple((int(target % size), int(target // size)) for target in regrown)
+
+    # Whole-board queries
+    def cell_armies(self) -> np.ndarray:
+        """Armies of every cell, reinforcement included, as a (size, size) array"""
+        return self.board.effective_armies().reshape(self.board.size, self.board.size)
+
+    def frontier(self, player_id: int) -> np.ndarray:
+        """Mask of the player's cells next to a cell they do not own"""
+        owned = self.owner == player_id
+        exposed = np.zeros_like(owned)
+        for dx, dy in ORTHOGONAL:
+            exposed |= ~neighbor(owned, dx, dy, True)
+        return owned & exposed
+
+    def legal_moves(self, player_id: int) -> np.ndarray:
+        """Every legal move of the player as rows of (from_x, from_y, to_x, to_y)"""
+        if player_id != self.current_player:
+            return np.empty((0, 4), dtype=np.intp)
+        movable = (self.owner == player_id) & (self.cell_armies() > 1)
+        ys, xs = np.nonzero(movable)
+        windy = self.element[ys, xs] == WIND
+        return np.concatenate((
+            self._steps_from(xs, ys, ORTHOGONAL),
+            self._steps_from(xs[windy], ys[windy], WIND_ONLY),
+        ))
+
+    def _steps_from(self, xs: np.ndarray, ys: np.ndarray, steps) -> np.ndarray:
+        """(from_x, from_y, to_x, to_y) for every step from every source that stays on the board"""
+        size = self.board.size
+        offsets = np.array(steps)
+        to_x = xs[:, None] + offsets[:, 0]
+        to_y = ys[:, None] + offsets[:, 1]
+        rows, cols = np.nonzero((to_x >= 0) & (to_x < size) & (to_y >= 0) & (to_y < size))
+        return np.stack((xs[rows], ys[rows], to_x[rows, cols], to_y[rows, cols]), axis=1)
+
+    def best_move(self, player_id: int) -> Optional[Tuple[int, int, int, int]]:
+        """Greedy choice for AI players: the biggest win, else the strongest push into neutral ground"""
+        moves = self.legal_moves(player_id)
+        if len(moves) == 0:
+            return None
+        fx, fy, tx, ty = moves.T
+        armies = self.cell_armies()
+        attacking = armies[fy, fx].astype(np.int64) - 1
+        if element_code(self.elements[player_id]) == WIND:
+            attacking += 1
+        target_owner = self.owner[ty, tx]
+        defending = np.maximum(armies[ty, tx].astype(np.int64), 1) + (self.element[ty, tx] == WATER)
+
+        enemy = (target_owner != EMPTY) & (target_owner != player_id)
+        # Tiers: conquests by margin, then neutral claims by strength, then failing attacks, then regrouping
+        tier = MAX_ARMIES + 1
+        score = np.select(
+            [enemy & (attacking > defending), target_owner == EMPTY, enemy],
+            [2 * tier + attacking - defending, tier + attacking, attacking - defending],
+            default=-tier
+        )
+        return tuple(int(v) for v in moves[int(np.argmax(score))])
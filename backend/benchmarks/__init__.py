@@ -0,0 +1,4 @@
+"""Micro-benchmarks for the Elemental Conquest backend
+
+Run from the backend directory, e.g. ``python -m benchmarks.bench_engine``.
+"""
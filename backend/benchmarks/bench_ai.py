@@ -0,0 +1,58 @@
+"""Search throughput of the AI engine
+
+Builds opening, middle-game and endgame positions on each map size by
+drawing random lines and taking any boxes left open (a forced capture is
+played without searching), then runs a fixed-time search from each and
+reports nodes per second and the depth reached.
+"""
+
+import argparse
+import random
+import time
+
+from ai import Searcher, choose_line
+from board import PackedBoard, all_lines
+from engine import LineEngine
+
+
+SIZES = {'small': 8, 'medium': 10, 'large': 12}
+PHASES = {'opening': 0.1, 'middle': 0.5, 'endgame': 0.85}
+
+
+def position(size: int, fraction: float, rng: random.Random) -> LineEngine:
+    engine = LineEngine(PackedBoard(size), ['fire', 'water'])
+    lines = all_lines(size)
+    rng.shuffle(lines)
+    for is_horizontal, x, y in lines[:int(len(lines) * fraction)]:
+        engine.play(engine.current_player, is_horizontal, x, y)
+    while not engine.game_over:
+        searcher = Searcher(engine.board, engine.current_player, 2, float('inf'))
+        line = searcher.ordered_moves()[0]
+        if all(searcher.sides[cell] < 3 for cell in searcher.geo.line_cells[line]):
+            break
+        engine.play(engine.current_player, *searcher.geo.line_coords(line))
+    return engine
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--budget', type=float, default=1.0, help='seconds per search')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    print(f"{'map':<8}{'phase':<10}{'depth':>6}{'nodes':>10}{'nodes/s':>10}")
+    for name, size in SIZES.items():
+        for phase, fraction in PHASES.items():
+            engine = position(size, fraction, rng)
+            if engine.game_over:
+                continue
+            start = time.perf_counter()
+            result = choose_line(engine.board.to_bytes(), engine.current_player, 2, args.budget)
+            elapsed = time.perf_counter() - start
+            print(f"{name:<8}{phase:<10}{result['depth']:>6}{result['nodes']:>10}"
+                  f"{result['nodes'] / elapsed:>10.0f}")
+
+
+if __name__ == '__main__':
+    main()
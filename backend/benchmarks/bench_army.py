@@ -0,0 +1,82 @@
+"""Army phase cost across board sizes
+
+Fills boards of growing size with two players' territories (about 80% of
+the cells owned, 1-5 armies each) and times the whole-board steps of
+``ArmyEngine``: start-of-turn reinforcement (water, and earth with
+regrowth; both only touch the cells that change), legal move generation, frontier detection and the greedy AI
+choice, plus a complete army move (combat and the next player's
+reinforcement). Reinforcement is also timed as a plain
+Python loop over the cells, the way the client does it, for comparison.
+"""
+
+import argparse
+import random
+
+from army import ArmyEngine
+from benchmarks.timing import timed
+from board import EMPTY, PackedBoard
+
+
+SIZES = {'small': 8, 'medium': 10, 'large': 12, 'xl': 50, 'xxl': 100, 'huge': 200}
+ELEMENTS = ['water', 'earth']
+
+
+def make_board(size: int, rng: random.Random) -> PackedBoard:
+    board = PackedBoard(size)
+    for y in range(size):
+        for x in range(size):
+            if rng.random() < 0.8:
+                owner = rng.randrange(2)
+                board.set_cell(x, y, owner, ELEMENTS[owner], rng.randint(1, 5))
+    return board
+
+
+def reinforce_loop(board: PackedBoard, player_id: int, bonus: int):
+    """Per-cell reinforcement as a Python loop, for reference"""
+    owner, armies = board.cell_owner, board.cell_armies
+    for i in range(board.size * board.size):
+        if owner[i] == player_id:
+            armies[i] = min(armies[i] + bonus, 0xFFFF)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    print(f"{'map':<8}{'cells':>8}{'loop us':>10}{'water us':>10}{'earth us':>10}"
+          f"{'moves us':>10}{'front us':>10}{'ai us':>10}{'move us':>10}")
+    for name, size in SIZES.items():
+        board = make_board(size, rng)
+        engine = ArmyEngine(board, ELEMENTS)
+        moves = timed(lambda i: engine.legal_moves(0), args.repeat)
+        frontier = timed(lambda i: engine.frontier(0), args.repeat)
+        best = timed(lambda i: engine.best_move(0), args.repeat)
+
+        choice = engine.best_move(0)
+
+        # The owned-cell counts and earth edges are built once per board and carried by copies
+        ready = board.copy()
+        ArmyEngine(ready, ELEMENTS).reinforce(1, seed=0)
+
+        def play(i):
+            # Fresh copy each time so the board does not fill up with armies
+            ArmyEngine(ready.copy(), ELEMENTS).move(0, *choice, seed=i)
+        copy_cost = timed(lambda i: ArmyEngine(ready.copy(), ELEMENTS), args.repeat)
+        move = timed(play, args.repeat) - copy_cost
+
+        # Reinforcement changes the board, so it goes last
+        water = timed(lambda i: engine.reinforce(0, seed=i), args.repeat)
+        earth = timed(lambda i: engine.reinforce(1, seed=i), args.repeat)
+        loop = timed(lambda i: reinforce_loop(board, 0, 2), max(1, args.repeat // 10))
+
+        owned = sum(1 for owner in board.cell_owner if owner != EMPTY)
+        assert owned == sum(engine.territories)
+        print(f"{name:<8}{size * size:>8}{loop * 1e6:>10.1f}{water * 1e6:>10.1f}{earth * 1e6:>10.1f}"
+              f"{moves * 1e6:>10.1f}{frontier * 1e6:>10.1f}{best * 1e6:>10.1f}{move * 1e6:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
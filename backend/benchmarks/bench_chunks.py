@@ -0,0 +1,76 @@
+"""Per-move cost of whole games on growing boards with chunked board storage
+
+Plays complete games of random free lines through ``server.apply_move``
+(memory storage, an earth player against a water one, so every turn pass
+reinforces and earth regrows) on boards from the named maps up to 200x200.
+Reports the mean time per move and the board bytes each move writes: the
+changed chunks on chunked boards, the whole blob on boards of one chunk or
+less. Bytes are given as the mean over the game, the mean over its last
+quarter (when most cells are owned) and the largest single write; the
+whole-blob size is printed alongside for comparison.
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import time
+
+os.environ.setdefault('STORAGE_BACKEND', 'memory')
+
+import server  # noqa: E402
+from board import all_lines  # noqa: E402
+
+
+SIZES = ['small', 'large', '32x32', '64x64', '128x128', '200x200']
+
+
+async def play(map_size: str, rng: random.Random):
+    game = await server.open_game(server.CreateGameRequest(
+        element='earth', mode='local', map_size=map_size, player_count=2))
+    for player in game.players:
+        player.is_ai = False
+    size = game.live_board().size
+    lines = all_lines(size)
+    rng.shuffle(lines)
+
+    written = []
+    update_game = server.storage.update_game
+
+    async def measure(game_id, expected_version, fields):
+        written.append(sum(len(value) for key, value in fields.items() if key.startswith('board')))
+        return await update_game(game_id, expected_version, fields)
+
+    server.storage.update_game = measure
+    try:
+        start = time.perf_counter()
+        for is_horizontal, x, y in lines:
+            state = await server.game_cache.get(game.id)
+            await server.apply_move(game.id, server.GameMove(
+                game_id=game.id, player_id=state.current_player, move_type='line',
+                data={'is_horizontal': is_horizontal, 'x': x, 'y': y}))
+        elapsed = time.perf_counter() - start
+    finally:
+        server.storage.update_game = update_game
+    state = await server.game_cache.get(game.id)
+    assert state.game_status == 'finished'
+    late = written[len(written) * 3 // 4:]
+    return (size, len(lines), elapsed / len(lines) * 1000, sum(written) / len(written), sum(late) / len(late),
+            max(written), len(state.board_bytes()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', default=','.join(SIZES), help='comma-separated map sizes')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    print(f"{'map':<10}{'cells':>8}{'moves':>8}{'ms/move':>10}{'mean B':>9}{'late B':>9}{'max B':>9}{'blob B':>9}")
+    for map_size in args.sizes.split(','):
+        size, moves, per_move, mean, late, largest, blob = asyncio.run(play(map_size, rng))
+        print(f"{map_size:<10}{size * size:>8}{moves:>8}{per_move:>10.3f}{mean:>9.0f}{late:>9.0f}{largest:>9}{blob:>9}")
+
+
+if __name__ == '__main__':
+    main()
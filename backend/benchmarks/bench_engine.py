@@ -0,0 +1,51 @@
+"""Per-move cost of the line engine across map sizes
+
+Plays complete random games on each board size and reports the mean cost of
+``LineEngine.apply_line``. The cost should stay flat as the board grows.
+"""
+
+import argparse
+import random
+import time
+
+from board import PackedBoard, all_lines
+from engine import LineEngine
+
+
+SIZES = {'small': 8, 'medium': 10, 'large': 12, 'xl': 50, 'xxl': 200}
+
+
+def play_game(size: int, rng: random.Random) -> tuple:
+    """Play one random game and return (moves, seconds spent in apply_line)"""
+    engine = LineEngine(PackedBoard(size), ['fire', 'water'])
+    lines = all_lines(size)
+    rng.shuffle(lines)
+
+    elapsed = 0
+    for is_horizontal, x, y in lines:
+        start = time.perf_counter_ns()
+        engine.apply_line(engine.current_player, is_horizontal, x, y)
+        elapsed += time.perf_counter_ns() - start
+    assert engine.game_over
+    return len(lines), elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--games', type=int, default=20, help='games per board size')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    print(f"{'map':<8}{'cells':>8}{'moves':>10}{'ns/move':>10}")
+    for name, size in SIZES.items():
+        total_moves = total_ns = 0
+        for _ in range(args.games):
+            moves, elapsed = play_game(size, rng)
+            total_moves += moves
+            total_ns += elapsed
+        print(f"{name:<8}{size * size:>8}{total_moves:>10}{total_ns / total_moves:>10.0f}")
+
+
+if __name__ == '__main__':
+    main()
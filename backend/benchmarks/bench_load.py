@@ -0,0 +1,178 @@
+"""Concurrent load generator for the game API
+
+Simulates ``--games`` full online games at once: each creates a room, looks
+it up by room code, fills the remaining seats through the join endpoint and
+then plays every line on the board in random order, polling status between
+moves. Requests go to ``--base-url`` or, with ``--in-process``, straight to
+the ASGI app (pick a backend with STORAGE_BACKEND, e.g. ``memory``).
+
+    python -m benchmarks.bench_load --in-process --games 50 --out load.json
+    python -m benchmarks.bench_load --base-url http://localhost:8001 --games 200
+
+Reports requests/s and p50/p95/p99 latency per endpoint and writes the same
+numbers, plus the run parameters, to a JSON file for comparing runs.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import random
+import time
+from collections import defaultdict
+from contextlib import AsyncExitStack
+from datetime import datetime
+from typing import Dict, List
+
+import httpx
+
+from benchmarks.timing import percentile
+from board import ELEMENTS, all_lines, parse_map_size
+
+
+class Recorder:
+    """Latency samples per endpoint label"""
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+
+    async def request(self, client: httpx.AsyncClient, label: str, method: str, url: str, **kwargs) -> httpx.Response:
+        start = time.perf_counter()
+        response = await client.request(method, url, **kwargs)
+        self.samples[label].append(time.perf_counter() - start)
+        if response.status_code >= 400:
+            self.errors[label] += 1
+        return response
+
+
+async def play_game(client: httpx.AsyncClient, recorder: Recorder, map_size: str, players: int,
+                    poll_every: int, rng: random.Random):
+    """Create, fill and play one online game to the end"""
+    # Only the host is seated on creation; everyone else comes in through join
+    response = await recorder.request(client, "POST /api/games", "POST", "/api/games", json={
+        "element": ELEMENTS[0], "mode": "online", "map_size": map_size, "player_count": players
+    })
+    response.raise_for_status()
+    game = response.json()
+    game_id, room_code = game["id"], game["room_code"]
+
+    await recorder.request(client, "GET /api/games/room/{room_code}", "GET", f"/api/games/room/{room_code}")
+    for seat in range(1, players):
+        await recorder.request(client, "POST /api/games/{id}/join", "POST", f"/api/games/{game_id}/join",
+                               json={"room_code": room_code, "element": ELEMENTS[seat]})
+
+    lines = all_lines(parse_map_size(map_size))
+    rng.shuffle(lines)
+    current_player = 0
+    for i, (is_horizontal, x, y) in enumerate(lines):
+        if poll_every and i % poll_every == 0:
+            status = await recorder.request(client, "GET /api/games/{id}/status", "GET", f"/api/games/{game_id}/status")
+            current_player = status.json()["current_player"]
+        move = await recorder.request(client, "POST /api/games/{id}/move", "POST", f"/api/games/{game_id}/move", json={
+            "game_id": game_id,
+            "player_id": current_player,
+            "move_type": "line",
+            "data": {"is_horizontal": is_horizontal, "x": x, "y": y}
+        })
+        if move.status_code == 200:
+            current_player = move.json()["current_player"]
+
+    await recorder.request(client, "GET /api/games/{id}", "GET", f"/api/games/{game_id}")
+
+
+async def run(args) -> Dict:
+    recorder = Recorder()
+    rng = random.Random(args.seed)
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+
+    async with AsyncExitStack() as stack:
+        if args.in_process:
+            import server
+            await stack.enter_async_context(server.app.router.lifespan_context(server.app))
+            client = httpx.AsyncClient(transport=httpx.ASGITransport(app=server.app), base_url="http://testserver")
+        else:
+            client = httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=args.timeout)
+        await stack.enter_async_context(client)
+
+        semaphore = asyncio.Semaphore(args.concurrency)
+
+        async def one_game(seed: int):
+            async with semaphore:
+                await play_game(client, recorder, args.map_size, args.players, args.poll_every, random.Random(seed))
+
+        seeds = [rng.getrandbits(32) for _ in range(args.games)]
+        start = time.perf_counter()
+        results = await asyncio.gather(*(one_game(seed) for seed in seeds), return_exceptions=True)
+        elapsed = time.perf_counter() - start
+
+    failed = [result for result in results if isinstance(result, BaseException)]
+    endpoints = {}
+    for label, samples in sorted(recorder.samples.items()):
+        ordered = sorted(samples)
+        endpoints[label] = {
+            "requests": len(ordered),
+            "errors": recorder.errors[label],
+            "rps": len(ordered) / elapsed,
+            "mean_ms": sum(ordered) / len(ordered) * 1000,
+            "p50_ms": percentile(ordered, 0.50) * 1000,
+            "p95_ms": percentile(ordered, 0.95) * 1000,
+            "p99_ms": percentile(ordered, 0.99) * 1000,
+        }
+    total = sum(endpoint["requests"] for endpoint in endpoints.values())
+    return {
+        "started_at": datetime.utcnow().isoformat(),
+        "target": "in-process" if args.in_process else args.base_url,
+        "games": args.games,
+        "failed_games": len(failed),
+        "concurrency": args.concurrency,
+        "map_size": args.map_size,
+        "players": args.players,
+        "poll_every": args.poll_every,
+        "elapsed_s": elapsed,
+        "requests": total,
+        "rps": total / elapsed,
+        "endpoints": endpoints,
+        "first_error": repr(failed[0]) if failed else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent game API load generator")
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument('--base-url', default='http://localhost:8001')
+    target.add_argument('--in-process', action='store_true', help='drive server.app directly over ASGI')
+    parser.add_argument('--games', type=int, default=20)
+    parser.add_argument('--concurrency', type=int, default=None, help='games in flight at once (default: all)')
+    parser.add_argument('--map-size', default='small', help='small, medium, large or <n>x<n>')
+    parser.add_argument('--players', type=int, choices=[2, 3, 4], default=2)
+    parser.add_argument('--poll-every', type=int, default=1, help='moves between status polls (0 disables)')
+    parser.add_argument('--timeout', type=float, default=30.0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', default='load_results.json')
+    args = parser.parse_args()
+    try:
+        parse_map_size(args.map_size)
+    except ValueError as e:
+        parser.error(str(e))
+    args.concurrency = args.concurrency or args.games
+
+    logging.getLogger('httpx').setLevel(logging.WARNING)
+    report = asyncio.run(run(args))
+
+    print(f"{report['games']} games ({report['failed_games']} failed), {report['requests']} requests "
+          f"in {report['elapsed_s']:.2f}s: {report['rps']:.0f} req/s")
+    print(f"{'endpoint':<34}{'count':>8}{'err':>6}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for label, stats in report['endpoints'].items():
+        print(f"{label:<34}{stats['requests']:>8}{stats['errors']:>6}{stats['rps']:>9.0f}"
+              f"{stats['p50_ms']:>9.2f}{stats['p95_ms']:>9.2f}{stats['p99_ms']:>9.2f}")
+    if report['first_error']:
+        print(f"first failure: {report['first_error']}")
+
+    with open(args.out, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"results written to {args.out}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+"""Game lookup latency with a large number of stored games
+
+Seeds ``--games`` games (1M by default) into a scratch database. About 2%
+are open online rooms and 2% active local games without a room code; the
+rest are finished, half of them local and half holding the code of an open
+room, as codes are reused once a game ends. The seeding goes into a scratch
+database of the configured backend, creates the startup indexes
+unless ``--no-indexes`` is given, then times the lookups the API makes:
+by id, by room code, the board-less summary, the waiting-room listing and
+the lobby listing.
+
+    STORAGE_BACKEND=mongo MONGO_URL=mongodb://localhost:27017 \\
+        python -m benchmarks.bench_lookup --games 1000000
+    STORAGE_BACKEND=sqlite python -m benchmarks.bench_lookup --games 200000
+
+The Mongo run uses the ``--db-name`` database (dropped first) and the SQLite
+run a fresh file, never the configured game database.
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from benchmarks.timing import percentile
+from board import ELEMENTS, PackedBoard
+from rooms import room_code_for
+from storage import OPEN_STATUSES, create_storage
+
+
+def make_game(i: int, board: bytes, now: datetime) -> dict:
+    if i % 50 == 0:
+        status, room_code = ("waiting", "active")[i // 50 % 2], room_code_for(i // 50)
+    elif i % 50 == 25:
+        status, room_code = "active", None
+    else:
+        status, room_code = "finished", room_code_for(i // 50) if i % 2 == 0 else None
+    return {
+        "id": f"game-{i:08d}",
+        "room_code": room_code,
+        "players": [
+            {"id": p, "element": ELEMENTS[p], "color": "#ffffff", "is_ai": False, "territories": 0, "armies": 3}
+            for p in range(2)
+        ],
+        "current_player": 0,
+        "game_phase": "drawing",
+        "map_size": "small",
+        "board": board,
+        "grid": [],
+        "horizontal_lines": [],
+        "vertical_lines": [],
+        "created_at": now - timedelta(seconds=i),
+        "updated_at": now - timedelta(seconds=i),
+        "game_status": status,
+        "version": 0,
+        "move_count": 0,
+        "max_players": 4,
+        "open_seats": 2 if status == "waiting" else 0,
+    }
+
+
+async def latencies(fn, keys) -> list:
+    samples = []
+    for key in keys:
+        start = time.perf_counter()
+        await fn(key)
+        samples.append(time.perf_counter() - start)
+    return sorted(samples)
+
+
+async def run(args):
+    storage = create_storage()
+    if storage.name == "mongo":
+        await storage.client.drop_database(args.db_name)
+
+    board = PackedBoard.for_map("small").to_bytes()
+    now = datetime.utcnow()
+    start = time.perf_counter()
+    for first in range(0, args.games, args.batch):
+        await storage.insert_games([make_game(i, board, now) for i in range(first, min(first + args.batch, args.games))])
+    print(f"seeded {args.games} games into {storage.name} in {time.perf_counter() - start:.1f}s")
+    if not args.no_indexes:
+        start = time.perf_counter()
+        await storage.ensure_indexes()
+        print(f"ensure_indexes took {time.perf_counter() - start:.1f}s")
+
+    rng = random.Random(0)
+    ids = [f"game-{rng.randrange(args.games):08d}" for _ in range(args.lookups)]
+    open_codes = [room_code_for(rng.randrange(0, args.games, 50) // 50) for _ in range(args.lookups)]
+    for code in open_codes[:10]:
+        doc = await storage.get_game_by_room(code)
+        assert doc is not None and doc["game_status"] in OPEN_STATUSES, f"room {code} resolved to a closed game"
+
+    async def list_waiting(_):
+        await storage.list_games("waiting", limit=50)
+
+    async def list_lobby(_):
+        await storage.list_open_games("small", limit=50)
+
+    cases = [
+        ("get_game(id)", storage.get_game, ids),
+        ("get_game_by_room(code)", storage.get_game_by_room, open_codes),
+        ("get_game_summary_by_room", storage.get_game_summary_by_room, open_codes),
+        ("get_game_summary(id)", storage.get_game_summary, ids),
+        ("list_games(waiting, 50)", list_waiting, range(max(1, args.lookups // 10))),
+        ("list_open_games(small, 50)", list_lobby, range(max(1, args.lookups // 10))),
+    ]
+    print(f"{'lookup':<28}{'count':>7}{'p50 us':>10}{'p99 us':>10}")
+    for name, fn, keys in cases:
+        samples = await latencies(fn, keys)
+        p50 = percentile(samples, 0.50) * 1e6
+        p99 = percentile(samples, 0.99) * 1e6
+        print(f"{name:<28}{len(samples):>7}{p50:>10.0f}{p99:>10.0f}")
+
+    if storage.name == "mongo":
+        await storage.client.drop_database(args.db_name)
+    await storage.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Game lookup latency at scale")
+    parser.add_argument('--games', type=int, default=1_000_000)
+    parser.add_argument('--lookups', type=int, default=2000)
+    parser.add_argument('--batch', type=int, default=10_000, help='games per insert_games call')
+    parser.add_argument('--no-indexes', action='store_true', help='skip ensure_indexes to measure scans')
+    parser.add_argument('--db-name', default='elemental_conquest_bench')
+    args = parser.parse_args()
+
+    os.environ['DB_NAME'] = args.db_name
+    with tempfile.TemporaryDirectory() as scratch:
+        os.environ['SQLITE_PATH'] = os.path.join(scratch, 'bench.db')
+        asyncio.run(run(args))
+
+
+if __name__ == '__main__':
+    main()
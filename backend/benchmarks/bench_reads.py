@@ -0,0 +1,82 @@
+"""Cost of serving a game read: validated path vs the trusted path
+
+A read has two parts. Loading turns the stored document into a GameState
+(only on a cache miss): ``GameState(**doc)`` validates all of it, while
+``GameState.from_document`` leaves the board lists unvalidated. Responding runs on every read:
+FastAPI's ``response_model`` validation and JSON encoding, versus rendering
+with ``GameResponse`` (orjson). Both are timed per board size and wire
+format, and the JSON bodies are checked to be identical.
+"""
+
+import argparse
+import json
+import os
+
+os.environ.setdefault('STORAGE_BACKEND', 'memory')
+
+from fastapi.responses import JSONResponse  # noqa: E402
+from fastapi.routing import serialize_response  # noqa: E402
+from fastapi.utils import create_response_field  # noqa: E402
+
+from benchmarks.timing import timed  # noqa: E402
+from board import ELEMENTS, GRID_SIZES, PackedBoard  # noqa: E402
+from server import GameResponse, GameState, Player  # noqa: E402
+
+
+def make_document(map_size: str, board_format: str) -> dict:
+    """A stored game with four players and a partly played board"""
+    board = PackedBoard.for_map(map_size)
+    for i in range(0, board.size * board.size, 3):
+        y, x = divmod(i, board.size)
+        board.set_line(True, x, y, i % 4)
+        board.set_cell(x, y, i % 4, ELEMENTS[i % 4], 1 + i % 5)
+    state = GameState(
+        players=[Player(id=i, element=ELEMENTS[i], color='#ffffff', is_ai=False) for i in range(4)],
+        map_size=map_size,
+        board=board.to_bytes(),
+        room_code='ABC123',
+    )
+    doc = state.with_format(board_format).model_dump()
+    doc['_id'] = 'stored-object-id'
+    return doc
+
+
+async def validated_response(state: GameState, field) -> bytes:
+    content = await serialize_response(field=field, response_content=state)
+    return JSONResponse(content).body
+
+
+def trusted_response(state: GameState) -> bytes:
+    return GameResponse(state).body
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=500)
+    args = parser.parse_args()
+
+    import asyncio
+    loop = asyncio.new_event_loop()
+    field = create_response_field(name='response', type_=GameState)
+
+    print(f"{'':<24}{'load (us)':>22}{'respond (us)':>22}")
+    print(f"{'map':<8}{'format':<8}{'bytes':>8}{'validate':>11}{'trusted':>11}{'validate':>11}{'orjson':>11}")
+    for map_size in GRID_SIZES:
+        for board_format in ('packed', 'legacy'):
+            doc = make_document(map_size, board_format)
+            state = GameState.from_document(doc)
+            body = trusted_response(state)
+            assert json.loads(loop.run_until_complete(validated_response(GameState(**doc), field))) == json.loads(body)
+
+            load_validated = timed(lambda i: GameState(**doc), args.repeat) * 1e6
+            load_trusted = timed(lambda i: GameState.from_document(doc), args.repeat) * 1e6
+            respond_validated = timed(lambda i: loop.run_until_complete(validated_response(state, field)),
+                                      args.repeat) * 1e6
+            respond_trusted = timed(lambda i: trusted_response(state), args.repeat) * 1e6
+            print(f"{map_size:<8}{board_format:<8}{len(body):>8}{load_validated:>11.1f}{load_trusted:>11.1f}"
+                  f"{respond_validated:>11.1f}{respond_trusted:>11.1f}")
+    loop.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""Cost of rebuilding a game from its move log
+
+Records a complete random game per map size, then times rebuilding the
+final state the way ``MoveLog.rebuild`` does: decode the nearest snapshot
+and replay the tail, or replay everything from an empty board.
+"""
+
+import argparse
+import random
+
+from benchmarks.timing import timed
+from board import PackedBoard, all_lines
+from engine import LineEngine
+from movelog import replay
+
+
+SIZES = {'small': 8, 'medium': 10, 'large': 12, 'xl': 50}
+ELEMENTS = ['fire', 'water', 'earth', 'wind']
+
+
+def record_game(size: int, players: int, interval: int, rng: random.Random):
+    """Play a random game, returning its move log and {seq: snapshot}"""
+    engine = LineEngine(PackedBoard(size), ELEMENTS[:players])
+    lines = all_lines(size)
+    rng.shuffle(lines)
+
+    moves, snapshots = [], {}
+    for seq, (is_horizontal, x, y) in enumerate(lines, start=1):
+        moves.append({
+            "seq": seq,
+            "player_id": engine.current_player,
+            "move_type": "line",
+            "data": {"is_horizontal": is_horizontal, "x": x, "y": y}
+        })
+        # Same rules as the server, reinforcement on every turn pass included
+        replay(engine, moves[-1:])
+        if seq % interval == 0:
+            snapshots[seq] = (engine.board.to_bytes(), engine.current_player, list(engine.territories))
+    return moves, snapshots, engine.board.to_bytes()
+
+
+def rebuild(size: int, players: int, moves, snapshots, seq: int) -> bytes:
+    base = max((s for s in snapshots if s <= seq), default=0)
+    if base:
+        board, current_player, territories = snapshots[base]
+        engine = LineEngine(PackedBoard.from_bytes(board), ELEMENTS[:players],
+                            current_player=current_player, territories=territories)
+    else:
+        engine = LineEngine(PackedBoard(size), ELEMENTS[:players])
+    replay(engine, moves[base:seq])
+    return engine.board.to_bytes()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--interval', type=int, default=50, help='snapshot every N moves')
+    parser.add_argument('--players', type=int, default=2)
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    print(f"{'map':<8}{'moves':>8}{'full ms':>10}{'snap ms':>10}")
+    for name, size in SIZES.items():
+        moves, snapshots, final = record_game(size, args.players, args.interval, rng)
+        seq = len(moves)
+        assert rebuild(size, args.players, moves, {}, seq) == final
+        assert rebuild(size, args.players, moves, snapshots, seq) == final
+
+        full = timed(lambda i: rebuild(size, args.players, moves, {}, seq), args.repeat) * 1000
+        nearest = timed(lambda i: rebuild(size, args.players, moves, snapshots, seq), args.repeat) * 1000
+        print(f"{name:<8}{seq:>8}{full:>10.3f}{nearest:>10.3f}")
+
+
+if __name__ == '__main__':
+    main()
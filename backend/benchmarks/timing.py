@@ -0,0 +1,19 @@
+"""Timing helpers shared by the benchmarks"""
+
+import time
+from typing import Any, Callable, List
+
+
+def timed(fn: Callable[[int], Any], repeat: int) -> float:
+    """Mean seconds per call of ``fn(i)`` for i in range(repeat)"""
+    start = time.perf_counter()
+    for i in range(repeat):
+        fn(i)
+    return (time.perf_counter() - start) / repeat
+
+
+def percentile(ordered: List[float], fraction: float) -> float:
+    """Sample at ``fraction`` of a sorted list, 0 if it is empty"""
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
@@ -0,0 +1,599 @@
+"""Packed board representation for Elemental Conquest
+
+A board of N x N cells has (N + 1) * N horizontal lines and N * (N + 1)
+vertical lines. Instead of one dict per cell and per line, line ownership,
+cell ownership, cell element and army counts are kept in fixed-width arrays
+and persisted as a single binary blob. The legacy nested-dict layout is only
+rebuilt when a client explicitly asks for it.
+
+Boards larger than one chunk (CHUNK_SIZE x CHUNK_SIZE cells) are persisted
+as one blob per chunk instead, so a move only rewrites the chunks it
+changed and a viewport only reads the chunks it covers. Each line belongs
+to exactly one chunk: a chunk holds the top and left edges of its cells,
+and the chunks along the bottom and right of the board also hold the
+board's bottom and right edges.
+
+Start-of-turn reinforcement adds armies to every cell a player owns, so it
+is not written cell by cell: each player has a running total of the
+reinforcement they were given, each cell remembers that total as it was when
+its armies were last written, and a cell's armies are its stored count plus
+what its owner gained since. Reinforcing a player only bumps their total,
+which chunked boards keep in a small chunk of their own (REINFORCED_KEY).
+"""
+
+import struct
+import sys
+from array import array
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+
+GRID_SIZES = {'small': 8, 'medium': 10, 'large': 12}
+MAX_GRID_SIZE = 200  # custom map sizes are "<n>x<n>" up to this
+CHUNK_SIZE = 16  # cells per side of a stored chunk
+ELEMENTS = ('fire', 'water', 'earth', 'wind')
+
+# Sentinel for "no owner" / "no element" in the byte arrays
+EMPTY = 0xFF
+
+MAX_ARMIES = 0xFFFF  # cell_armies is an unsigned 16-bit array
+PLAYER_SLOTS = 4  # players with a reinforcement total; cell owners are player ids below this
+_EARTH = ELEMENTS.index('earth')
+_BULK_CLAIM = 64  # cells claimed together that are written with NumPy
+
+# Blob header: magic, format version, grid size
+_HEADER = struct.Struct('<2sBH')
+_MAGIC = b'EC'
+_FORMAT_VERSION = 2  # 2 added reinforcement totals and per-cell stamps; 1 is still read
+
+# Chunk blob header: magic, format version, grid size, chunk column, chunk row
+_CHUNK_HEADER = struct.Struct('<2sBHHH')
+_CHUNK_MAGIC = b'EK'
+
+# Stored chunk holding the players' reinforcement totals: magic, format version, grid size, then the totals
+REINFORCED_KEY = 'reinforced'
+_REINFORCED_MAGIC = b'ER'
+
+
+def _array_bytes(values: array) -> bytes:
+    """Little-endian bytes of an array"""
+    if sys.byteorder == 'big':
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _array_from(typecode: str, data: bytes) -> array:
+    values = array(typecode)
+    values.frombytes(data)
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values
+
+
+def element_code(element: Optional[str]) -> int:
+    """Byte code stored for an element; unknown elements are stored as EMPTY"""
+    return ELEMENTS.index(element) if element in ELEMENTS else EMPTY
+
+
+def parse_map_size(map_size: str) -> int:
+    """Number of cells per side for a map size name or a custom "<n>x<n>" size"""
+    if map_size in GRID_SIZES:
+        return GRID_SIZES[map_size]
+    width, _, height = map_size.partition('x')
+    if not (width.isdigit() and width == height and 2 <= int(width) <= MAX_GRID_SIZE):
+        raise ValueError(f"map_size must be one of {', '.join(GRID_SIZES)} or <n>x<n> with 2 <= n <= {MAX_GRID_SIZE}")
+    return int(width)
+
+
+def grid_size_for(map_size: str) -> int:
+    """Number of cells per side for a map size, medium if it is not recognised"""
+    try:
+        return parse_map_size(map_size)
+    except ValueError:
+        return GRID_SIZES['medium']
+
+
+def is_chunked(size: int) -> bool:
+    """Whether a board of this size is persisted as chunks rather than one blob"""
+    return size > CHUNK_SIZE
+
+
+def all_lines(size: int) -> List[Tuple[bool, int, int]]:
+    """Every line of a board as ``(is_horizontal, x, y)``, the horizontal ones first"""
+    lines = [(True, x, y) for y in range(size + 1) for x in range(size)]
+    lines += [(False, x, y) for y in range(size) for x in range(size + 1)]
+    return lines
+
+
+def chunk_key(cx: int, cy: int) -> str:
+    return f'{cx}-{cy}'
+
+
+def cell_chunk(x: int, y: int) -> str:
+    """Key of the chunk holding cell (x, y)"""
+    return chunk_key(x // CHUNK_SIZE, y // CHUNK_SIZE)
+
+
+def line_chunk(size: int, is_horizontal: bool, x: int, y: int) -> str:
+    """Key of the chunk holding line (x, y); bottom and right edge lines go to the last chunks"""
+    if is_horizontal:
+        return chunk_key(x // CHUNK_SIZE, min(y, size - 1) // CHUNK_SIZE)
+    return chunk_key(min(x, size - 1) // CHUNK_SIZE, y // CHUNK_SIZE)
+
+
+def region_chunks(size: int, x: int, y: int, width: int, height: int) -> List[str]:
+    """Keys of the chunks covering the cells of a region, clipped to the board"""
+    x1, y1 = min(x + width, size), min(y + height, size)
+    return [chunk_key(cx, cy)
+            for cy in range(max(y, 0) // CHUNK_SIZE, (y1 - 1) // CHUNK_SIZE + 1)
+            for cx in range(max(x, 0) // CHUNK_SIZE, (x1 - 1) // CHUNK_SIZE + 1)]
+
+
+class PackedBoard:
+    """Board state stored in flat, fixed-width arrays
+
+    Horizontal line (x, y) lives at index ``y * size + x``, vertical line
+    (x, y) at ``y * (size + 1) + x`` and cell (x, y) at ``y * size + x``.
+    Cells are written through ``claim``/``set_armies``, which keep the
+    owned-cell counts and the earth regrowth frontier up to date and can be
+    recorded in a journal to undo and redo them.
+    """
+
+    __slots__ = ('size', 'h_lines', 'v_lines', 'cell_owner', 'cell_element', 'cell_armies', 'cell_stamp',
+                 'reinforced', '_free', '_owned', '_earth_edges', '_journal')
+
+    def __init__(self, size: int):
+        self.size = size
+        self.h_lines = bytearray([EMPTY]) * ((size + 1) * size)
+        self.v_lines = bytearray([EMPTY]) * (size * (size + 1))
+        self.cell_owner = bytearray([EMPTY]) * (size * size)
+        self.cell_element = bytearray([EMPTY]) * (size * size)
+        self.cell_armies = array('H', bytes(2 * size * size))
+        self.cell_stamp = array('I', bytes(4 * size * size))  # owner's reinforcement total when armies were written
+        self.reinforced = array('I', bytes(4 * PLAYER_SLOTS))  # reinforcement each player got so far
+        self._reset()
+
+    def _reset(self):
+        """Forget the derived indexes, e.g. after the arrays were replaced"""
+        self._free: Optional[int] = None
+        self._owned: Optional[List[int]] = None
+        self._earth_edges: Optional[Dict[int, Set[int]]] = None
+        self._journal: Optional[List[Tuple[Callable, Any, Any, Any]]] = None
+
+    @classmethod
+    def for_map(cls, map_size: str) -> 'PackedBoard':
+        return cls(grid_size_for(map_size))
+
+    def copy(self) -> 'PackedBoard':
+        """Independent copy, derived indexes included (the journal is not)"""
+        board = PackedBoard.__new__(PackedBoard)
+        board.size = self.size
+        for name in ('h_lines', 'v_lines', 'cell_owner', 'cell_element', 'cell_armies', 'cell_stamp', 'reinforced'):
+            setattr(board, name, getattr(self, name)[:])
+        board._reset()
+        board._free = self._free
+        if self._owned is not None:
+            board._owned = list(self._owned)
+        if self._earth_edges is not None:
+            board._earth_edges = {player_id: set(cells) for player_id, cells in self._earth_edges.items()}
+        return board
+
+    # Index helpers
+    def h_index(self, x: int, y: int) -> int:
+        return y * self.size + x
+
+    def v_index(self, x: int, y: int) -> int:
+        return y * (self.size + 1) + x
+
+    def cell_index(self, x: int, y: int) -> int:
+        return y * self.size + x
+
+    def has_line(self, is_horizontal: bool, x: int, y: int) -> bool:
+        """Whether (x, y) addresses a line on this board"""
+        if is_horizontal:
+            return 0 <= x < self.size and 0 <= y <= self.size
+        return 0 <= x <= self.size and 0 <= y < self.size
+
+    def line_owner(self, is_horizontal: bool, x: int, y: int) -> Optional[int]:
+        if is_horizontal:
+            owner = self.h_lines[self.h_index(x, y)]
+        else:
+            owner = self.v_lines[self.v_index(x, y)]
+        return None if owner == EMPTY else owner
+
+    def set_line(self, is_horizontal: bool, x: int, y: int, owner: int) -> None:
+        key = (is_horizontal, self.h_index(x, y) if is_horizontal else self.v_index(x, y))
+        lines = self.h_lines if is_horizontal else self.v_lines
+        self._change(self._put_line, key, lines[key[1]], owner)
+
+    def _put_line(self, key: Tuple[bool, int], owner: int):
+        is_horizontal, i = key
+        lines = self.h_lines if is_horizontal else self.v_lines
+        if self._free is not None:
+            self._free += (owner == EMPTY) - (lines[i] == EMPTY)
+        lines[i] = owner
+
+    def free_lines(self) -> int:
+        """Number of lines nobody has drawn yet"""
+        if self._free is None:
+            self._free = self.h_lines.count(EMPTY) + self.v_lines.count(EMPTY)
+        return self._free
+
+    # Cells
+    def armies(self, i: int) -> int:
+        """Armies on cell ``i``, counting the reinforcement its owner got since they were written"""
+        owner = self.cell_owner[i]
+        if owner >= PLAYER_SLOTS:
+            return self.cell_armies[i]
+        return min(self.cell_armies[i] + self.reinforced[owner] - self.cell_stamp[i], MAX_ARMIES)
+
+    def effective_armies(self) -> np.ndarray:
+        """Armies of every cell as ``armies(i)`` counts them, as a flat uint16 array"""
+        owner = np.frombuffer(self.cell_owner, dtype=np.uint8)
+        totals = np.zeros(256, dtype=np.int64)
+        totals[:PLAYER_SLOTS] = self.reinforced
+        # Unowned cells have a zero stamp and total
+        armies = (np.frombuffer(self.cell_armies, dtype=np.uint16) + totals[owner]
+                  - np.frombuffer(self.cell_stamp, dtype=np.uint32))
+        return np.minimum(armies, MAX_ARMIES).astype(np.uint16)
+
+    def claim(self, i: int, owner: int, element: int, armies: int) -> None:
+        """Give cell ``i`` to ``owner`` with an element code and army count"""
+        stamp = self.reinforced[owner] if owner < PLAYER_SLOTS else 0
+        old = (self.cell_owner[i], self.cell_element[i], self.cell_armies[i], self.cell_stamp[i])
+        self._change(self._put_cell, i, old, (owner, element, min(armies, MAX_ARMIES), stamp))
+
+    def claim_cells(self, cells: Iterable[int], owner: int, element: int, armies: int) -> None:
+        """``claim`` for many cells at once, e.g. the ones earth regrowth takes"""
+        cells = np.asarray(cells, dtype=np.intp)
+        if len(cells) < _BULK_CLAIM:
+            for i in cells.tolist():
+                self.claim(i, owner, element, armies)
+            return
+        stamp = self.reinforced[owner] if owner < PLAYER_SLOTS else 0
+        old = tuple(view[cells].copy() for view in self._cell_views())
+        new = (owner, element, min(armies, MAX_ARMIES), stamp)
+        self._change(self._put_cells, cells, old, new)
+
+    def set_armies(self, i: int, armies: int) -> None:
+        self.claim(i, self.cell_owner[i], self.cell_element[i], armies)
+
+    def set_cell(self, x: int, y: int, owner: int, element: Optional[str], army_count: int = 0) -> None:
+        self.claim(self.cell_index(x, y), owner, element_code(element), army_count)
+
+    def reinforce_cells(self, player_id: int, armies: int) -> None:
+        """Add armies to every cell the player owns, by raising their reinforcement total"""
+        self._change(self._put_reinforced, player_id, self.reinforced[player_id],
+                     self.reinforced[player_id] + armies)
+
+    def _put_reinforced(self, player_id: int, total: int):
+        self.reinforced[player_id] = total
+
+    def _put_cell(self, i: int, values: Tuple[int, int, int, int]):
+        owner, element, armies, stamp = values
+        previous = self.cell_owner[i]
+        changed = previous != owner or self.cell_element[i] != element
+        self.cell_owner[i] = owner
+        self.cell_element[i] = element
+        self.cell_armies[i] = armies
+        self.cell_stamp[i] = stamp
+        if not changed:
+            return
+        if self._owned is not None:
+            self._owned[previous] -= 1
+            self._owned[owner] += 1
+        if self._earth_edges is not None:
+            # A cell's owner decides whether its neighbours border neutral ground
+            size = self.size
+            y, x = divmod(i, size)
+            self._refresh_edge(i)
+            for nx, ny in ((x - 1, y), (x + 1, y), (x, y - 1), (x, y + 1)):
+                if 0 <= nx < size and 0 <= ny < size:
+                    self._refresh_edge(ny * size + nx)
+
+    def _cell_views(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        return (np.frombuffer(self.cell_owner, dtype=np.uint8), np.frombuffer(self.cell_element, dtype=np.uint8),
+                np.frombuffer(self.cell_armies, dtype=np.uint16), np.frombuffer(self.cell_stamp, dtype=np.uint32))
+
+    def _put_cells(self, cells: np.ndarray, values):
+        owner = self._cell_views()[0]
+        if self._owned is not None:
+            owned = np.array(self._owned) - np.bincount(owner[cells], minlength=256)
+        for view, value in zip(self._cell_views(), values):
+            view[cells] = value
+        if self._owned is not None:
+            self._owned = (owned + np.bincount(owner[cells], minlength=256)).tolist()
+        # Cheaper to rebuild on next use than to follow cell by cell
+        self._earth_edges = None
+
+    # Derived indexes, built on first use and kept up to date by every write
+    def owned_count(self, player_id: int) -> int:
+        """Number of cells the player owns"""
+        if self._owned is None:
+            self._owned = np.bincount(np.frombuffer(self.cell_owner, dtype=np.uint8), minlength=256).tolist()
+        return self._owned[player_id]
+
+    def earth_edges(self, player_id: int) -> Set[int]:
+        """Indexes of the player's earth cells next to a neutral cell, the ones earth regrowth starts from"""
+        if self._earth_edges is None:
+            size = self.size
+            owner = np.frombuffer(self.cell_owner, dtype=np.uint8).reshape(size, size)
+            element = np.frombuffer(self.cell_element, dtype=np.uint8).reshape(size, size)
+            neutral = owner == EMPTY
+            near = np.zeros_like(neutral)
+            near[:, 1:] |= neutral[:, :-1]
+            near[:, :-1] |= neutral[:, 1:]
+            near[1:] |= neutral[:-1]
+            near[:-1] |= neutral[1:]
+            edges: Dict[int, Set[int]] = {}
+            for i in np.flatnonzero(~neutral & (element == _EARTH) & near).tolist():
+                edges.setdefault(self.cell_owner[i], set()).add(i)
+            self._earth_edges = edges
+        return self._earth_edges.setdefault(player_id, set())
+
+    def _refresh_edge(self, i: int):
+        for cells in self._earth_edges.values():
+            cells.discard(i)
+        owner = self.cell_owner[i]
+        if owner == EMPTY or self.cell_element[i] != _EARTH:
+            return
+        size = self.size
+        y, x = divmod(i, size)
+        if ((x > 0 and self.cell_owner[i - 1] == EMPTY) or (x < size - 1 and self.cell_owner[i + 1] == EMPTY)
+                or (y > 0 and self.cell_owner[i - size] == EMPTY)
+                or (y < size - 1 and self.cell_owner[i + size] == EMPTY)):
+            self._earth_edges.setdefault(owner, set()).add(i)
+
+    # Journal
+    def _change(self, put: Callable[[Any, Any], None], key, old, new):
+        if self._journal is not None:
+            self._journal.append((put, key, old, new))
+        put(key, new)
+
+    def start_journal(self) -> List[Tuple[Callable, Any, Any, Any]]:
+        """Record every following change until ``end_journal``; returns the (growing) record"""
+        self._journal = []
+        return self._journal
+
+    def end_journal(self):
+        self._journal = None
+
+    def undo(self, journal: List[Tuple[Callable, Any, Any, Any]]):
+        """Revert the recorded changes"""
+        for put, key, old, _ in reversed(journal):
+            put(key, old)
+
+    def redo(self, journal: List[Tuple[Callable, Any, Any, Any]]):
+        """Apply the recorded changes again after ``undo``"""
+        for put, key, _, new in journal:
+            put(key, new)
+
+    # Chunks
+    def chunk_keys(self) -> List[str]:
+        """Keys of every stored chunk: the cell chunks, then the reinforcement totals"""
+        return region_chunks(self.size, 0, 0, self.size, self.size) + [REINFORCED_KEY]
+
+    def _chunk_spans(self, cx: int, cy: int, version: int = _FORMAT_VERSION):
+        """(array, start, stop) of every run of the arrays stored in a chunk, in blob order"""
+        size = self.size
+        x0, y0 = cx * CHUNK_SIZE, cy * CHUNK_SIZE
+        x1, y1 = min(x0 + CHUNK_SIZE, size), min(y0 + CHUNK_SIZE, size)
+        if not (0 <= x0 < size and 0 <= y0 < size):
+            raise ValueError(f"Chunk {chunk_key(cx, cy)} is off the board")
+        last_row, last_column = y1 == size, x1 == size
+        for y in range(y0, y1 + last_row):
+            yield self.h_lines, y * size + x0, y * size + x1
+        for y in range(y0, y1):
+            yield self.v_lines, y * (size + 1) + x0, y * (size + 1) + x1 + last_column
+        cells = (self.cell_owner, self.cell_element, self.cell_armies)
+        if version >= 2:
+            cells += (self.cell_stamp,)
+        for values in cells:
+            for y in range(y0, y1):
+                yield values, y * size + x0, y * size + x1
+
+    def chunk_bytes(self, key: str) -> bytes:
+        """Encode one chunk: its lines, then its cells' owners, elements, armies and stamps"""
+        if key == REINFORCED_KEY:
+            return _HEADER.pack(_REINFORCED_MAGIC, _FORMAT_VERSION, self.size) + _array_bytes(self.reinforced)
+        cx, cy = (int(part) for part in key.split('-'))
+        parts = [_CHUNK_HEADER.pack(_CHUNK_MAGIC, _FORMAT_VERSION, self.size, cx, cy)]
+        for values, start, stop in self._chunk_spans(cx, cy):
+            run = values[start:stop]
+            if isinstance(run, array):
+                run = _array_bytes(run)
+            parts.append(run)
+        return b''.join(parts)
+
+    def chunks(self, keys: Optional[Iterable[str]] = None) -> Dict[str, bytes]:
+        """{key: blob} for the given chunks, or for all of them"""
+        return {key: self.chunk_bytes(key) for key in (self.chunk_keys() if keys is None else keys)}
+
+    def load_chunk(self, data: bytes) -> None:
+        """Overwrite the part of the board covered by a chunk blob"""
+        if data[:2] == _REINFORCED_MAGIC:
+            _, version, size = _HEADER.unpack_from(data)
+            if version != _FORMAT_VERSION or size != self.size:
+                raise ValueError("Unsupported chunk encoding")
+            self.reinforced = _array_from('I', data[_HEADER.size:_HEADER.size + 4 * PLAYER_SLOTS])
+            if len(self.reinforced) != PLAYER_SLOTS:
+                raise ValueError("Truncated chunk encoding")
+            self._reset()
+            return
+        magic, version, size, cx, cy = _CHUNK_HEADER.unpack_from(data)
+        if magic != _CHUNK_MAGIC or version not in (1, _FORMAT_VERSION) or size != self.size:
+            raise ValueError("Unsupported chunk encoding")
+        offset = _CHUNK_HEADER.size
+        for values, start, stop in self._chunk_spans(cx, cy, version):
+            if isinstance(values, array):
+                length = values.itemsize * (stop - start)
+                run = _array_from(values.typecode, data[offset:offset + length])
+                offset += length
+            else:
+                run = data[offset:offset + stop - start]
+                offset += stop - start
+            if len(run) != stop - start:
+                raise ValueError("Truncated chunk encoding")
+            values[start:stop] = run
+        self._reset()
+
+    @classmethod
+    def from_chunks(cls, size: int, chunks: Dict[str, bytes]) -> 'PackedBoard':
+        """Board assembled from chunk blobs; chunks that are not given stay empty"""
+        board = cls(size)
+        for data in chunks.values():
+            board.load_chunk(data)
+        return board
+
+    # Serialization
+    def to_bytes(self) -> bytes:
+        """Encode the board as a single binary blob"""
+        return b''.join((
+            _HEADER.pack(_MAGIC, _FORMAT_VERSION, self.size),
+            self.h_lines,
+            self.v_lines,
+            self.cell_owner,
+            self.cell_element,
+            _array_bytes(self.cell_armies),
+            _array_bytes(self.cell_stamp),
+            _array_bytes(self.reinforced),
+        ))
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'PackedBoard':
+        """Decode a blob produced by ``to_bytes``, or by format 1 (no reinforcement totals)"""
+        magic, version, size = _HEADER.unpack_from(data)
+        if magic != _MAGIC or version not in (1, _FORMAT_VERSION):
+            raise ValueError("Unsupported board encoding")
+
+        board = cls.__new__(cls)
+        board.size = size
+        lines = (size + 1) * size
+        cells = size * size
+        offset = _HEADER.size
+        board.h_lines = bytearray(data[offset:offset + lines])
+        offset += lines
+        board.v_lines = bytearray(data[offset:offset + lines])
+        offset += lines
+        board.cell_owner = bytearray(data[offset:offset + cells])
+        offset += cells
+        board.cell_element = bytearray(data[offset:offset + cells])
+        offset += cells
+        board.cell_armies = _array_from('H', data[offset:offset + 2 * cells])
+        offset += 2 * cells
+        if version >= 2:
+            board.cell_stamp = _array_from('I', data[offset:offset + 4 * cells])
+            offset += 4 * cells
+            board.reinforced = _array_from('I', data[offset:offset + 4 * PLAYER_SLOTS])
+        else:
+            board.cell_stamp = array('I', bytes(4 * cells))
+            board.reinforced = array('I', bytes(4 * PLAYER_SLOTS))
+        if len(board.cell_armies) != cells or len(board.cell_stamp) != cells or len(board.reinforced) != PLAYER_SLOTS:
+            raise ValueError("Truncated board encoding")
+        board._reset()
+        return board
+
+    # Legacy JSON layout
+    def to_legacy(self, x0: int = 0, y0: int = 0, width: Optional[int] = None, height: Optional[int] = None
+                  ) -> Tuple[List[List[Dict[str, Any]]], List[List[Dict[str, Any]]], List[List[Dict[str, Any]]]]:
+        """Expand into the nested grid / horizontal_lines / vertical_lines dicts
+
+        A region (x0, y0, width, height) limits the output to those cells and
+        the lines around them; rows and ids keep board coordinates.
+        """
+        size = self.size
+        x1 = size if width is None else min(x0 + width, size)
+        y1 = size if height is None else min(y0 + height, size)
+
+        grid = []
+        for y in range(y0, y1):
+            row = []
+            for x in range(x0, x1):
+                i = y * size + x
+                owner = self.cell_owner[i]
+                element = self.cell_element[i]
+                row.append({
+                    'id': f'{x}-{y}',
+                    'x': x,
+                    'y': y,
+                    'state': 'empty' if owner == EMPTY else 'claimed',
+                    'owner': None if owner == EMPTY else owner,
+                    'army_count': self.armies(i),
+                    'element': None if element == EMPTY else ELEMENTS[element]
+                })
+            grid.append(row)
+
+        horizontal_lines = []
+        for y in range(y0, y1 + 1):
+            row = []
+            for x in range(x0, x1):
+                owner = self.h_lines[y * size + x]
+                row.append({
+                    'id': f'h-{x}-{y}',
+                    'from': {'x': x, 'y': y},
+                    'to': {'x': x + 1, 'y': y},
+                    'state': 'empty' if owner == EMPTY else 'drawn',
+                    'owner': None if owner == EMPTY else owner
+                })
+            horizontal_lines.append(row)
+
+        vertical_lines = []
+        for y in range(y0, y1):
+            row = []
+            for x in range(x0, x1 + 1):
+                owner = self.v_lines[y * (size + 1) + x]
+                row.append({
+                    'id': f'v-{x}-{y}',
+                    'from': {'x': x, 'y': y},
+                    'to': {'x': x, 'y': y + 1},
+                    'state': 'empty' if owner == EMPTY else 'drawn',
+                    'owner': None if owner == EMPTY else owner
+                })
+            vertical_lines.append(row)
+
+        return grid, horizontal_lines, vertical_lines
+
+    @classmethod
+    def from_legacy(cls, grid: List[List[Dict[str, Any]]], horizontal_lines: List[List[Dict[str, Any]]],
+                    vertical_lines: List[List[Dict[str, Any]]]) -> 'PackedBoard':
+        """Pack a board stored in the legacy nested-dict layout"""
+        board = cls(len(grid))
+
+        for row in grid:
+            for cell in row:
+                if cell.get('owner') is not None:
+                    board.set_cell(cell['x'], cell['y'], cell['owner'], cell.get('element'),
+                                   cell.get('army_count') or 0)
+                elif cell.get('army_count'):
+                    board.cell_armies[board.cell_index(cell['x'], cell['y'])] = cell['army_count']
+
+        for is_horizontal, lines in ((True, horizontal_lines), (False, vertical_lines)):
+            for y, row in enumerate(lines):
+                for x, line in enumerate(row):
+                    if line.get('state') == 'drawn' and line.get('owner') is not None:
+                        board.set_line(is_horizontal, x, y, line['owner'])
+
+        return board
+
+
+def board_from_document(doc: Dict[str, Any]) -> PackedBoard:
+    """PackedBoard for a stored game document, chunked, packed or legacy"""
+    if doc.get('board_chunks'):
+        return PackedBoard.from_chunks(grid_size_for(doc.get('map_size', 'medium')), doc['board_chunks'])
+    if doc.get('board') is not None:
+        return PackedBoard.from_bytes(doc['board'])
+    return PackedBoard.from_legacy(doc.get('grid', []), doc.get('horizontal_lines', []),
+                                   doc.get('vertical_lines', []))
+
+
+@lru_cache(maxsize=16)
+def empty_board(size: int) -> Tuple[bytes, Dict[str, bytes]]:
+    """Blob and stored chunks (none unless chunked) of an empty board, shared by new games of that size
+
+    Callers copy the chunk dict before changing it.
+    """
+    board = PackedBoard(size)
+    return board.to_bytes(), board.chunks() if is_chunked(size) else {}
@@ -0,0 +1,328 @@
+"""In-process cache of live games
+
+Keeps recently used GameState objects in a bounded LRU with an idle TTL,
+keyed by game id with a secondary room-code index. Mutations for a game are
+serialized with a per-game asyncio.Lock and persisted either straight away
+(write-through, compare-and-swap on the version) or coalesced and flushed
+in batches by a background task (write-behind).
+"""
+
+import asyncio
+import copy
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from storage import set_path
+
+
+logger = logging.getLogger(__name__)
+
+
+def merge_fields(pending: Dict[str, Any], fields: Dict[str, Any]):
+    """Fold ``$set`` fields into pending ones so no path is the parent of another
+
+    Mongo rejects an update that sets both ``players.1`` and
+    ``players.1.armies``; a later child path is written into the pending
+    parent value instead, and a later parent replaces its pending children.
+    """
+    for path, value in fields.items():
+        parent = next((key for key in pending if path.startswith(key + ".")), None)
+        if parent is not None:
+            merged = copy.deepcopy(pending[parent])
+            set_path(merged, path[len(parent) + 1:], value)
+            pending[parent] = merged
+            continue
+        for key in [key for key in pending if key.startswith(path + ".")]:
+            del pending[key]
+        pending[path] = value
+
+
+class StaleGame(Exception):
+    """The stored game changed underneath the cached copy"""
+
+
+class CacheStats:
+    __slots__ = ("hits", "misses", "evictions", "expirations", "writes", "flushes", "conflicts")
+
+    def __init__(self):
+        for name in self.__slots__:
+            setattr(self, name, 0)
+
+    def as_dict(self) -> Dict[str, int]:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class GameCache:
+    """LRU/TTL cache of GameState objects with per-game locks and write-behind"""
+
+    def __init__(self, storage, factory: Callable[[Dict[str, Any]], Any], max_games: int = 1024,
+                 ttl_seconds: float = 300, write_behind_ms: int = 0, batch_size: int = 100):
+        self.storage = storage
+        self.factory = factory
+        self.max_games = max_games
+        self.ttl_seconds = ttl_seconds
+        self.write_behind_ms = write_behind_ms
+        self.batch_size = batch_size
+        self.stats = CacheStats()
+
+        self._entries: "OrderedDict[str, Tuple[Any, float]]" = OrderedDict()
+        self._rooms: Dict[str, str] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        # game id -> (version last persisted, coalesced $set fields)
+        self._dirty: Dict[str, Tuple[int, Dict[str, Any]]] = {}
+        # Games whose write-behind changes were lost; their next commit raises StaleGame
+        self._lost: Set[str] = set()
+        self._flusher: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+
+    @property
+    def write_behind(self) -> bool:
+        return self.write_behind_ms > 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def lock(self, game_id: str) -> asyncio.Lock:
+        """Lock serializing all mutations of one game"""
+        lock = self._locks.get(game_id)
+        if lock is None:
+            lock = self._locks[game_id] = asyncio.Lock()
+        return lock
+
+    # Reads
+    def _lookup(self, game_id: str):
+        entry = self._entries.get(game_id)
+        if entry is None:
+            return None
+        state, expires_at = entry
+        if expires_at < time.monotonic() and game_id not in self._dirty:
+            self.stats.expirations += 1
+            self._drop(game_id)
+            return None
+        self._entries[game_id] = (state, time.monotonic() + self.ttl_seconds)
+        self._entries.move_to_end(game_id)
+        self.stats.hits += 1
+        return state
+
+    async def get(self, game_id: str):
+        state = self._lookup(game_id)
+        if state is not None:
+            return state
+        self.stats.misses += 1
+        await self._flush_one(game_id)
+        doc = await self.storage.get_game(game_id)
+        return self._put_loaded(doc) if doc else None
+
+    async def get_by_room(self, room_code: str):
+        game_id = self._rooms.get(room_code)
+        if game_id is not None:
+            state = self._lookup(game_id)
+            if state is not None:
+                return state
+        self.stats.misses += 1
+        doc = await self.storage.get_game_by_room(room_code)
+        if doc and doc["id"] in self._dirty:
+            await self._flush_one(doc["id"])
+            doc = await self.storage.get_game(doc["id"])
+        return self._put_loaded(doc) if doc else None
+
+    async def get_summary(self, game_id: str):
+        """Cached game if present, else the stored game without its board (not cached)"""
+        state = self._lookup(game_id)
+        if state is not None:
+            return state
+        self.stats.misses += 1
+        await self._flush_one(game_id)
+        doc = await self.storage.get_game_summary(game_id)
+        return self.factory(doc) if doc else None
+
+    async def get_summaries(self, game_ids) -> Dict[str, Any]:
+        """Games by id: cached ones as they are, the rest fetched without boards in one query (not cached)"""
+        found = {}
+        missing = []
+        for game_id in game_ids:
+            state = self._lookup(game_id)
+            if state is not None:
+                found[game_id] = state
+            else:
+                missing.append(game_id)
+        if missing:
+            self.stats.misses += len(missing)
+            dirty = [game_id for game_id in missing if game_id in self._dirty]
+            if dirty:
+                await self._write([(game_id, self._dirty.pop(game_id)) for game_id in dirty])
+            for doc in await self.storage.get_game_summaries(missing):
+                found[doc["id"]] = self.factory(doc)
+        return found
+
+    async def get_chunks(self, game_id: str, keys):
+        """Cached game if present, else the stored game with only the listed board chunks (not cached)"""
+        state = self._lookup(game_id)
+        if state is not None:
+            return state
+        self.stats.misses += 1
+        await self._flush_one(game_id)
+        doc = await self.storage.get_game_chunks(game_id, keys)
+        return self.factory(doc) if doc else None
+
+    async def get_summary_by_room(self, room_code: str):
+        game_id = self._rooms.get(room_code)
+        if game_id is not None:
+            state = self._lookup(game_id)
+            if state is not None:
+                return state
+        self.stats.misses += 1
+        doc = await self.storage.get_game_summary_by_room(room_code)
+        if doc and doc["id"] in self._dirty:
+            await self._flush_one(doc["id"])
+            doc = await self.storage.get_game_summary(doc["id"])
+        return self.factory(doc) if doc else None
+
+    # Writes
+    def put(self, state):
+        """Insert or replace a game, evicting the least recently used ones if full"""
+        self._entries[state.id] = (state, time.monotonic() + self.ttl_seconds)
+        self._entries.move_to_end(state.id)
+        if state.room_code:
+            self._rooms[state.room_code] = state.id
+        while len(self._entries) > self.max_games:
+            game_id = next(iter(self._entries))
+            self.stats.evictions += 1
+            self._drop(game_id)
+        return state
+
+    def _put_loaded(self, doc: Dict[str, Any]):
+        """Cache a game read from storage, unless a copy at least as new was cached while it loaded"""
+        entry = self._entries.get(doc["id"])
+        if entry is not None and entry[0].version >= (doc.get("version") or 0):
+            return entry[0]
+        return self.put(self.factory(doc))
+
+    def invalidate(self, game_id: str):
+        """Forget a cached game so the next read reloads it"""
+        if game_id in self._entries:
+            self._drop(game_id)
+
+    def invalidate_older(self, game_id: str, version: int):
+        """Forget a cached game if it is older than ``version``, e.g. after another worker wrote it"""
+        entry = self._entries.get(game_id)
+        if entry is not None and entry[0].version < version:
+            self._drop(game_id)
+
+    def discard_lock(self, game_id: str):
+        """Forget the lock of a game that is neither cached nor locked"""
+        lock = self._locks.get(game_id)
+        if lock is not None and not lock.locked() and game_id not in self._entries:
+            del self._locks[game_id]
+
+    def _drop(self, game_id: str):
+        state, _ = self._entries.pop(game_id)
+        if state.room_code and self._rooms.get(state.room_code) == game_id:
+            del self._rooms[state.room_code]
+        lock = self._locks.get(game_id)
+        if lock is not None and not lock.locked():
+            del self._locks[game_id]
+
+    async def commit(self, state, fields: Dict[str, Any], accepted: Optional[Callable[[], None]] = None):
+        """Persist fields of a mutated copy whose version was just bumped by one
+
+        Callers hold ``lock(state.id)``. With write-through the update is
+        compare-and-swapped against the previous version and StaleGame is
+        raised if another writer got there first; with write-behind the
+        fields are merged into the pending batch, unless a flush found that
+        pending changes of the game were lost, which raises StaleGame once.
+        ``accepted`` is called once the write is accepted, right before the
+        copy is cached.
+        """
+        self.stats.writes += 1
+        if state.id in self._lost:
+            self._lost.discard(state.id)
+            self.invalidate(state.id)
+            raise StaleGame(state.id)
+        if self.write_behind:
+            base_version, pending = self._dirty.get(state.id, (state.version - 1, {}))
+            merge_fields(pending, fields)
+            self._dirty[state.id] = (base_version, pending)
+            if accepted is not None:
+                accepted()
+            self.put(state)
+            if len(self._dirty) >= self.batch_size:
+                await self.flush()
+            return
+
+        if not await self.storage.update_game(state.id, state.version - 1, fields):
+            self.stats.conflicts += 1
+            self.invalidate(state.id)
+            raise StaleGame(state.id)
+        if accepted is not None:
+            accepted()
+        self.put(state)
+
+    async def flush_game(self, game_id: str):
+        """Write a game's pending write-behind changes, if any"""
+        await self._flush_one(game_id)
+
+    async def _flush_one(self, game_id: str):
+        if game_id in self._dirty:
+            await self._write([(game_id, self._dirty.pop(game_id))])
+
+    async def flush(self):
+        """Write every pending game in batches"""
+        while self._dirty:
+            batch = []
+            for game_id in list(self._dirty)[:self.batch_size]:
+                batch.append((game_id, self._dirty.pop(game_id)))
+            await self._write(batch)
+
+    async def _write(self, batch: List[Tuple[str, Tuple[int, Dict[str, Any]]]]):
+        updates = [(game_id, base_version, fields) for game_id, (base_version, fields) in batch]
+        async with self._flush_lock:
+            try:
+                lost = await self.storage.update_games(updates)
+            except Exception:
+                # Put the batch back, underneath anything committed meanwhile
+                for game_id, (base_version, fields) in batch:
+                    if game_id in self._dirty:
+                        merge_fields(fields, self._dirty[game_id][1])
+                    self._dirty[game_id] = (base_version, fields)
+                raise
+        self.stats.flushes += 1
+        if lost:
+            # Another writer got there first: what was cached, and anything committed
+            # on top of it since, never made it to storage
+            self.stats.conflicts += len(lost)
+            for game_id in lost:
+                self._dirty.pop(game_id, None)
+                self.invalidate(game_id)
+                self._lost.add(game_id)
+            logger.error("Write-behind flush lost %d of %d game updates to concurrent writers: %s",
+                         len(lost), len(updates), ", ".join(lost))
+
+    async def _flush_forever(self):
+        while True:
+            await asyncio.sleep(self.write_behind_ms / 1000)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Write-behind flush failed")
+
+    def start(self):
+        if self.write_behind and self._flusher is None:
+            self._flusher = asyncio.create_task(self._flush_forever())
+
+    async def stop(self):
+        if self._flusher is not None:
+            self._flusher.cancel()
+            self._flusher = None
+        await self.flush()
+
+    def stats_dict(self) -> Dict[str, Any]:
+        return {
+            **self.stats.as_dict(),
+            "size": len(self._entries),
+            "max_size": self.max_games,
+            "dirty": len(self._dirty),
+            "write_behind_ms": self.write_behind_ms,
+        }
@@ -0,0 +1,135 @@
+"""Dots-and-boxes rules engine for the line drawing phase
+
+The engine works directly on a PackedBoard and only ever looks at the one or
+two cells that share the drawn line, so setting it up and applying a move
+cost the same on any board size. It is independent of the API layer and can
+be driven by the server or by a headless simulator.
+"""
+
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from board import EMPTY, PackedBoard, element_code
+
+
+class IllegalMove(ValueError):
+    """Raised when a line cannot be drawn"""
+
+
+def move_line(data: Dict[str, Any]) -> Tuple[bool, int, int]:
+    """(is_horizontal, x, y) of a line move's ``{"is_horizontal", "x", "y"}`` data"""
+    try:
+        is_horizontal, x, y = data["is_horizontal"], data["x"], data["y"]
+    except (KeyError, TypeError):
+        raise IllegalMove("Line moves need is_horizontal, x and y")
+    if not isinstance(is_horizontal, bool) or type(x) is not int or type(y) is not int:
+        raise IllegalMove("is_horizontal must be a boolean and x and y integers")
+    return is_horizontal, x, y
+
+
+class MoveResult(NamedTuple):
+    captured: Tuple[Tuple[int, int], ...]  # (x, y) of cells completed by the move
+    extra_turn: bool
+    game_over: bool
+
+
+class LineEngine:
+    """Applies line moves and keeps side counts and territory totals in sync"""
+
+    def __init__(self, board: PackedBoard, elements: Sequence[Optional[str]], current_player: int = 0,
+                 territories: Optional[Sequence[int]] = None):
+        self.board = board
+        self.elements = list(elements)
+        self.current_player = current_player
+        self.territories: List[int] = list(territories) if territories is not None else [0] * len(self.elements)
+
+    @property
+    def player_count(self) -> int:
+        return len(self.elements)
+
+    @property
+    def game_over(self) -> bool:
+        # Every cell is enclosed exactly when no line is left to draw
+        return self.board.free_lines() == 0
+
+    def side_count(self, i: int) -> int:
+        """Number of drawn sides of the cell at index ``i``"""
+        board, size = self.board, self.board.size
+        y, x = divmod(i, size)
+        return ((board.h_lines[i] != EMPTY) + (board.h_lines[i + size] != EMPTY)
+                + (board.v_lines[y * (size + 1) + x] != EMPTY) + (board.v_lines[y * (size + 1) + x + 1] != EMPTY))
+
+    def adjacent_cells(self, is_horizontal: bool, x: int, y: int) -> Tuple[Tuple[int, int], ...]:
+        """Cells bordered by a line: above/below a horizontal one, left/right of a vertical one"""
+        size = self.board.size
+        if is_horizontal:
+            candidates = ((x, y - 1), (x, y))
+        else:
+            candidates = ((x - 1, y), (x, y))
+        return tuple((cx, cy) for cx, cy in candidates if 0 <= cx < size and 0 <= cy < size)
+
+    def is_legal(self, player_id: int, is_horizontal: bool, x: int, y: int) -> bool:
+        # A free line means the game is not over, so this reads just the one line
+        return (
+            player_id == self.current_player
+            and self.board.has_line(is_horizontal, x, y)
+            and self.board.line_owner(is_horizontal, x, y) is None
+        )
+
+    def free_lines(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Masks of the undrawn horizontal ((size + 1) x size) and vertical (size x (size + 1)) lines"""
+        size = self.board.size
+        h_lines = np.frombuffer(self.board.h_lines, dtype=np.uint8).reshape(size + 1, size)
+        v_lines = np.frombuffer(self.board.v_lines, dtype=np.uint8).reshape(size, size + 1)
+        return h_lines == EMPTY, v_lines == EMPTY
+
+    def capturing_lines(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Masks of the free lines that would complete a cell (one with three sides drawn)"""
+        h_free, v_free = self.free_lines()
+        sides = (~h_free[:-1]).astype(np.uint8) + ~h_free[1:] + ~v_free[:, :-1] + ~v_free[:, 1:]
+        closing = sides == 3
+        h_closing = np.zeros_like(h_free)
+        h_closing[:-1] |= closing  # line above the cell
+        h_closing[1:] |= closing  # line below
+        v_closing = np.zeros_like(v_free)
+        v_closing[:, :-1] |= closing  # left
+        v_closing[:, 1:] |= closing  # right
+        return h_free & h_closing, v_free & v_closing
+
+    def pass_turn(self):
+        self.current_player = (self.current_player + 1) % self.player_count
+
+    def play(self, player_id: int, is_horizontal: bool, x: int, y: int) -> Optional[MoveResult]:
+        """Apply a line move as the server accepts it: illegal lines just pass the turn"""
+        if self.is_legal(player_id, is_horizontal, x, y):
+            return self.apply_line(player_id, is_horizontal, x, y)
+        self.pass_turn()
+        return None
+
+    def apply_line(self, player_id: int, is_horizontal: bool, x: int, y: int) -> MoveResult:
+        """Draw a line, claim any cells it closes and advance the turn"""
+        if not self.is_legal(player_id, is_horizontal, x, y):
+            raise IllegalMove(f"Line {'h' if is_horizontal else 'v'}-{x}-{y} cannot be drawn by player {player_id}")
+
+        board = self.board
+        board.set_line(is_horizontal, x, y, player_id)
+
+        captured = []
+        element = element_code(self.elements[player_id])
+        for cx, cy in self.adjacent_cells(is_horizontal, x, y):
+            i = cy * board.size + cx
+            if self.side_count(i) == 4:
+                previous = board.cell_owner[i]
+                if previous != EMPTY:
+                    # Claimed by armies before it was enclosed
+                    self.territories[previous] -= 1
+                board.claim(i, player_id, element, 1)
+                captured.append((cx, cy))
+
+        if captured:
+            self.territories[player_id] += len(captured)
+        else:
+            self.pass_turn()
+
+        return MoveResult(tuple(captured), bool(captured) and not self.game_over, self.game_over)
@@ -0,0 +1,276 @@
+"""Publish/subscribe bus for game change events across workers
+
+Every committed move or join is published once. Each worker's handlers then
+drop their cached copy of the game if it is older and push the message to
+their own WebSockets, so clients of every worker hear about a move within
+milliseconds without polling the database.
+
+- ``LocalBus``: a single process; events only reach its own handlers
+- ``UnixSocketBus``: several workers on one host. The worker holding an
+  flock on ``<path>.lock`` serves the socket and relays each event to the
+  other connected workers; the rest connect to it, and one of them takes
+  over when it goes away
+- ``MongoChangeStreamBus``: events are inserted into a capped collection
+  that every worker tails with a change stream (needs a replica set)
+
+Events are delivered to the publishing worker's handlers straight away and
+carry its ``origin`` id, so copies coming back over the wire are skipped.
+Delivery to other workers is best effort: an event published while a
+worker is reconnecting is lost to it, and that worker only sees the change
+when its cached copy expires or fails a version check.
+"""
+
+import asyncio
+import fcntl
+import logging
+import os
+import uuid
+from abc import ABC, abstractmethod
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+import orjson
+
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[Dict[str, Any]], Awaitable[None]]
+
+
+class EventBus(ABC):
+    name: str
+
+    def __init__(self):
+        self.origin = uuid.uuid4().hex
+        self.stats = {"published": 0, "received": 0, "dropped": 0}
+        self._handlers: List[Handler] = []
+
+    def subscribe(self, handler: Handler):
+        self._handlers.append(handler)
+
+    async def publish(self, event: Dict[str, Any]):
+        """Hand an event to this worker's handlers, then send it to the other workers"""
+        event = {**event, "origin": self.origin}
+        self.stats["published"] += 1
+        await self._dispatch(event)
+        try:
+            await self._send(event)
+        except Exception:
+            self.stats["dropped"] += 1
+            logger.exception("Could not publish %s event", self.name)
+
+    async def _receive(self, event: Dict[str, Any]):
+        """An event from another worker"""
+        if event.get("origin") == self.origin:
+            return
+        self.stats["received"] += 1
+        await self._dispatch(event)
+
+    async def _dispatch(self, event: Dict[str, Any]):
+        for handler in self._handlers:
+            try:
+                await handler(event)
+            except Exception:
+                logger.exception("Event handler failed for %s", event.get("game_id"))
+
+    @abstractmethod
+    async def _send(self, event: Dict[str, Any]):
+        """Deliver an event to the other workers"""
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+
+class LocalBus(EventBus):
+    name = "local"
+
+    async def _send(self, event):
+        pass
+
+
+class UnixSocketBus(EventBus):
+    """Newline-delimited JSON events relayed by whichever worker holds the lock"""
+
+    name = "unix"
+
+    def __init__(self, path: str, retry_seconds: float = 0.5, max_buffer: int = 4 * 1024 * 1024):
+        super().__init__()
+        self.path = path
+        self.retry_seconds = retry_seconds
+        self.max_buffer = max_buffer
+        self._lock_fd: Optional[int] = None
+        self._peers: Set[asyncio.StreamWriter] = set()  # workers connected to us, while we are the hub
+        self._upstream: Optional[asyncio.StreamWriter] = None  # our connection to the hub otherwise
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def is_hub(self) -> bool:
+        return self._lock_fd is not None
+
+    async def _send(self, event):
+        line = orjson.dumps(event) + b"\n"
+        if self.is_hub:
+            self._relay(line, None)
+        elif self._upstream is not None:
+            self._upstream.write(line)
+        else:
+            self.stats["dropped"] += 1
+
+    def _relay(self, line: bytes, source: Optional[asyncio.StreamWriter]):
+        for peer in list(self._peers):
+            if peer is source:
+                continue
+            if peer.transport.get_write_buffer_size() > self.max_buffer:
+                # A worker that stopped reading must not make the hub buffer without bound
+                logger.warning("Dropping event bus peer that fell %d bytes behind", self.max_buffer)
+                self._peers.discard(peer)
+                peer.close()
+                continue
+            peer.write(line)
+
+    def _try_lock(self) -> bool:
+        fd = os.open(self.path + ".lock", os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        self._lock_fd = fd
+        return True
+
+    async def _run(self):
+        while True:
+            if self._try_lock():
+                # Anything at the path is left over from a hub that died
+                if os.path.exists(self.path):
+                    os.unlink(self.path)
+                server = await asyncio.start_unix_server(self._serve_peer, path=self.path)
+                logger.info("Event bus hub listening on %s", self.path)
+                async with server:
+                    await server.serve_forever()
+            try:
+                reader, writer = await asyncio.open_unix_connection(self.path)
+            except (FileNotFoundError, ConnectionRefusedError):
+                await asyncio.sleep(self.retry_seconds)
+                continue
+            self._upstream = writer
+            try:
+                await self._read_events(reader, None)
+            finally:
+                self._upstream = None
+                writer.close()
+            logger.info("Event bus hub went away, reconnecting")
+
+    async def _serve_peer(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._peers.add(writer)
+        try:
+            await self._read_events(reader, writer)
+        finally:
+            self._peers.discard(writer)
+            writer.close()
+
+    async def _read_events(self, reader: asyncio.StreamReader, source: Optional[asyncio.StreamWriter]):
+        while True:
+            try:
+                line = await reader.readline()
+            except (ConnectionError, ValueError):
+                return
+            if not line:
+                return
+            if source is not None:
+                self._relay(line, source)
+            await self._receive(orjson.loads(line))
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for peer in self._peers:
+            peer.close()
+        self._peers.clear()
+        if self._lock_fd is not None:
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+            os.close(self._lock_fd)
+            self._lock_fd = None
+
+
+class MongoChangeStreamBus(EventBus):
+    """Events as inserts into a capped collection, tailed by every worker"""
+
+    name = "mongo"
+
+    def __init__(self, db, collection: str = "game_events", size_bytes: int = 16 * 1024 * 1024,
+                 retry_seconds: float = 1.0):
+        super().__init__()
+        self.db = db
+        self.collection = collection
+        self.size_bytes = size_bytes
+        self.retry_seconds = retry_seconds
+        self._task: Optional[asyncio.Task] = None
+
+    async def _send(self, event):
+        await self.db[self.collection].insert_one(dict(event))
+
+    async def _tail(self):
+        resume_token = None
+        while True:
+            try:
+                async with self.db[self.collection].watch(
+                    [{"$match": {"operationType": "insert"}}], resume_after=resume_token
+                ) as stream:
+                    async for change in stream:
+                        resume_token = stream.resume_token
+                        event = change["fullDocument"]
+                        event.pop("_id", None)
+                        await self._receive(event)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Event change stream failed, retrying")
+                await asyncio.sleep(self.retry_seconds)
+
+    async def start(self):
+        from pymongo.errors import CollectionInvalid
+        try:
+            await self.db.create_collection(self.collection, capped=True, size=self.size_bytes)
+        except CollectionInvalid:
+            pass
+        if self._task is None:
+            self._task = asyncio.create_task(self._tail())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+def create_event_bus(storage=None) -> EventBus:
+    """Bus selected by the EVENT_BUS env var: local (default), unix (EVENT_BUS_SOCKET) or mongo
+
+    The mongo bus shares the database of the mongo storage backend.
+    """
+    bus = os.environ.get('EVENT_BUS', 'local')
+    if bus == 'local':
+        return LocalBus()
+    if bus == 'unix':
+        return UnixSocketBus(os.environ.get('EVENT_BUS_SOCKET', '/tmp/elemental_conquest_events.sock'))
+    if bus == 'mongo':
+        if getattr(storage, 'name', None) != 'mongo':
+            raise ValueError("EVENT_BUS=mongo needs STORAGE_BACKEND=mongo")
+        return MongoChangeStreamBus(storage.db)
+    raise ValueError(f"Unknown EVENT_BUS {bus!r} (expected local, unix or mongo)")
@@ -0,0 +1,262 @@
+"""Request and database metrics in the Prometheus text format
+
+A small, dependency-free registry of counters, gauges and histograms, fed by
+an ASGI middleware (per-route latency, status codes, response body sizes,
+in-flight requests) and a pymongo CommandListener (per-collection command
+counts and durations, plus reply sizes when ``MONGO_REPLY_METRICS=1``).
+``registry.render()`` produces the exposition text served on the metrics
+endpoint.
+"""
+
+import bisect
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import bson
+from pymongo import monitoring
+
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+Labels = Tuple[str, ...]
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        # pymongo calls listeners from its own threads
+        self._lock = threading.Lock()
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}" for labels, value in items
+        ]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labels: str, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, *labels: str, value: float):
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> (per-bucket counts with a trailing +Inf slot, sum)
+        self._series: Dict[Labels, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, *labels: str):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = ([0] * (len(self.buckets) + 1), [0.0])
+            series[0][index] += 1
+            series[1][0] += value
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((labels, (list(counts), total[0])) for labels, (counts, total) in self._series.items())
+        lines = self.header()
+        for labels, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_text} {total!r}")
+            lines.append(f"{self.name}_count{label_text} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: List[Metric] = []
+        self.collectors: List[Callable[[], Iterable[Metric]]] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector: Callable[[], Iterable[Metric]]):
+        """Register a callback producing metrics computed at scrape time"""
+        self.collectors.append(collector)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        for collector in self.collectors:
+            for metric in collector():
+                lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_requests = registry.register(Counter(
+    "http_requests_total", "HTTP requests by route and status", ("method", "route", "status")))
+http_duration = registry.register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route", ("method", "route")))
+http_response_size = registry.register(Histogram(
+    "http_response_bytes", "HTTP response body bytes sent by route", ("method", "route"), buckets=SIZE_BUCKETS))
+http_in_flight = registry.register(Gauge(
+    "http_requests_in_flight", "HTTP requests currently being handled", ("method",)))
+
+db_commands = registry.register(Counter(
+    "mongodb_commands_total", "MongoDB commands by collection, command and outcome", ("collection", "command", "outcome")))
+db_duration = registry.register(Histogram(
+    "mongodb_command_duration_seconds", "MongoDB command round trip by collection and command", ("collection", "command")))
+db_reply_size = registry.register(Histogram(
+    "mongodb_reply_bytes", "BSON size of MongoDB replies by collection and command", ("collection", "command"),
+    buckets=SIZE_BUCKETS))
+db_in_flight = registry.register(Gauge(
+    "mongodb_commands_in_flight", "MongoDB commands sent and not yet answered", ("collection",)))
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware timing each HTTP request under its route template"""
+
+    def __init__(self, app):
+        self.app = app
+        self._routes: Optional[Dict[Callable, str]] = None
+
+    def _route_for(self, scope) -> str:
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "unmatched"
+        if self._routes is None:
+            self._routes = {
+                route.endpoint: route.path
+                for route in scope["app"].routes if hasattr(route, "endpoint")
+            }
+        return self._routes.get(endpoint, "unmatched")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status = 500
+        size = 0
+
+        async def send_wrapper(message):
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                # The encoded body as it goes out, streamed responses included
+                size += len(message.get("body", b""))
+            await send(message)
+
+        http_in_flight.inc(method)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            http_in_flight.dec(method)
+            route = self._route_for(scope)
+            http_duration.observe(elapsed, method, route)
+            http_response_size.observe(size, method, route)
+            http_requests.inc(method, route, str(status))
+
+
+class CommandMetrics(monitoring.CommandListener):
+    """pymongo listener recording command timings per collection
+
+    pymongo hands listeners the decoded reply, not its wire size, so reply
+    sizes cost a BSON re-encode of every reply and are off unless asked for.
+    """
+
+    def __init__(self, measure_replies: bool = False):
+        self.measure_replies = measure_replies
+        self._pending: Dict[Tuple[int, int], str] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _collection(event) -> str:
+        target = event.command.get(event.command_name)
+        if event.command_name == "getMore":
+            target = event.command.get("collection")
+        return target if isinstance(target, str) else "-"
+
+    def started(self, event):
+        collection = self._collection(event)
+        with self._lock:
+            self._pending[(event.request_id, event.operation_id)] = collection
+        db_in_flight.inc(collection)
+
+    def _finish(self, event) -> str:
+        with self._lock:
+            collection = self._pending.pop((event.request_id, event.operation_id), "-")
+        db_in_flight.dec(collection)
+        db_duration.observe(event.duration_micros / 1e6, collection, event.command_name)
+        return collection
+
+    def succeeded(self, event):
+        collection = self._finish(event)
+        db_commands.inc(collection, event.command_name, "ok")
+        if self.measure_replies:
+            db_reply_size.observe(len(bson.encode(event.reply)), collection, event.command_name)
+
+    def failed(self, event):
+        collection = self._finish(event)
+        db_commands.inc(collection, event.command_name, "error")
+
+
+command_metrics = CommandMetrics(measure_replies=os.environ.get('MONGO_REPLY_METRICS') == '1')
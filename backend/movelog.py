@@ -0,0 +1,162 @@
+"""Per-game move log with periodic board snapshots
+
+Every committed move is written to the move log under a per-game sequence
+number, and every ``snapshot_interval`` moves the packed board is saved as a
+snapshot. The state at any sequence number is rebuilt by loading
+the nearest snapshot at or before it and replaying the remaining moves.
+"""
+
+import struct
+from datetime import datetime
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence
+
+import bson
+
+from army import ArmyEngine, move_cells, start_turn
+from board import PackedBoard
+from engine import IllegalMove, LineEngine
+
+
+class ReplayState(NamedTuple):
+    seq: int
+    board: PackedBoard
+    current_player: int
+    territories: List[int]
+    armies: List[int]
+    game_status: str
+
+
+def replay(engine: LineEngine, moves: Sequence[Dict[str, Any]], armies: Optional[List[int]] = None) -> LineEngine:
+    """Apply logged moves to an engine in order, reinforcing whoever gets the turn
+
+    ``armies``, the players' pools, is updated in place when given.
+    """
+    if armies is None:
+        armies = [3] * engine.player_count
+    for move in moves:
+        data = move["data"]
+        if move["move_type"] == "line":
+            engine.play(move["player_id"], data.get("is_horizontal", True), data.get("x", 0), data.get("y", 0))
+            if engine.current_player != move["player_id"]:
+                start_turn(engine.board, engine.elements, engine.current_player, armies, engine.territories,
+                           seed=move["seq"])
+        elif move["move_type"] == "army_move":
+            army = ArmyEngine(engine.board, engine.elements, engine.current_player, armies=armies)
+            try:
+                army.move(move["player_id"], *move_cells(data), seed=move["seq"])
+            except IllegalMove:
+                continue
+            engine.current_player = army.current_player
+            engine.territories = army.territories
+            armies[:] = army.armies
+    return engine
+
+
+# Packed move log: b'EM', format byte, then one record per move in sequence
+# order. Line moves are (player, 0 horizontal / 1 vertical, x, y); anything
+# else is (player, 2, length) followed by a BSON {move_type, data} document.
+MOVES_MAGIC = b"EM"
+MOVES_FORMAT = 1
+_LINE_RECORD = struct.Struct("<BBHH")
+_OTHER_RECORD = struct.Struct("<BBI")
+
+
+def pack_moves(moves: Sequence[Dict[str, Any]]) -> bytes:
+    """Compact binary form of logged moves, 6 bytes per line move"""
+    out = bytearray(MOVES_MAGIC)
+    out.append(MOVES_FORMAT)
+    for move in moves:
+        data = move["data"]
+        if move["move_type"] == "line":
+            kind = 0 if data.get("is_horizontal", True) else 1
+            out += _LINE_RECORD.pack(move["player_id"], kind, data.get("x", 0), data.get("y", 0))
+        else:
+            blob = bson.encode({"move_type": move["move_type"], "data": data})
+            out += _OTHER_RECORD.pack(move["player_id"], 2, len(blob))
+            out += blob
+    return bytes(out)
+
+
+def unpack_moves(packed: bytes) -> List[Dict[str, Any]]:
+    """Moves from ``pack_moves``, numbered from seq 1"""
+    if packed[:2] != MOVES_MAGIC or packed[2] != MOVES_FORMAT:
+        raise ValueError("Not a packed move log")
+    moves = []
+    offset = 3
+    while offset < len(packed):
+        player_id, kind = packed[offset], packed[offset + 1]
+        if kind < 2:
+            _, _, x, y = _LINE_RECORD.unpack_from(packed, offset)
+            offset += _LINE_RECORD.size
+            move_type, data = "line", {"is_horizontal": kind == 0, "x": x, "y": y}
+        else:
+            _, _, length = _OTHER_RECORD.unpack_from(packed, offset)
+            offset += _OTHER_RECORD.size
+            record = bson.decode(packed[offset:offset + length])
+            offset += length
+            move_type, data = record["move_type"], record["data"]
+        moves.append({"seq": len(moves) + 1, "player_id": player_id, "move_type": move_type, "data": data})
+    return moves
+
+
+class MoveLog:
+    def __init__(self, storage, snapshot_interval: int = 50):
+        self.storage = storage
+        self.snapshot_interval = snapshot_interval
+
+    async def record(self, game_id: str, first_seq: int, moves: Sequence[Dict[str, Any]]):
+        """Log committed moves (``player_id``, ``move_type``, ``data``) from ``first_seq`` in one write
+
+        Called once the game write holding the moves succeeded, so anything
+        already logged at those sequence numbers came from a write that never
+        committed (a lost race, an error or a crash) and is replaced.
+        """
+        created_at = datetime.utcnow()
+        await self.storage.put_moves([
+            {"game_id": game_id, "seq": first_seq + i, "player_id": move["player_id"],
+             "move_type": move["move_type"], "data": move["data"], "created_at": created_at}
+            for i, move in enumerate(moves)
+        ])
+
+    def wants_snapshot(self, seq: int, moves: int = 1) -> bool:
+        """Whether the last ``moves`` moves up to ``seq`` passed a snapshot point"""
+        if self.snapshot_interval <= 0:
+            return False
+        return seq // self.snapshot_interval > (seq - moves) // self.snapshot_interval
+
+    async def snapshot(self, game_id: str, seq: int, board: bytes, current_player: int, territories: List[int],
+                       armies: List[int]):
+        await self.storage.save_snapshot({
+            "game_id": game_id,
+            "seq": seq,
+            "board": board,
+            "current_player": current_player,
+            "territories": territories,
+            "armies": armies
+        })
+
+    async def rebuild(self, game_id: str, seq: int, map_size: str, elements: Sequence[Optional[str]]) -> ReplayState:
+        """State of a game right after move ``seq`` (0 is the empty board)"""
+        snapshot = await self.storage.latest_snapshot(game_id, seq)
+        # Snapshots from before army pools were saved cannot restore them, so replay from the start
+        if snapshot and "armies" in snapshot:
+            start = snapshot["seq"]
+            engine = LineEngine(PackedBoard.from_bytes(snapshot["board"]), elements,
+                                current_player=snapshot["current_player"], territories=snapshot["territories"])
+            armies = list(snapshot["armies"])
+        else:
+            start = 0
+            engine = LineEngine(PackedBoard.for_map(map_size), elements)
+            armies = [3] * len(elements)
+
+        moves = await self.storage.list_moves(game_id, start, seq)
+        replay(engine, moves, armies)
+
+        return ReplayState(
+            seq=seq,
+            board=engine.board,
+            current_player=engine.current_player,
+            territories=engine.territories,
+            armies=armies,
+            game_status="finished" if engine.game_over else "active"
+        )
@@ -0,0 +1,101 @@
+"""WebSocket fan-out of game updates
+
+Clients connected to ``/api/games/{id}/ws`` get a full snapshot when they
+connect and a compact delta every time a move or join is committed, instead
+of polling the status endpoint. Deltas reach this worker through the event
+bus (events.py), whichever worker committed the change.
+
+Each socket has its own bounded send queue drained by its own task, so a
+broadcast never waits on a slow client. A client that falls
+``WEBSOCKET_QUEUE_SIZE`` messages behind is disconnected; it gets a fresh
+snapshot when it reconnects.
+"""
+
+import asyncio
+import json
+import logging
+import os
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+from fastapi import WebSocket
+
+
+logger = logging.getLogger(__name__)
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+class GameConnections:
+    """Open WebSockets grouped by game id, each with a send queue and the task draining it"""
+
+    def __init__(self, queue_size: int = 64):
+        self.queue_size = queue_size
+        self._sockets: Dict[str, Dict[WebSocket, Tuple[asyncio.Queue, asyncio.Task]]] = defaultdict(dict)
+
+    def connect(self, game_id: str, websocket: WebSocket, first: Optional[Dict[str, Any]] = None):
+        """Register a socket; ``first`` (e.g. a snapshot) is sent ahead of any broadcast"""
+        queue: "asyncio.Queue[str]" = asyncio.Queue(self.queue_size)
+        if first is not None:
+            queue.put_nowait(self._encode(first))
+        task = asyncio.create_task(self._send_queued(game_id, websocket, queue))
+        self._sockets[game_id][websocket] = (queue, task)
+
+    def disconnect(self, game_id: str, websocket: WebSocket):
+        sockets = self._sockets.get(game_id)
+        if sockets is None:
+            return
+        entry = sockets.pop(websocket, None)
+        if entry is not None and entry[1] is not asyncio.current_task():
+            entry[1].cancel()
+        if not sockets:
+            del self._sockets[game_id]
+
+    def count(self, game_id: str) -> int:
+        return len(self._sockets.get(game_id, ()))
+
+    def total(self) -> int:
+        return sum(len(sockets) for sockets in self._sockets.values())
+
+    async def broadcast(self, game_id: str, message: Dict[str, Any]):
+        """Queue one message for every socket watching a game"""
+        sockets = self._sockets.get(game_id)
+        if not sockets:
+            return
+
+        # Encode once, queue the same text for everyone
+        text = self._encode(message)
+        for ws, (queue, _) in list(sockets.items()):
+            try:
+                queue.put_nowait(text)
+            except asyncio.QueueFull:
+                logger.info("Dropping WebSocket for game %s: %d messages behind", game_id, self.queue_size)
+                self.disconnect(game_id, ws)
+                asyncio.create_task(self._close(ws))
+
+    async def _send_queued(self, game_id: str, websocket: WebSocket, queue: "asyncio.Queue[str]"):
+        try:
+            while True:
+                await websocket.send_text(await queue.get())
+        except Exception as e:
+            logger.info("Dropping WebSocket for game %s: %s", game_id, e)
+            self.disconnect(game_id, websocket)
+
+    @staticmethod
+    def _encode(message: Dict[str, Any]) -> str:
+        return json.dumps(message, default=_json_default, separators=(",", ":"))
+
+    @staticmethod
+    async def _close(websocket: WebSocket):
+        try:
+            await websocket.close(code=1013, reason="Too far behind, reconnect for a snapshot")
+        except Exception:
+            pass
+
+
+connections = GameConnections(queue_size=int(os.environ.get('WEBSOCKET_QUEUE_SIZE', 64)))
@@ -0,0 +1,69 @@
+"""Collision-free room code allocation
+
+Room codes are six characters from A-Z0-9, i.e. numbers below 36**6. Each
+new room takes the next value of a shared counter and maps it through the
+affine permutation ``n -> (a * n + b) mod 36**6``; ``a`` is coprime with
+36**6 so no two counter values below 36**6 give the same code, and codes do
+not look sequential. Workers reserve counter values in blocks, so most
+allocations need no database round trip and none ever needs a retry.
+"""
+
+import asyncio
+import string
+from math import gcd
+from typing import List
+
+ALPHABET = string.ascii_uppercase + string.digits
+CODE_LENGTH = 6
+CODE_SPACE = len(ALPHABET) ** CODE_LENGTH
+
+# Any multiplier coprime with 36**6 (odd and not a multiple of 3) is a bijection
+MULTIPLIER = 1_117_415_587
+OFFSET = 618_223_709
+assert gcd(MULTIPLIER, CODE_SPACE) == 1
+
+
+def encode_room_code(value: int) -> str:
+    chars = []
+    for _ in range(CODE_LENGTH):
+        value, digit = divmod(value, len(ALPHABET))
+        chars.append(ALPHABET[digit])
+    return "".join(reversed(chars))
+
+
+def room_code_for(sequence: int) -> str:
+    """Room code of the ``sequence``-th room (wraps after 36**6 rooms)"""
+    return encode_room_code((MULTIPLIER * sequence + OFFSET) % CODE_SPACE)
+
+
+class RoomCodeAllocator:
+    """Hands out room codes from blocks of a storage counter"""
+
+    COUNTER = "room_code"
+
+    def __init__(self, storage, block_size: int = 64):
+        self.storage = storage
+        self.block_size = block_size
+        self._next = 0
+        self._end = 0
+        self._lock = asyncio.Lock()
+
+    async def allocate(self) -> str:
+        async with self._lock:
+            if self._next >= self._end:
+                self._next = await self.storage.next_sequence(self.COUNTER, self.block_size)
+                self._end = self._next + self.block_size
+            sequence = self._next
+            self._next += 1
+        return room_code_for(sequence)
+
+    async def allocate_many(self, count: int) -> List[str]:
+        """``count`` room codes: the rest of the current block, then one reservation for any shortfall"""
+        async with self._lock:
+            taken = min(count, self._end - self._next)
+            sequences = list(range(self._next, self._next + taken))
+            self._next += taken
+            if taken < count:
+                start = await self.storage.next_sequence(self.COUNTER, count - taken)
+                sequences += range(start, start + count - taken)
+        return [room_code_for(sequence) for sequence in sequences]
@@ -1,23 +1,41 @@
-from fastapi import FastAPI, APIRouter, HTTPException
+from fastapi import FastAPI, APIRouter, HTTPException, Header, Query, WebSocket, WebSocketDisconnect
+from fastapi.responses import ORJSONResponse, PlainTextResponse, Response, StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
 import os
+import asyncio
+import base64
 import logging
+import time
 from pathlib import Path
-from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any
+from pydantic import BaseModel, ConfigDict, Field, PrivateAttr
+from typing import Iterable, List, Optional, Dict, Any, Literal, Set, Tuple
 import uuid
 from datetime import datetime
+import numpy as np
+import orjson
+
+import ai
+from board import (CHUNK_SIZE, REINFORCED_KEY, PackedBoard, board_from_document, cell_chunk, empty_board,
+                   grid_size_for, is_chunked, line_chunk, parse_map_size, region_chunks)
+from engine import IllegalMove, LineEngine, move_line
+from army import ArmyEngine, move_cells, start_turn
+from cache import GameCache, StaleGame
+from movelog import MoveLog
+from realtime import connections
+from events import create_event_bus
+from spectators import Spectators
+import metrics
+from rooms import RoomCodeAllocator
+from archive import Archiver
+from storage import SUMMARY_FIELDS, DuplicateGame, create_storage
 
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+# Persistence backend: mongo (MONGO_URL/DB_NAME), memory or sqlite (SQLITE_PATH)
+storage = create_storage(event_listeners=[metrics.command_metrics])
 
 # Create the main app without a prefix
 app = FastAPI()
@@ -35,7 +53,28 @@ class Player(BaseModel):
     territories: int = 0
     armies: int = 3
 
+MAX_PLAYERS = 4
+PLAYER_COLORS = ['#ff5722', '#2196f3', '#4caf50', '#9c27b0']
+PLAYER_ELEMENTS = ['fire', 'water', 'earth', 'wind']
+
+def legacy_seats(doc: Dict[str, Any]) -> Dict[str, int]:
+    """Seat counts for a game stored before rooms recorded them
+
+    Waiting rooms of that time started as soon as one more player joined,
+    so they get exactly one open seat; other games are as full as they are.
+    """
+    seated = len(doc.get("players") or [])
+    if doc.get("game_status") == "waiting":
+        max_players = min(seated + 1, MAX_PLAYERS)
+        return {"max_players": max_players, "open_seats": max_players - seated}
+    return {"max_players": max(seated, 1), "open_seats": 0}
+
+LEGACY_BOARD_FIELDS = ("grid", "horizontal_lines", "vertical_lines")
+BOARD_FIELDS = {*LEGACY_BOARD_FIELDS, "board"}
+
 class GameState(BaseModel):
+    model_config = ConfigDict(ser_json_bytes='base64', val_json_bytes='base64')
+
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     room_code: Optional[str] = None
     players: List[Player]
@@ -45,26 +84,185 @@ class GameState(BaseModel):
     grid: List[List[Dict[str, Any]]] = []
     horizontal_lines: List[List[Dict[str, Any]]] = []
     vertical_lines: List[List[Dict[str, Any]]] = []
+    board: Optional[bytes] = None  # PackedBoard blob (base64url in JSON); replaces grid/lines when set
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
     game_status: str = "active"  # "waiting", "active", "finished"
+    version: int = 0  # bumped on every write, used for compare-and-swap updates
+    move_count: int = 0  # sequence number of the last logged move
+    max_players: int = MAX_PLAYERS  # seats in an online room
+    open_seats: int = 0  # seats still free; only waiting rooms have any
+
+    # Decoded board, shared with the copies moves are applied to (see apply_moves)
+    _live: Optional[PackedBoard] = PrivateAttr(None)
+
+    @classmethod
+    def from_document(cls, doc: Dict[str, Any]) -> "GameState":
+        """Build from a document this server stored itself
+
+        The scalar fields go through the (fast) validator; the legacy board
+        lists, which dominate validation time on big maps, are attached as-is.
+        A chunked board is assembled into a PackedBoard and encoded as one
+        blob only if it is asked for.
+        """
+        if "max_players" not in doc:
+            doc = {**doc, **legacy_seats(doc)}
+        board = None
+        if "board_chunks" in doc:
+            board = board_from_document(doc) if doc["board_chunks"] else None
+            doc = {key: value for key, value in doc.items() if key != "board_chunks"}
+        lists = {name: doc[name] for name in LEGACY_BOARD_FIELDS if doc.get(name)}
+        if not lists:
+            state = cls.model_validate(doc)
+        else:
+            state = cls.model_validate({key: value for key, value in doc.items() if key not in lists})
+            state.__dict__.update(lists)
+        state._live = board
+        return state
+
+    @property
+    def is_legacy(self) -> bool:
+        """Whether the board is still in the legacy nested-dict layout"""
+        return self.board is None and bool(self.grid)
+
+    @property
+    def has_board(self) -> bool:
+        """False for the board-less summaries"""
+        return self.board is not None or self._live is not None or bool(self.grid)
+
+    def to_json_dict(self) -> Dict[str, Any]:
+        """JSON-ready dict; the board lists are passed through instead of re-serialized"""
+        blob = self.board_bytes()
+        data = self.model_dump(exclude=BOARD_FIELDS)
+        data["grid"] = self.grid
+        data["horizontal_lines"] = self.horizontal_lines
+        data["vertical_lines"] = self.vertical_lines
+        data["board"] = None if blob is None else base64.urlsafe_b64encode(blob).decode()
+        return data
+
+    def live_board(self) -> PackedBoard:
+        """The game's board, decoded on first use and kept with the state
+
+        Cached states hand it out to the moves that replace them, so read it
+        without awaiting in between, and use ``packed_board`` for a copy to
+        change or keep.
+        """
+        if self._live is None:
+            if self.board is not None:
+                self._live = PackedBoard.from_bytes(self.board)
+            else:
+                self._live = PackedBoard.from_legacy(self.grid, self.horizontal_lines, self.vertical_lines)
+        return self._live
+
+    def packed_board(self) -> PackedBoard:
+        """Copy of the board as a PackedBoard, converting legacy documents on the fly"""
+        return self.live_board().copy()
+
+    def board_bytes(self) -> Optional[bytes]:
+        """The packed board blob, encoded from the live board once if a move left it unset; None if legacy"""
+        if self.board is None and self._live is not None and not self.is_legacy:
+            self.board = self._live.to_bytes()
+        return self.board
+
+    def store_board(self, board: PackedBoard, blob: Optional[bytes] = None):
+        """Persist the board in packed form and drop any legacy layout
+
+        ``blob`` is the board's encoding when the caller already has it;
+        otherwise it is encoded when first needed.
+        """
+        self._live = board
+        self.board = blob
+        self.grid = []
+        self.horizontal_lines = []
+        self.vertical_lines = []
+
+    def to_document(self, chunks: Optional[Dict[str, bytes]] = None) -> Dict[str, Any]:
+        """Document to insert; boards bigger than one chunk are stored chunk by chunk
+
+        ``chunks`` are the board's stored chunks when the caller already has them.
+        """
+        self.board_bytes()
+        doc = self.dict()
+        if self.board is not None:
+            if chunks is None:
+                board = self.live_board()
+                chunks = board.chunks() if is_chunked(board.size) else {}
+            if chunks:
+                doc["board"] = None
+                doc["board_chunks"] = dict(chunks)
+        return doc
+
+    def with_format(self, board_format: str) -> "GameState":
+        """Copy of the state with the board in the requested wire format"""
+        if board_format == "legacy":
+            if self.is_legacy:
+                return self
+            grid, horizontal_lines, vertical_lines = self.live_board().to_legacy()
+            return self.model_copy(update={
+                "board": None,
+                "grid": grid,
+                "horizontal_lines": horizontal_lines,
+                "vertical_lines": vertical_lines,
+            })
+        if self.is_legacy:
+            state = self.model_copy()
+            state.store_board(self.packed_board())
+            state.board_bytes()
+            return state
+        self.board_bytes()
+        return self
+
+def board_fields(board: PackedBoard, chunks: Iterable[str]) -> Dict[str, Any]:
+    """Fields persisting a board: just the given chunks if it is chunked, else the whole blob"""
+    if is_chunked(board.size):
+        return {f"board_chunks.{key}": board.chunk_bytes(key) for key in chunks}
+    return {"board": board.to_bytes()}
+
+class GameResponse(ORJSONResponse):
+    """GameState encoded with orjson, bypassing response_model validation"""
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, GameState):
+            content = content.to_json_dict()
+        return super().render(content)
 
 class GameMove(BaseModel):
     game_id: str
     player_id: int
-    move_type: str  # "line", "army_move"
+    move_type: str  # "line", "army_move", "phase"
     data: Dict[str, Any]
 
+MAX_BATCH_MOVES = 512
+
+class MoveBatch(BaseModel):
+    moves: List[GameMove] = Field(..., min_length=1, max_length=MAX_BATCH_MOVES)
+
 class CreateGameRequest(BaseModel):
     element: str
     mode: str
     map_size: str
     player_count: int
 
+MAX_BULK_GAMES = 500
+
+class BulkCreateRequest(BaseModel):
+    games: List[CreateGameRequest] = Field(..., min_length=1, max_length=MAX_BULK_GAMES)
+
+class GameLookupRequest(BaseModel):
+    game_ids: List[str] = Field(..., min_length=1, max_length=MAX_BULK_GAMES)
+
 class JoinGameRequest(BaseModel):
     room_code: str
     element: str
 
+class QuickMatchRequest(BaseModel):
+    element: str
+    map_size: str = "medium"
+    max_players: Optional[int] = Field(None, ge=2, le=MAX_PLAYERS)  # any room size if unset
+
+BoardFormat = Literal["packed", "legacy"]
+MAX_VIEWPORT = 64  # cells a side of the largest board region served at once
+
 class StatusCheck(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     client_name: str
@@ -74,62 +272,97 @@ class StatusCheckCreate(BaseModel):
     client_name: str
 
 
+# Live games, served from memory and persisted through the cache
+game_cache = GameCache(
+    storage,
+    GameState.from_document,
+    max_games=int(os.environ.get('GAME_CACHE_SIZE', 1024)),
+    ttl_seconds=float(os.environ.get('GAME_CACHE_TTL_SECONDS', 300)),
+    write_behind_ms=int(os.environ.get('GAME_CACHE_WRITE_BEHIND_MS', 0)),
+    batch_size=int(os.environ.get('GAME_CACHE_BATCH_SIZE', 100))
+)
+
+# Room codes from a shared counter, reserved in blocks per worker
+room_codes = RoomCodeAllocator(storage, block_size=int(os.environ.get('ROOM_CODE_BLOCK_SIZE', 64)))
+
+# Moves finished/abandoned games to the archive and expires idle rooms and status checks
+archiver = Archiver(
+    storage,
+    game_cache,
+    interval=float(os.environ.get('ARCHIVE_INTERVAL_SECONDS', 60)),
+    finished_after=float(os.environ.get('ARCHIVE_FINISHED_AFTER_SECONDS', 3600)),
+    stale_after=float(os.environ.get('ARCHIVE_STALE_AFTER_SECONDS', 7 * 86400)),
+    waiting_ttl=float(os.environ.get('WAITING_ROOM_TTL_SECONDS', 1800)),
+    status_check_ttl=float(os.environ.get('STATUS_CHECK_TTL_SECONDS', 7 * 86400)),
+    batch_size=int(os.environ.get('ARCHIVE_BATCH_SIZE', 100))
+)
+
+# Game change events shared with the other workers: local (default), unix or mongo (EVENT_BUS)
+events = create_event_bus(storage)
+
+async def on_game_event(event: Dict[str, Any]):
+    """A game changed, in this worker or another: drop an older cached copy and tell our WebSockets"""
+    message = event["message"]
+    game_cache.invalidate_older(event["game_id"], message["version"])
+    await connections.broadcast(event["game_id"], message)
+
+events.subscribe(on_game_event)
+
+# Read-only viewers of online games, all sent the same encoded frames
+spectators = Spectators(
+    game_cache.get,
+    GameState.to_json_dict,
+    snapshot_every=int(os.environ.get('SPECTATOR_SNAPSHOT_EVERY', 20)),
+    queue_size=int(os.environ.get('SPECTATOR_QUEUE_SIZE', 64))
+)
+events.subscribe(spectators.on_event)
+
+async def publish_game_event(game_id: str, message: Dict[str, Any]):
+    await events.publish({"game_id": game_id, "message": message})
+
+# Append-only move history with a board snapshot every N moves
+move_log = MoveLog(storage, snapshot_interval=int(os.environ.get('MOVE_SNAPSHOT_INTERVAL', 50)))
+
+# Server-side AI opponents: per-move search budget and running turn loops
+AI_MOVE_BUDGET = float(os.environ.get('AI_MOVE_BUDGET_SECONDS', 0.5))
+ai_tasks: Dict[str, asyncio.Task] = {}
+
+
 # Game Logic Functions
 def initialize_grid(size: str):
-    """Initialize game grid based on map size"""
-    grid_size = {'small': 8, 'medium': 10, 'large': 12}.get(size, 10)
-    
-    # Initialize cells
-    grid = []
-    for y in range(grid_size):
-        row = []
-        for x in range(grid_size):
-            row.append({
-                'id': f'{x}-{y}',
-                'x': x,
-                'y': y,
-                'state': 'empty',
-                'owner': None,
-                'army_count': 0,
-                'element': None
-            })
-        grid.append(row)
-    
-    # Initialize horizontal lines
-    horizontal_lines = []
-    for y in range(grid_size + 1):
-        row = []
-        for x in range(grid_size):
-            row.append({
-                'id': f'h-{x}-{y}',
-                'from': {'x': x, 'y': y},
-                'to': {'x': x + 1, 'y': y},
-                'state': 'empty',
-                'owner': None
-            })
-        horizontal_lines.append(row)
-    
-    # Initialize vertical lines
-    vertical_lines = []
-    for y in range(grid_size):
-        row = []
-        for x in range(grid_size + 1):
-            row.append({
-                'id': f'v-{x}-{y}',
-                'from': {'x': x, 'y': y},
-                'to': {'x': x, 'y': y + 1},
-                'state': 'empty',
-                'owner': None
-            })
-        vertical_lines.append(row)
-    
-    return grid, horizontal_lines, vertical_lines
+    """Initialize game grid based on map size, in the legacy nested-dict layout"""
+    return PackedBoard.for_map(size).to_legacy()
+
+def parse_if_match(if_match: Optional[str]) -> Optional[int]:
+    """Version number from an If-Match header ("3", "\"3\"" or "W/\"3\"")"""
+    if if_match is None or if_match.strip() == "*":
+        return None
+    value = if_match.strip()
+    if value.startswith("W/"):
+        value = value[2:]
+    try:
+        return int(value.strip('"'))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="If-Match must be a game version")
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match header lists the given ETag (weak comparison)"""
+    if if_none_match is None:
+        return False
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*" or tag.removeprefix("W/") == etag:
+            return True
+    return False
 
-def generate_room_code():
-    """Generate a 6-character room code"""
-    import random
-    import string
-    return ''.join(random.choices(string.ascii_uppercase + string.digits, k=6))
+def check_version(game_state: GameState, expected_version: Optional[int]):
+    """Reject the request if the client expects a different game version"""
+    if expected_version is not None and expected_version != game_state.version:
+        raise HTTPException(status_code=409, detail=f"Game is at version {game_state.version}")
+
+async def generate_room_code():
+    """Next unused 6-character room code"""
+    return await room_codes.allocate()
 
 
 # API Routes
@@ -141,162 +374,825 @@ async def root():
 async def create_status_check(input: StatusCheckCreate):
     status_dict = input.dict()
     status_obj = StatusCheck(**status_dict)
-    _ = await db.status_checks.insert_one(status_obj.dict())
+    await storage.insert_status_check(status_obj.dict())
     return status_obj
 
+def status_check_json(doc: Dict[str, Any]) -> Dict[str, Any]:
+    return {name: doc[name] for name in StatusCheck.model_fields if name in doc}
+
 @api_router.get("/status", response_model=List[StatusCheck])
-async def get_status_checks():
-    status_checks = await db.status_checks.find().to_list(1000)
-    return [StatusCheck(**status_check) for status_check in status_checks]
+async def get_status_checks(after: Optional[str] = None, limit: int = Query(1000, ge=1, le=1000), stream: bool = False):
+    """Status checks, oldest first
+
+    Pages hold at most ``limit`` checks; while more remain the X-Next-Cursor
+    header carries the ``after`` value for the next page. With ``stream``
+    every check after the cursor is sent as NDJSON straight off the cursor.
+    """
+    if stream:
+        checks = storage.iter_status_checks(after)
+        try:
+            first = await anext(checks, None)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        async def lines():
+            if first is None:
+                return
+            yield orjson.dumps(status_check_json(first)) + b"\n"
+            async for doc in checks:
+                yield orjson.dumps(status_check_json(doc)) + b"\n"
+
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+    try:
+        docs, next_cursor = await storage.page_status_checks(after, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else {}
+    return ORJSONResponse([status_check_json(doc) for doc in docs], headers=headers)
 
 @api_router.post("/games", response_model=GameState)
-async def create_game(request: CreateGameRequest):
+async def create_game(request: CreateGameRequest, format: BoardFormat = "packed"):
     """Create a new game"""
-    # Initialize players
-    player_colors = ['#ff5722', '#2196f3', '#4caf50', '#9c27b0']
-    player_elements = ['fire', 'water', 'earth', 'wind']
+    game_state = await open_game(request)
+    return GameResponse(game_state.with_format(format))
+
+def game_size(request: CreateGameRequest) -> int:
+    """Grid size of a game to create, rejecting bad requests"""
+    if not 1 <= request.player_count <= MAX_PLAYERS:
+        raise HTTPException(status_code=400, detail=f"player_count must be between 1 and {MAX_PLAYERS}")
+    try:
+        return parse_map_size(request.map_size)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def new_game(request: CreateGameRequest, size: int, room_code: Optional[str]) -> Tuple[GameState, Dict[str, Any]]:
+    """A new game and the document to insert for it
+
+    Online rooms seat only the host and keep ``player_count - 1`` seats open;
+    other games seat everyone up front, with AI opponents after the first
+    player in local games. The empty board comes from the shared template
+    for its size.
+    """
+    online = request.mode == 'online'
     
+    # Initialize players
     players = []
-    for i in range(request.player_count):
-        element = request.element if i == 0 else player_elements[i]
+    for i in range(1 if online else request.player_count):
+        element = request.element if i == 0 else PLAYER_ELEMENTS[i]
         players.append(Player(
             id=i,
             element=element,
-            color=player_colors[i],
+            color=PLAYER_COLORS[i],
             is_ai=request.mode == 'local' and i > 0
         ))
     
     # Initialize game board
-    grid, horizontal_lines, vertical_lines = initialize_grid(request.map_size)
+    board, chunks = empty_board(size)
     
     # Create game state
+    open_seats = request.player_count - len(players)
     game_state = GameState(
-        room_code=generate_room_code() if request.mode == 'online' else None,
+        room_code=room_code if online else None,
         players=players,
         map_size=request.map_size,
-        grid=grid,
-        horizontal_lines=horizontal_lines,
-        vertical_lines=vertical_lines,
-        game_status="waiting" if request.mode == 'online' else "active"
+        board=board,
+        game_status="waiting" if open_seats else "active",
+        max_players=request.player_count,
+        open_seats=open_seats
     )
+    return game_state, game_state.to_document(chunks)
+
+async def open_game(request: CreateGameRequest) -> GameState:
+    """Create, store and cache a new game"""
+    size = game_size(request)
+    room_code = await generate_room_code() if request.mode == 'online' else None
+    game_state, doc = new_game(request, size, room_code)
     
     # Save to database
-    await db.games.insert_one(game_state.dict())
+    try:
+        await storage.insert_game(doc)
+    except DuplicateGame:
+        # Only possible against rooms opened before codes were allocated from the counter
+        raise HTTPException(status_code=409, detail="Room code already in use, please retry")
+    game_cache.put(game_state)
     return game_state
 
+def game_summary(game_state: GameState) -> Dict[str, Any]:
+    return game_state.model_dump(include=set(SUMMARY_FIELDS))
+
+@api_router.post("/games/bulk")
+async def create_games(request: BulkCreateRequest):
+    """Create many games at once, e.g. a tournament round, with one insert
+
+    Returns the new games' summaries (no boards) in request order. The
+    batch is all or nothing: on a room code clash no game is created.
+    """
+    sizes = []
+    for index, game in enumerate(request.games):
+        try:
+            sizes.append(game_size(game))
+        except HTTPException as e:
+            raise HTTPException(status_code=e.status_code, detail=f"Game {index}: {e.detail}")
+    room_codes_left = iter(await room_codes.allocate_many(sum(game.mode == 'online' for game in request.games)))
+    created = [
+        new_game(game, size, next(room_codes_left) if game.mode == 'online' else None)
+        for game, size in zip(request.games, sizes)
+    ]
+    try:
+        await storage.insert_games([doc for _, doc in created])
+    except DuplicateGame as e:
+        if e.kept:
+            # Seated in before the rollback reached them; these games stay
+            raise HTTPException(status_code=409, detail=f"Room code already in use; games {', '.join(e.kept)} "
+                                                        "were created anyway, retry only the rest")
+        raise HTTPException(status_code=409, detail="Room code already in use, please retry")
+    for game_state, _ in created:
+        game_cache.put(game_state)
+    return ORJSONResponse({"games": [game_summary(game_state) for game_state, _ in created]})
+
+@api_router.post("/games/summaries")
+async def get_game_summaries(request: GameLookupRequest):
+    """Summaries (no boards) of many games; uncached ones are fetched with one query
+
+    ``games`` follows the request order; ids with no game are listed in ``missing``.
+    """
+    game_ids = list(dict.fromkeys(request.game_ids))
+    found = await game_cache.get_summaries(game_ids)
+    return ORJSONResponse({
+        "games": [game_summary(found[game_id]) for game_id in game_ids if game_id in found],
+        "missing": [game_id for game_id in game_ids if game_id not in found],
+    })
+
 @api_router.get("/games/{game_id}", response_model=GameState)
-async def get_game(game_id: str):
+async def get_game(game_id: str, format: BoardFormat = "packed"):
     """Get game state by ID"""
-    game = await db.games.find_one({"id": game_id})
-    if not game:
+    game_state = await game_cache.get(game_id)
+    if not game_state:
         raise HTTPException(status_code=404, detail="Game not found")
-    return GameState(**game)
+    return GameResponse(game_state.with_format(format))
 
 @api_router.get("/games/room/{room_code}", response_model=GameState)
-async def get_game_by_room(room_code: str):
+async def get_game_by_room(room_code: str, format: BoardFormat = "packed"):
     """Get game state by room code"""
-    game = await db.games.find_one({"room_code": room_code})
-    if not game:
+    game_state = await game_cache.get_by_room(room_code)
+    if not game_state:
         raise HTTPException(status_code=404, detail="Game room not found")
-    return GameState(**game)
+    return GameResponse(game_state.with_format(format))
 
 @api_router.post("/games/{game_id}/join")
-async def join_game(game_id: str, request: JoinGameRequest):
-    """Join an existing game"""
-    game = await db.games.find_one({"room_code": request.room_code})
-    if not game:
+async def join_game(game_id: str, request: JoinGameRequest, if_match: Optional[str] = Header(None)):
+    """Join an existing game; the room code must be the game's"""
+    room = await game_cache.get_summary(game_id)
+    if not room or room.room_code != request.room_code:
         raise HTTPException(status_code=404, detail="Game room not found")
     
-    game_state = GameState(**game)
-    
-    # Check if game is full
-    if len(game_state.players) >= 4:
-        raise HTTPException(status_code=400, detail="Game is full")
+    async with game_cache.lock(game_id):
+        current = await game_cache.get(game_id)
+        if not current:
+            raise HTTPException(status_code=404, detail="Game room not found")
+        check_version(current, parse_if_match(if_match))
+        
+        # Only waiting rooms with a free seat take players
+        if current.game_status != "waiting":
+            raise HTTPException(status_code=400, detail="Game already started")
+        if len(current.players) >= current.max_players:
+            raise HTTPException(status_code=400, detail="Game is full")
+        
+        game_state, new_player, fields = seat_player(current, request.element)
+        try:
+            await game_cache.commit(game_state, fields)
+        except StaleGame:
+            raise HTTPException(status_code=409, detail="Game was modified concurrently, please retry")
     
-    # Add new player
-    player_colors = ['#ff5722', '#2196f3', '#4caf50', '#9c27b0']
+    # Outside the lock, so slow watchers never hold up the next write
+    await broadcast_join(game_state, new_player)
+    return {"message": "Joined game successfully", "game_id": game_id, "version": game_state.version}
+
+def seat_player(current: GameState, element: str) -> Tuple[GameState, Player, Dict[str, Any]]:
+    """Copy of a waiting room with one more player, the player, and the fields to persist
+
+    The room starts once every seat is taken.
+    """
+    seat = len(current.players)
     new_player = Player(
-        id=len(game_state.players),
-        element=request.element,
-        color=player_colors[len(game_state.players)],
+        id=seat,
+        element=element,
+        color=PLAYER_COLORS[seat],
         is_ai=False
     )
-    game_state.players.append(new_player)
-    
-    # Start game if we have enough players
-    if len(game_state.players) >= 2:
+    game_state = current.model_copy(update={"players": [*current.players, new_player]})
+    game_state.open_seats = game_state.max_players - len(game_state.players)
+    if game_state.open_seats <= 0:
         game_state.game_status = "active"
-    
-    # Update in database
     game_state.updated_at = datetime.utcnow()
-    await db.games.replace_one({"id": game_id}, game_state.dict())
-    
-    return {"message": "Joined game successfully", "game_id": game_id}
+    game_state.version += 1
+    return game_state, new_player, {
+        f"players.{seat}": new_player.dict(),
+        "max_players": game_state.max_players,
+        "open_seats": game_state.open_seats,
+        "game_status": game_state.game_status,
+        "updated_at": game_state.updated_at,
+        "version": game_state.version
+    }
 
-@api_router.post("/games/{game_id}/move")
-async def make_move(game_id: str, move: GameMove):
-    """Make a move in the game"""
-    game = await db.games.find_one({"id": game_id})
-    if not game:
-        raise HTTPException(status_code=404, detail="Game not found")
-    
-    game_state = GameState(**game)
-    
-    # Validate move
+async def broadcast_join(game_state: GameState, player: Player):
+    await publish_game_event(game_state.id, {
+        "type": "join",
+        "version": game_state.version,
+        "player": player.dict(),
+        "game_status": game_state.game_status,
+        "updated_at": game_state.updated_at
+    })
+
+# One quick-match room opening at a time per (map size, room size) in this worker
+quick_match_locks: Dict[tuple, asyncio.Lock] = {}
+
+@api_router.get("/lobby")
+async def list_lobby(map_size: Optional[str] = None, min_seats: int = Query(1, ge=1, le=MAX_PLAYERS - 1),
+                     max_players: Optional[int] = Query(None, ge=2, le=MAX_PLAYERS),
+                     limit: int = Query(50, ge=1, le=200)):
+    """Waiting rooms with at least ``min_seats`` free seats, closest to starting first"""
+    rooms = await storage.list_open_games(map_size, min_seats, max_players, limit)
+    return ORJSONResponse([{
+        "id": room["id"],
+        "room_code": room.get("room_code"),
+        "map_size": room.get("map_size"),
+        "max_players": room.get("max_players"),
+        "open_seats": room.get("open_seats"),
+        "elements": [p["element"] for p in room.get("players", [])],
+        "created_at": room.get("created_at"),
+    } for room in rooms])
+
+# Open rooms a quick match tries before opening its own
+QUICK_MATCH_CANDIDATES = 20
+
+@api_router.post("/lobby/quick-match")
+async def quick_match(request: QuickMatchRequest):
+    """Take a seat in the fullest open room that fits, or open a new room
+
+    Seats are claimed like joins, under the room's lock and through the
+    cache, so a claim never overtakes a join still waiting to be written,
+    and concurrent players never get the same seat. Rooms are opened under
+    a per-worker lock that first retries the claim, so a burst of players
+    fills rooms instead of each opening their own.
+    """
+    async def claim() -> Optional[Tuple[GameState, Player]]:
+        rooms = await storage.list_open_games(request.map_size, 1, request.max_players, QUICK_MATCH_CANDIDATES)
+        for room in rooms:
+            async with game_cache.lock(room["id"]):
+                current = await game_cache.get(room["id"])
+                # The stored summary may be behind the cached game
+                if not current or current.game_status != "waiting" or current.open_seats <= 0:
+                    continue
+                game_state, new_player, fields = seat_player(current, request.element)
+                try:
+                    await game_cache.commit(game_state, fields)
+                except StaleGame:
+                    continue  # another worker took the seat
+                return game_state, new_player
+        return None
+
+    claimed = await claim()
+    if claimed is None:
+        key = (request.map_size, request.max_players)
+        async with quick_match_locks.setdefault(key, asyncio.Lock()):
+            claimed = await claim()
+            if claimed is None:
+                game_state = await open_game(CreateGameRequest(
+                    element=request.element, mode="online", map_size=request.map_size,
+                    player_count=request.max_players or 2
+                ))
+                return {"game_id": game_state.id, "room_code": game_state.room_code, "player_id": 0,
+                        "game_status": game_state.game_status, "version": game_state.version, "created": True}
+
+    game_state, new_player = claimed
+    await broadcast_join(game_state, new_player)
+    return {"game_id": game_state.id, "room_code": game_state.room_code, "player_id": new_player.id,
+            "game_status": game_state.game_status, "version": game_state.version, "created": False}
+
+def update_players(game_state: GameState, fields: Dict[str, Any], territories: List[int], armies: List[int]):
+    """Copy engine totals onto the players, adding a field for each change"""
+    for player, held, pool in zip(game_state.players, territories, armies):
+        if player.territories != held:
+            player.territories = held
+            fields[f"players.{player.id}.territories"] = held
+        if player.armies != pool:
+            player.armies = pool
+            fields[f"players.{player.id}.armies"] = pool
+
+def play_move(game_state: GameState, move: GameMove, board: PackedBoard, fields: Dict[str, Any],
+              chunks: Set[str]) -> Dict[str, Any]:
+    """Validate one move and apply it to a working copy of the game and its board
+
+    Changed fields and board chunks are added to ``fields`` and ``chunks``;
+    returns the move's part of the change event.
+    """
+    if game_state.game_status == "waiting":
+        raise HTTPException(status_code=400, detail="Game has not started, seats are still open")
+    if game_state.game_status != "active":
+        raise HTTPException(status_code=400, detail="Game is over")
     if game_state.current_player != move.player_id:
         raise HTTPException(status_code=400, detail="Not your turn")
     
+    line = None
+    army = None
+    captured = []
+    
     if move.move_type == "line":
         # Process line drawing move
-        line_data = move.data
-        is_horizontal = line_data.get("is_horizontal", True)
-        x, y = line_data.get("x", 0), line_data.get("y", 0)
-        
-        if is_horizontal:
-            if y < len(game_state.horizontal_lines) and x < len(game_state.horizontal_lines[y]):
-                line = game_state.horizontal_lines[y][x]
-                if line.get("state") == "empty":
-                    game_state.horizontal_lines[y][x]["state"] = "drawn"
-                    game_state.horizontal_lines[y][x]["owner"] = move.player_id
-        else:
-            if y < len(game_state.vertical_lines) and x < len(game_state.vertical_lines[y]):
-                line = game_state.vertical_lines[y][x]
-                if line.get("state") == "empty":
-                    game_state.vertical_lines[y][x]["state"] = "drawn"
-                    game_state.vertical_lines[y][x]["owner"] = move.player_id
+        if game_state.game_phase != "drawing":
+            raise HTTPException(status_code=400, detail="Lines can only be drawn in the drawing phase")
+        engine = LineEngine(
+            board,
+            [p.element for p in game_state.players],
+            current_player=game_state.current_player,
+            territories=[p.territories for p in game_state.players]
+        )
         
-        # Check for completed squares and update territories
-        # (This is a simplified version - full implementation would check all affected squares)
+        # Draw the line, claim completed squares and keep the turn on a capture;
+        # drawn or out-of-range lines are rejected after reading just that line
+        try:
+            is_horizontal, x, y = move_line(move.data)
+            result = engine.apply_line(move.player_id, is_horizontal, x, y)
+        except IllegalMove as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        game_state.current_player = engine.current_player
+        armies = [p.armies for p in game_state.players]
+        line = {"is_horizontal": is_horizontal, "x": x, "y": y, "owner": move.player_id}
+        captured = [{"x": cx, "y": cy} for cx, cy in result.captured]
+        chunks.add(line_chunk(board.size, is_horizontal, x, y))
+        chunks.update(cell_chunk(cx, cy) for cx, cy in result.captured)
+        if result.game_over:
+            game_state.game_status = "finished"
+            fields["game_status"] = game_state.game_status
+        if game_state.current_player != move.player_id:
+            # Whoever gets the turn is reinforced, as in the army phase: that changes the
+            # reinforcement totals and the cells earth regrew, not every cell they own
+            regrown = start_turn(board, engine.elements, game_state.current_player, armies, engine.territories,
+                                 seed=game_state.move_count + 1)
+            chunks.update(cell_chunk(cx, cy) for cx, cy in regrown)
+            chunks.add(REINFORCED_KEY)
+        update_players(game_state, fields, engine.territories, armies)
         
-        # Next player's turn
-        game_state.current_player = (game_state.current_player + 1) % len(game_state.players)
+        fields["current_player"] = game_state.current_player
     
     elif move.move_type == "army_move":
-        # Process army movement
-        # Implementation for army movement logic
-        pass
+        # Move armies, fight, then reinforce whoever is next
+        if game_state.game_phase != "army":
+            raise HTTPException(status_code=400, detail="Armies can only move in the army phase")
+        engine = ArmyEngine(
+            board,
+            [p.element for p in game_state.players],
+            current_player=game_state.current_player,
+            armies=[p.armies for p in game_state.players]
+        )
+        try:
+            from_x, from_y, to_x, to_y = move_cells(move.data)
+            result = engine.move(move.player_id, from_x, from_y, to_x, to_y, seed=game_state.move_count + 1)
+        except IllegalMove as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        
+        army = {"from": {"x": from_x, "y": from_y}, "to": {"x": to_x, "y": to_y}, "conquered": result.conquered}
+        captured = [{"x": cx, "y": cy} for cx, cy in result.claimed]
+        chunks.update(cell_chunk(cx, cy) for cx, cy in ((from_x, from_y), (to_x, to_y), *result.claimed, *result.regrown))
+        if not result.game_over:
+            chunks.add(REINFORCED_KEY)
+        update_players(game_state, fields, engine.territories, engine.armies)
+        game_state.current_player = engine.current_player
+        fields["current_player"] = game_state.current_player
+        if result.game_over:
+            game_state.game_status = "finished"
+            fields["game_status"] = game_state.game_status
     
-    # Update game state
-    game_state.updated_at = datetime.utcnow()
-    await db.games.replace_one({"id": game_id}, game_state.dict())
+    elif move.move_type == "phase":
+        # Switch between drawing lines and moving armies; the turn stays
+        phase = move.data.get("phase")
+        if phase not in ("drawing", "army"):
+            raise HTTPException(status_code=400, detail="phase must be 'drawing' or 'army'")
+        game_state.game_phase = phase
+        fields["game_phase"] = phase
+    
+    else:
+        raise HTTPException(status_code=400, detail=f"Unknown move type {move.move_type!r}")
+    
+    # Seeds of later moves in a batch follow the move count, as if played one by one
+    game_state.move_count += 1
+    return {"player_id": move.player_id, "line": line, "army": army, "captured": captured}
+
+async def apply_moves(game_id: str, moves: List[GameMove],
+                      expected_version: Optional[int] = None) -> Tuple[GameState, List[Dict[str, Any]]]:
+    """Validate, apply, log and persist moves in order, all or none, then notify watchers
+
+    The moves are logged in one write and the game in another, as a single
+    version; watchers get one ``move`` event, or a ``moves`` event listing
+    them when there are several. Returns the new state and each move's changes.
+
+    The moves change the cached board in place, recorded in its journal:
+    the changes are undone as soon as the fields to write are known and
+    redone only once the write is accepted, so readers of the cached state
+    never see a board from a write that has not (or never) happened.
+    """
+    async with game_cache.lock(game_id):
+        current = await game_cache.get(game_id)
+        if not current:
+            raise HTTPException(status_code=404, detail="Game not found")
+        check_version(current, expected_version)
+        
+        # Players are the only nested values moves change; the board is shared, see above
+        game_state = current.model_copy(update={"players": [player.model_copy() for player in current.players]})
+        fields = {}
+        board = game_state.live_board()
+        chunks = set()  # stored chunks of the board the moves changed
+        steps = []
+        journal = board.start_journal()
+        try:
+            for index, move in enumerate(moves):
+                try:
+                    steps.append(play_move(game_state, move, board, fields, chunks))
+                except HTTPException as e:
+                    if len(moves) == 1:
+                        raise
+                    raise HTTPException(status_code=e.status_code, detail=f"Move {index}: {e.detail}")
+            if journal:
+                if current.is_legacy:
+                    # Legacy document: switch it over to the packed layout
+                    fields.update({"grid": [], "horizontal_lines": [], "vertical_lines": []})
+                fields.update(board_fields(board, chunks))
+        finally:
+            board.end_journal()
+            board.undo(journal)
+        if journal:
+            game_state.store_board(board, fields.get("board"))
+        
+        # Update only the changed fields, and only if nobody else wrote since our read
+        game_state.updated_at = datetime.utcnow()
+        game_state.version += 1
+        fields.update({
+            "updated_at": game_state.updated_at,
+            "version": game_state.version,
+            "move_count": game_state.move_count
+        })
+        try:
+            await game_cache.commit(game_state, fields, accepted=lambda: board.redo(journal))
+        except StaleGame:
+            raise HTTPException(status_code=409, detail="Game was modified concurrently, please retry")
+        
+        # Log the moves only once they are committed, so a failed write never leaves
+        # entries behind that the next move would collide with
+        await move_log.record(game_id, current.move_count + 1, [move.dict() for move in moves])
+        
+        if move_log.wants_snapshot(game_state.move_count, len(moves)):
+            await move_log.snapshot(
+                game_id,
+                game_state.move_count,
+                game_state.board_bytes(),
+                game_state.current_player,
+                [p.territories for p in game_state.players],
+                [p.armies for p in game_state.players]
+            )
     
-    return {"message": "Move processed successfully"}
+    # Outside the lock, so slow watchers never hold up the next move; events
+    # carry the version, so a receiver can tell if one overtakes another
+    message = {"type": "move", **steps[0]} if len(steps) == 1 else {"type": "moves", "moves": steps}
+    await publish_game_event(game_id, {
+        **message,
+        "version": game_state.version,
+        "current_player": game_state.current_player,
+        "game_phase": game_state.game_phase,
+        "game_status": game_state.game_status,
+        "territories": [p.territories for p in game_state.players],
+        "updated_at": game_state.updated_at
+    })
+    return game_state, steps
+
+async def apply_move(game_id: str, move: GameMove, expected_version: Optional[int] = None) -> Dict[str, Any]:
+    """Validate, apply, log and persist one move, then notify watchers"""
+    game_state, steps = await apply_moves(game_id, [move], expected_version)
+    return {
+        "message": "Move processed successfully",
+        "version": game_state.version,
+        "captured": steps[0]["captured"],
+        "current_player": game_state.current_player,
+        "game_phase": game_state.game_phase,
+        "game_status": game_state.game_status
+    }
+
+def schedule_ai_turns(game_state: Optional[GameState]):
+    """Let AI players take their turns in the background once it is their move"""
+    if not game_state or game_state.game_status != "active":
+        return
+    if not game_state.players[game_state.current_player].is_ai:
+        return
+    running = ai_tasks.get(game_state.id)
+    if running is not None and not running.done():
+        return
+    ai_tasks[game_state.id] = asyncio.create_task(play_ai_turns(game_state.id))
+
+async def play_ai_turns(game_id: str):
+    """Play AI turns, then hand the game back
+
+    The task leaves ``ai_tasks`` before it finishes, and looks at the turn
+    once more afterwards: a human who moved after its last look found the
+    entry still there and left the AI's next turn to this task.
+    """
+    try:
+        handed_over = await take_ai_turns(game_id)
+    finally:
+        if ai_tasks.get(game_id) is asyncio.current_task():
+            del ai_tasks[game_id]
+    if handed_over:
+        schedule_ai_turns(await game_cache.get(game_id))
+
+async def take_ai_turns(game_id: str) -> bool:
+    """Play moves for AI players until a human is to move or the game ends; False if a move was rejected"""
+    while True:
+        game_state = await game_cache.get(game_id)
+        if not game_state or game_state.game_status != "active":
+            return True
+        player = game_state.players[game_state.current_player]
+        if not player.is_ai:
+            return True
+        
+        if game_state.game_phase == "army":
+            # Greedy army move; with nothing to move, go back to drawing lines
+            engine = ArmyEngine(game_state.packed_board(), [p.element for p in game_state.players],
+                                current_player=player.id)
+            choice = engine.best_move(player.id)
+            if choice is None:
+                moves = [GameMove(game_id=game_id, player_id=player.id, move_type="phase", data={"phase": "drawing"})]
+            else:
+                from_x, from_y, to_x, to_y = choice
+                moves = [GameMove(game_id=game_id, player_id=player.id, move_type="army_move",
+                                  data={"from": {"x": from_x, "y": from_y}, "to": {"x": to_x, "y": to_y}})]
+        else:
+            # Plan the whole capture chain on a scratch board and submit it as one batch;
+            # the chain shares one move budget
+            engine = LineEngine(game_state.packed_board(), [p.element for p in game_state.players],
+                                current_player=player.id)
+            moves = []
+            deadline = time.monotonic() + AI_MOVE_BUDGET
+            while engine.current_player == player.id and not engine.game_over:
+                budget = max(deadline - time.monotonic(), 0)
+                choice = await ai.find_move(engine.board, player.id, len(game_state.players), budget)
+                engine.apply_line(player.id, choice["is_horizontal"], choice["x"], choice["y"])
+                moves.append(GameMove(
+                    game_id=game_id,
+                    player_id=player.id,
+                    move_type="line",
+                    data={"is_horizontal": choice["is_horizontal"], "x": choice["x"], "y": choice["y"]}
+                ))
+        try:
+            await apply_moves(game_id, moves, expected_version=game_state.version)
+        except HTTPException as e:
+            if e.status_code != 409:
+                logger.warning("AI move for game %s rejected: %s", game_id, e.detail)
+                return False
+            # The game changed while we were thinking; search again
+
+@api_router.post("/games/{game_id}/move")
+async def make_move(game_id: str, move: GameMove, if_match: Optional[str] = Header(None)):
+    """Make a move in the game"""
+    result = await apply_move(game_id, move, parse_if_match(if_match))
+    schedule_ai_turns(await game_cache.get(game_id))
+    return result
+
+@api_router.post("/games/{game_id}/moves")
+async def make_moves(game_id: str, batch: MoveBatch, if_match: Optional[str] = Header(None)):
+    """Make several moves in order, e.g. a capture chain, as one all-or-nothing write
+
+    Returns each move's changes and the state after the last one.
+    """
+    if any(move.game_id != game_id for move in batch.moves):
+        raise HTTPException(status_code=400, detail="Every move must be for this game")
+    game_state, steps = await apply_moves(game_id, batch.moves, parse_if_match(if_match))
+    schedule_ai_turns(game_state)
+    return {
+        "message": "Moves processed successfully",
+        "version": game_state.version,
+        "moves": steps,
+        "current_player": game_state.current_player,
+        "game_phase": game_state.game_phase,
+        "game_status": game_state.game_status,
+        "territories": [p.territories for p in game_state.players]
+    }
+
+def line_bits(mask) -> str:
+    """Base64 bitmask of a line mask, bit i (little-endian within each byte) for line index i"""
+    return base64.urlsafe_b64encode(np.packbits(mask.ravel(), bitorder="little").tobytes()).decode()
+
+@api_router.get("/games/{game_id}/legal-moves")
+async def get_legal_moves(game_id: str, if_none_match: Optional[str] = Header(None)):
+    """Lines the current player may draw, as bitmasks, plus the ones that would complete a cell
+
+    ``horizontal`` and ``vertical`` are base64 bitmasks over the board's line
+    indexes (horizontal line (x, y) is bit ``y * size + x``, vertical line
+    (x, y) bit ``y * (size + 1) + x``); both are empty unless the game is
+    active and in the drawing phase. The ETag is the game version.
+    """
+    game_state = await game_cache.get(game_id)
+    if not game_state:
+        raise HTTPException(status_code=404, detail="Game not found")
+
+    etag = f'"{game_state.version}"'
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    engine = LineEngine(game_state.live_board(), [p.element for p in game_state.players],
+                        current_player=game_state.current_player)
+    h_free, v_free = engine.free_lines()
+    h_capturing, v_capturing = engine.capturing_lines()
+    if game_state.game_phase != "drawing" or game_state.game_status != "active":
+        h_free, v_free, h_capturing, v_capturing = (np.zeros_like(mask) for mask in (h_free, v_free, h_free, v_free))
+    capturing = [{"is_horizontal": True, "x": int(x), "y": int(y)} for y, x in zip(*np.nonzero(h_capturing))]
+    capturing += [{"is_horizontal": False, "x": int(x), "y": int(y)} for y, x in zip(*np.nonzero(v_capturing))]
+    return ORJSONResponse({
+        "version": game_state.version,
+        "current_player": game_state.current_player,
+        "game_phase": game_state.game_phase,
+        "size": engine.board.size,
+        "count": int(np.count_nonzero(h_free) + np.count_nonzero(v_free)),
+        "horizontal": line_bits(h_free),
+        "vertical": line_bits(v_free),
+        "capturing": capturing,
+    }, headers={"ETag": etag})
+
+@api_router.get("/games/{game_id}/board")
+async def get_board_region(game_id: str, x: int = Query(0, ge=0), y: int = Query(0, ge=0),
+                           width: int = Query(32, ge=1, le=MAX_VIEWPORT), height: int = Query(32, ge=1, le=MAX_VIEWPORT),
+                           format: BoardFormat = "packed", if_none_match: Optional[str] = Header(None)):
+    """A viewport of the board, for maps too big to fetch whole
+
+    Packed responses carry the base64 chunk blobs covering the viewport
+    (CHUNK_SIZE cells a side; ``{"x-y": blob}`` by chunk column and row)
+    and the players' reinforcement totals (REINFORCED_KEY), legacy ones
+    the cells and lines of the viewport itself. Games that are not cached
+    only read those chunks from storage.
+    """
+    game_state = await game_cache.get_summary(game_id)
+    if not game_state:
+        raise HTTPException(status_code=404, detail="Game not found")
+    size = grid_size_for(game_state.map_size)
+    if x >= size or y >= size:
+        raise HTTPException(status_code=400, detail=f"Viewport must start on the {size}x{size} board")
+    keys = region_chunks(size, x, y, width, height) + [REINFORCED_KEY]
+    if not game_state.has_board:
+        # Not cached, so only a summary came back: read just the chunks under the viewport
+        game_state = await game_cache.get_chunks(game_id, keys)
+        if not game_state:
+            raise HTTPException(status_code=404, detail="Game not found")
+
+    etag = f'"{game_state.version}"'
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    board = game_state.live_board()
+    region = {"version": game_state.version, "size": board.size, "x": x, "y": y,
+              "width": min(width, board.size - x), "height": min(height, board.size - y)}
+    if format == "legacy":
+        region["grid"], region["horizontal_lines"], region["vertical_lines"] = board.to_legacy(x, y, width, height)
+    else:
+        region["chunk_size"] = CHUNK_SIZE
+        region["chunks"] = {key: base64.urlsafe_b64encode(blob).decode() for key, blob in board.chunks(keys).items()}
+    return ORJSONResponse(region, headers={"ETag": etag})
 
 @api_router.get("/games/{game_id}/status")
-async def get_game_status(game_id: str):
-    """Get current game status for real-time updates"""
-    game = await db.games.find_one({"id": game_id})
-    if not game:
+async def get_game_status(game_id: str, if_none_match: Optional[str] = Header(None)):
+    """Get current game status for real-time updates
+
+    Served from the cache or a board-less summary; the ETag is the game
+    version, so unchanged polls with If-None-Match get an empty 304.
+    """
+    game_state = await game_cache.get_summary(game_id)
+    if not game_state:
         raise HTTPException(status_code=404, detail="Game not found")
     
-    game_state = GameState(**game)
-    return {
+    etag = f'"{game_state.version}"'
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    return ORJSONResponse({
         "current_player": game_state.current_player,
         "game_phase": game_state.game_phase,
         "game_status": game_state.game_status,
         "players": [{"element": p.element, "territories": p.territories} for p in game_state.players],
-        "updated_at": game_state.updated_at
-    }
+        "updated_at": game_state.updated_at,
+        "version": game_state.version
+    }, headers={"ETag": etag})
+
+@api_router.get("/games/{game_id}/replay", response_model=GameState)
+async def replay_game(game_id: str, seq: Optional[int] = None, format: BoardFormat = "packed"):
+    """Rebuild the game as it was right after move number `seq` (default: latest)"""
+    game_state = await game_cache.get(game_id)
+    if not game_state:
+        raise HTTPException(status_code=404, detail="Game not found")
+    if seq is None:
+        seq = game_state.move_count
+    if not 0 <= seq <= game_state.move_count:
+        raise HTTPException(status_code=400, detail=f"seq must be between 0 and {game_state.move_count}")
+    
+    replayed = await move_log.rebuild(game_id, seq, game_state.map_size, [p.element for p in game_state.players])
+    players = [
+        player.model_copy(update={"territories": territories, "armies": armies})
+        for player, territories, armies in zip(game_state.players, replayed.territories, replayed.armies)
+    ]
+    # Moves stop once a game is over, so only its last move can have finished it
+    snapshot = game_state.model_copy(update={
+        "players": players,
+        "current_player": replayed.current_player,
+        "game_status": game_state.game_status if seq == game_state.move_count else replayed.game_status,
+        "move_count": seq
+    })
+    snapshot.store_board(replayed.board)
+    return GameResponse(snapshot.with_format(format))
+
+@api_router.get("/games/{game_id}/archive")
+async def get_archived_game(game_id: str):
+    """Final score and packed move log (base64) of an archived game"""
+    record = await storage.get_archive(game_id)
+    if not record:
+        raise HTTPException(status_code=404, detail="Archived game not found")
+    record["moves"] = base64.urlsafe_b64encode(record["moves"]).decode()
+    return ORJSONResponse(record)
+
+@api_router.get("/cache/stats")
+async def get_cache_stats():
+    """Hit/miss/eviction counters of the live game cache"""
+    return game_cache.stats_dict()
+
+def live_game_metrics():
+    """Cache and WebSocket gauges, read at scrape time"""
+    cache_gauge = metrics.Gauge("game_cache", "Live game cache counters and sizes", ("stat",))
+    for stat, value in game_cache.stats_dict().items():
+        cache_gauge.set(stat, value=value)
+    sockets = metrics.Gauge("websocket_connections", "Open game WebSocket connections")
+    sockets.set(value=connections.total())
+    bus = metrics.Gauge("game_events", "Game change events on the cross-worker bus", ("stat",))
+    for stat, value in events.stats.items():
+        bus.set(stat, value=value)
+    viewers = metrics.Gauge("spectator_frames", "Spectator frames encoded and viewers skipped forward", ("stat",))
+    for stat, value in spectators.stats.items():
+        viewers.set(stat, value=value)
+    viewers.set("viewers", value=spectators.viewer_count())
+    return [cache_gauge, sockets, bus, viewers]
+
+metrics.registry.add_collector(live_game_metrics)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Prometheus text exposition of request, database and cache metrics, at the conventional /metrics"""
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
+
+@api_router.websocket("/games/{game_id}/ws")
+async def game_updates(websocket: WebSocket, game_id: str, format: BoardFormat = "packed"):
+    """Push a snapshot on connect, then a delta for every committed move or join"""
+    await websocket.accept()
+    game_state = await game_cache.get(game_id)
+    if not game_state:
+        await websocket.close(code=4404, reason="Game not found")
+        return
+    
+    # The snapshot is queued ahead of any delta; clients drop deltas whose version
+    # is not newer than the snapshot's
+    snapshot = game_state.with_format(format)
+    connections.connect(game_id, websocket, {"type": "snapshot", "version": snapshot.version,
+                                             "game": snapshot.model_dump(mode="json")})
+    try:
+        while True:
+            # Nothing to read from clients; this just waits for the disconnect
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        connections.disconnect(game_id, websocket)
+
+@api_router.websocket("/games/room/{room_code}/spectate")
+async def spectate_game(websocket: WebSocket, room_code: str):
+    """Watch an online game: a snapshot, then the frames every spectator shares
+
+    Frames are a snapshot every SPECTATOR_SNAPSHOT_EVERY versions and the
+    move/join deltas in between; a spectator that falls SPECTATOR_QUEUE_SIZE
+    frames behind skips ahead to a fresh snapshot.
+    """
+    await websocket.accept()
+    game_state = await game_cache.get_summary_by_room(room_code)
+    if not game_state:
+        await websocket.close(code=4404, reason="Game room not found")
+        return
+    
+    viewer = await spectators.join(game_state.id)
+    
+    async def send_frames():
+        while True:
+            await websocket.send_text(await viewer.queue.get())
+    
+    sender = asyncio.create_task(send_frames())
+    try:
+        while True:
+            # Spectators are read-only; this just waits for the disconnect
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        sender.cancel()
+        spectators.leave(game_state.id, viewer)
 
 # Include the router in the main app
 app.include_router(api_router)
@@ -308,6 +1204,7 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(metrics.MetricsMiddleware)
 
 # Configure logging
 logging.basicConfig(
@@ -316,6 +1213,19 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def start_game_cache():
+    await storage.ensure_indexes()
+    await events.start()
+    game_cache.start()
+    archiver.start()
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+    for task in list(ai_tasks.values()):
+        task.cancel()
+    ai.shutdown_pool()
+    await archiver.stop()
+    await game_cache.stop()
+    await events.stop()
+    await storage.close()
\ No newline at end of file
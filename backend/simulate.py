@@ -0,0 +1,216 @@
+"""Headless self-play simulator for balance testing
+
+Plays many games in-process with the same board model and move rules the
+server uses (reinforcement on every turn pass included), spread across a
+multiprocessing pool, and streams one row per game to a CSV or Parquet file.
+
+    python simulate.py --games 5000 --map-size large --players 3 \
+        --strategies greedy,random,search --out results.csv
+"""
+
+import argparse
+import multiprocessing
+import os
+import random
+import time
+from functools import lru_cache, partial
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+
+import pandas as pd
+
+import ai
+from army import start_turn
+from board import ELEMENTS, PackedBoard, all_lines, parse_map_size
+from engine import LineEngine
+
+
+Line = Tuple[bool, int, int]
+Strategy = Callable[[LineEngine, List[Line], random.Random], Line]
+
+
+@lru_cache(maxsize=None)
+def line_cells(size: int) -> Dict[Line, Tuple[int, ...]]:
+    """Cell indices bordering each line"""
+    cells = {}
+    for is_horizontal, x, y in all_lines(size):
+        if is_horizontal:
+            neighbours = ((x, y - 1), (x, y))
+        else:
+            neighbours = ((x - 1, y), (x, y))
+        cells[(is_horizontal, x, y)] = tuple(cy * size + cx for cx, cy in neighbours if 0 <= cx < size and 0 <= cy < size)
+    return cells
+
+
+def random_strategy(engine: LineEngine, free: List[Line], rng: random.Random) -> Line:
+    return rng.choice(free)
+
+
+def greedy_strategy(engine: LineEngine, free: List[Line], rng: random.Random) -> Line:
+    """Complete a box if possible, else avoid giving one away"""
+    cells = line_cells(engine.board.size)
+    safe = []
+    for line in free:
+        most = max(engine.side_count(cell) for cell in cells[line])
+        if most == 3:
+            return line
+        if most < 2:
+            safe.append(line)
+    return rng.choice(safe or free)
+
+
+def search_strategy(engine: LineEngine, free: List[Line], rng: random.Random, budget: float = 0.01) -> Line:
+    choice = ai.choose_line(engine.board.to_bytes(), engine.current_player, engine.player_count, budget)
+    return choice["is_horizontal"], choice["x"], choice["y"]
+
+
+STRATEGIES: Dict[str, Strategy] = {
+    "random": random_strategy,
+    "greedy": greedy_strategy,
+    "search": search_strategy,
+}
+
+
+def play_game(index: int, map_size: str, strategies: Sequence[str], seed: int, search_budget: float) -> Dict[str, Any]:
+    """Play one game to the end and summarize it as a result row"""
+    rng = random.Random(seed + index)
+    players = [
+        partial(search_strategy, budget=search_budget) if name == "search" else STRATEGIES[name]
+        for name in strategies
+    ]
+    size = parse_map_size(map_size)
+    engine = LineEngine(PackedBoard(size), ELEMENTS[:len(players)])
+    free = all_lines(size)
+    positions = {line: i for i, line in enumerate(free)}
+
+    armies = [3] * len(players)
+
+    start = time.perf_counter()
+    moves = 0
+    while not engine.game_over:
+        player_id = engine.current_player
+        line = players[player_id](engine, free, rng)
+        engine.apply_line(player_id, *line)
+        moves += 1
+        if engine.current_player != player_id:
+            # Seeded by the move number, as the server seeds it with the move's sequence number
+            start_turn(engine.board, engine.elements, engine.current_player, armies, engine.territories, seed=moves)
+
+        # Swap-remove the drawn line from the free list
+        i = positions.pop(line)
+        last = free.pop()
+        if last != line:
+            free[i] = last
+            positions[last] = i
+
+    territories = engine.territories
+    best = max(territories)
+    winners = [player for player, score in enumerate(territories) if score == best]
+    row = {
+        "game": index,
+        "seed": seed + index,
+        "map_size": map_size,
+        "player_count": len(players),
+        "strategies": ",".join(strategies),
+        "moves": moves,
+        "winner": winners[0] if len(winners) == 1 else -1,
+        "duration_ms": (time.perf_counter() - start) * 1000,
+    }
+    for player in range(4):
+        row[f"territories_{player}"] = territories[player] if player < len(territories) else None
+        row[f"armies_{player}"] = armies[player] if player < len(armies) else None
+    return row
+
+
+class ResultWriter:
+    """Append result rows to CSV or Parquet in chunks"""
+
+    def __init__(self, path: str, chunk_size: int):
+        self.path = path
+        self.chunk_size = chunk_size
+        self.rows: List[Dict[str, Any]] = []
+        self.parquet = path.endswith(".parquet")
+        self._writer = None
+        self._wrote_header = False
+
+    def add(self, row: Dict[str, Any]):
+        self.rows.append(row)
+        if len(self.rows) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        if not self.rows:
+            return
+        frame = pd.DataFrame(self.rows)
+        self.rows = []
+        if self.parquet:
+            # Parquet output needs pyarrow, which is optional
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            table = pa.Table.from_pandas(frame, preserve_index=False)
+            if self._writer is None:
+                self._writer = pq.ParquetWriter(self.path, table.schema)
+            self._writer.write_table(table)
+        else:
+            frame.to_csv(self.path, mode="a" if self._wrote_header else "w", header=not self._wrote_header, index=False)
+            self._wrote_header = True
+
+    def close(self):
+        self.flush()
+        if self._writer is not None:
+            self._writer.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run headless Elemental Conquest games in parallel")
+    parser.add_argument("--games", type=int, default=1000)
+    parser.add_argument("--map-size", default="medium", help="small, medium, large or <n>x<n>")
+    parser.add_argument("--players", type=int, choices=[2, 3, 4], default=2)
+    parser.add_argument("--strategies", default="greedy,random",
+                        help="comma-separated strategy per seat, cycled to fill all seats "
+                             f"({', '.join(STRATEGIES)})")
+    parser.add_argument("--search-budget", type=float, default=0.01, help="seconds per move for 'search'")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default="simulation.csv", help=".csv or .parquet")
+    parser.add_argument("--chunk-size", type=int, default=500, help="rows buffered per write")
+    args = parser.parse_args()
+
+    try:
+        parse_map_size(args.map_size)
+    except ValueError as e:
+        parser.error(str(e))
+    names = args.strategies.split(",")
+    unknown = [name for name in names if name not in STRATEGIES]
+    if unknown:
+        parser.error(f"unknown strategies: {', '.join(unknown)}")
+    strategies = [names[i % len(names)] for i in range(args.players)]
+    if args.out.endswith(".parquet"):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            parser.error("Parquet output needs pyarrow; install it or write .csv")
+
+    worker = partial(play_game, map_size=args.map_size, strategies=strategies, seed=args.seed,
+                     search_budget=args.search_budget)
+    writer = ResultWriter(args.out, args.chunk_size)
+    wins = [0] * (args.players + 1)
+
+    start = time.perf_counter()
+    with multiprocessing.Pool(args.workers) as pool:
+        for row in pool.imap_unordered(worker, range(args.games), chunksize=max(1, args.games // (args.workers * 16))):
+            writer.add(row)
+            wins[row["winner"]] += 1
+    writer.close()
+    elapsed = time.perf_counter() - start
+
+    rate = args.games / elapsed
+    print(f"{args.games} games on {args.map_size} with {args.players} players in {elapsed:.2f}s "
+          f"({rate:.0f} games/s, {rate / args.workers:.0f} games/s/core on {args.workers} workers)")
+    for player, name in enumerate(strategies):
+        print(f"  player {player} ({name}): {wins[player] / args.games:.1%} wins")
+    print(f"  ties: {wins[-1] / args.games:.1%}")
+    print(f"results written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""Read-only spectator streams whose frames are shared by every viewer
+
+Each watched game has one stream. Every change event from the event bus
+becomes one encoded frame for that game version: a full snapshot when
+``snapshot_every`` versions have passed since the last one, otherwise the
+move/join delta itself. The same string is queued for every viewer, so
+encoding costs scale with games and versions, not with viewers.
+
+Viewers have bounded queues. A viewer whose queue is full is skipped
+forward: its backlog is dropped and it gets the snapshot of the current
+version (encoded at most once per version), after which it follows the
+shared frames again.
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+
+import orjson
+
+
+class Viewer:
+    __slots__ = ("queue",)
+
+    def __init__(self, queue_size: int):
+        self.queue: "asyncio.Queue[str]" = asyncio.Queue(queue_size)
+
+
+class GameStream:
+    __slots__ = ("viewers", "version", "snapshot", "snapshot_version", "lock")
+
+    def __init__(self):
+        self.viewers: Set[Viewer] = set()
+        self.version = -1  # newest version framed so far
+        self.snapshot: Optional[str] = None
+        self.snapshot_version = -1
+        self.lock = asyncio.Lock()
+
+
+class Spectators:
+    """Shared frame streams for the games that have spectators in this worker"""
+
+    def __init__(self, load_game: Callable[[str], Awaitable[Any]], encode_game: Callable[[Any], Dict[str, Any]],
+                 snapshot_every: int = 20, queue_size: int = 64):
+        self.load_game = load_game
+        self.encode_game = encode_game
+        self.snapshot_every = snapshot_every
+        self.queue_size = queue_size
+        self.stats = {"snapshots": 0, "deltas": 0, "skipped": 0}
+        self._streams: Dict[str, GameStream] = {}
+
+    def viewer_count(self) -> int:
+        return sum(len(stream.viewers) for stream in self._streams.values())
+
+    async def join(self, game_id: str) -> Viewer:
+        """Register a viewer, starting it off with a snapshot of the current version"""
+        stream = self._streams.setdefault(game_id, GameStream())
+        viewer = Viewer(self.queue_size)
+        async with stream.lock:
+            snapshot = await self._snapshot(game_id, stream)
+            if snapshot is not None:
+                viewer.queue.put_nowait(snapshot)
+            stream.viewers.add(viewer)
+        return viewer
+
+    def leave(self, game_id: str, viewer: Viewer):
+        stream = self._streams.get(game_id)
+        if stream is None:
+            return
+        stream.viewers.discard(viewer)
+        if not stream.viewers and not stream.lock.locked():
+            del self._streams[game_id]
+
+    async def on_event(self, event: Dict[str, Any]):
+        """Event bus handler: frame the change once and queue it for every viewer"""
+        stream = self._streams.get(event["game_id"])
+        if stream is None:
+            return
+        message = event["message"]
+        async with stream.lock:
+            if message["version"] <= stream.version:
+                return
+            if message["version"] - stream.snapshot_version >= self.snapshot_every:
+                frame = await self._snapshot(event["game_id"], stream)
+            else:
+                frame = orjson.dumps(message).decode()
+                stream.version = message["version"]
+                self.stats["deltas"] += 1
+            if frame is not None:
+                await self._push(event["game_id"], stream, frame)
+        if not stream.viewers and self._streams.get(event["game_id"]) is stream:
+            # The last viewer left while the frame was being made
+            del self._streams[event["game_id"]]
+
+    async def _snapshot(self, game_id: str, stream: GameStream) -> Optional[str]:
+        """Snapshot frame of the game as it is now, reused until the version moves on"""
+        game = await self.load_game(game_id)
+        if game is None:
+            return None
+        if game.version != stream.snapshot_version:
+            stream.snapshot = orjson.dumps({
+                "type": "snapshot", "version": game.version, "game": self.encode_game(game)
+            }).decode()
+            stream.snapshot_version = game.version
+            self.stats["snapshots"] += 1
+        stream.version = max(stream.version, game.version)
+        return stream.snapshot
+
+    async def _push(self, game_id: str, stream: GameStream, frame: str):
+        lagging = []
+        for viewer in stream.viewers:
+            try:
+                viewer.queue.put_nowait(frame)
+            except asyncio.QueueFull:
+                lagging.append(viewer)
+        if not lagging:
+            return
+        snapshot = await self._snapshot(game_id, stream)
+        for viewer in lagging:
+            self.stats["skipped"] += 1
+            while not viewer.queue.empty():
+                viewer.queue.get_nowait()
+            if snapshot is not None:
+                viewer.queue.put_nowait(snapshot)
@@ -0,0 +1,969 @@
+"""Pluggable persistence for games, move logs and status checks
+
+The server talks to a Storage object instead of Motor collections. Three
+backends are provided and picked with the STORAGE_BACKEND env var:
+
+- ``mongo`` (default): MongoDB through Motor, configured by MONGO_URL/DB_NAME
+- ``memory``: plain dicts in this process, for tests and load benchmarks
+- ``sqlite``: a single SQLite file (SQLITE_PATH), no external services
+
+Documents are plain dicts in the shape the Mongo backend stores. Updates are
+flat ``$set``-style field maps whose keys may be dotted paths such as
+``players.1.territories``.
+"""
+
+import asyncio
+import copy
+import os
+import sqlite3
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Tuple
+
+import bson
+
+
+GameUpdate = Tuple[str, int, Dict[str, Any]]  # (game id, expected version, fields)
+
+# Statuses of games that still hold their room code
+OPEN_STATUSES = ["waiting", "active"]
+
+# Everything status, lobby and room lookups need: the game minus its board
+SUMMARY_FIELDS = (
+    "id", "room_code", "map_size", "players", "current_player", "game_phase",
+    "game_status", "created_at", "updated_at", "version", "move_count",
+    "max_players", "open_seats",
+)
+# Board fields of games small enough to keep the board in one piece
+UNCHUNKED_BOARD_FIELDS = ("board", "grid", "horizontal_lines", "vertical_lines")
+
+
+class DuplicateGame(Exception):
+    """A game with this id, or an open game with this room code, already exists
+
+    ``kept`` lists games of a batch insert that stayed stored anyway because
+    they changed before the batch could be rolled back.
+    """
+
+    def __init__(self, message: str, kept: Sequence[str] = ()):
+        super().__init__(message)
+        self.kept = list(kept)
+
+
+def set_path(doc: Dict[str, Any], path: str, value: Any):
+    """Assign a dotted path the way Mongo's $set does, appending to lists at their end"""
+    *parents, last = path.split(".")
+    target: Any = doc
+    for part in parents:
+        target = target[int(part)] if isinstance(target, list) else target.setdefault(part, {})
+    if isinstance(target, list):
+        index = int(last)
+        if index == len(target):
+            target.append(value)
+        else:
+            target[index] = value
+    else:
+        target[last] = value
+
+
+def apply_fields(doc: Dict[str, Any], fields: Dict[str, Any]):
+    for path, value in fields.items():
+        set_path(doc, path, copy.deepcopy(value))
+
+
+def summarize(doc: Dict[str, Any]) -> Dict[str, Any]:
+    return {name: doc[name] for name in SUMMARY_FIELDS if name in doc}
+
+
+def select_chunks(doc: Dict[str, Any], keys: Sequence[str]) -> Dict[str, Any]:
+    """Summary of a game plus the listed board chunks, or its whole board if it is not chunked"""
+    selected = summarize(doc)
+    for name in UNCHUNKED_BOARD_FIELDS:
+        if name in doc:
+            selected[name] = doc[name]
+    if "board_chunks" in doc:
+        selected["board_chunks"] = {key: doc["board_chunks"][key] for key in keys if key in doc["board_chunks"]}
+    return selected
+
+
+class Storage(ABC):
+    """Persistence operations the game server needs"""
+
+    name = "abstract"
+
+    async def ensure_indexes(self):
+        pass
+
+    async def close(self):
+        pass
+
+    # Games
+    @abstractmethod
+    async def get_game(self, game_id: str) -> Optional[Dict[str, Any]]: ...
+
+    @abstractmethod
+    async def get_game_by_room(self, room_code: str) -> Optional[Dict[str, Any]]: ...
+
+    @abstractmethod
+    async def get_game_summary(self, game_id: str) -> Optional[Dict[str, Any]]:
+        """The game's SUMMARY_FIELDS only, without loading the board"""
+
+    @abstractmethod
+    async def get_game_summary_by_room(self, room_code: str) -> Optional[Dict[str, Any]]: ...
+
+    @abstractmethod
+    async def get_game_summaries(self, game_ids: Sequence[str]) -> List[Dict[str, Any]]:
+        """SUMMARY_FIELDS of every listed game that exists, in one query and in no particular order"""
+
+    @abstractmethod
+    async def get_game_chunks(self, game_id: str, keys: Sequence[str]) -> Optional[Dict[str, Any]]:
+        """The game's SUMMARY_FIELDS and only the listed ``board_chunks``; unchunked boards come back whole"""
+
+    @abstractmethod
+    async def insert_game(self, doc: Dict[str, Any]):
+        """Insert a new game; raises DuplicateGame on an id or open room code clash"""
+
+    @abstractmethod
+    async def update_game(self, game_id: str, expected_version: int, fields: Dict[str, Any]) -> bool:
+        """Set fields if the game is still at expected_version; False if it is not"""
+
+    async def update_games(self, updates: Sequence[GameUpdate]) -> List[str]:
+        """Apply several conditional updates, returning the ids of the games that did not match"""
+        lost = []
+        for game_id, expected_version, fields in updates:
+            if not await self.update_game(game_id, expected_version, fields):
+                lost.append(game_id)
+        return lost
+
+    @abstractmethod
+    async def list_games(self, game_status: Optional[str] = None, limit: int = 100) -> List[Dict[str, Any]]: ...
+
+    @abstractmethod
+    async def list_idle_games(self, game_status: str, updated_before: datetime, limit: int) -> List[Dict[str, Any]]:
+        """Summaries of games in a status not updated since ``updated_before``, oldest first"""
+
+    @abstractmethod
+    async def delete_game(self, game_id: str, expected_version: int) -> bool:
+        """Delete a game if it is still at expected_version"""
+
+    @abstractmethod
+    async def list_open_games(self, map_size: Optional[str] = None, min_seats: int = 1,
+                              max_players: Optional[int] = None, limit: int = 50) -> List[Dict[str, Any]]:
+        """Summaries of waiting games with at least ``min_seats`` open seats, fullest and then oldest first"""
+
+    async def insert_games(self, docs: Sequence[Dict[str, Any]]):
+        """Insert many games in order, all or none: after a DuplicateGame the ones inserted are deleted again"""
+        inserted = []
+        try:
+            for doc in docs:
+                await self.insert_game(doc)
+                inserted.append(doc)
+        except DuplicateGame as e:
+            await self._roll_back(inserted, e)
+            raise
+
+    async def _roll_back(self, docs: Sequence[Dict[str, Any]], error: DuplicateGame):
+        """Delete games of a failed batch insert, noting in ``error.kept`` any a writer got to first"""
+        for doc in docs:
+            if not await self.delete_game(doc["id"], doc.get("version") or 0):
+                error.kept.append(doc["id"])
+
+    # Counters
+    @abstractmethod
+    async def next_sequence(self, name: str, count: int = 1) -> int:
+        """Atomically reserve ``count`` consecutive values of a named counter, returning the first"""
+
+    # Move log
+    @abstractmethod
+    async def put_moves(self, docs: Sequence[Dict[str, Any]]):
+        """Write committed moves of one game at once, replacing whatever is logged at their (game_id, seq)"""
+
+    @abstractmethod
+    async def list_moves(self, game_id: str, after_seq: int, upto_seq: int) -> List[Dict[str, Any]]: ...
+
+    @abstractmethod
+    async def save_snapshot(self, doc: Dict[str, Any]): ...
+
+    @abstractmethod
+    async def latest_snapshot(self, game_id: str, upto_seq: int) -> Optional[Dict[str, Any]]: ...
+
+    @abstractmethod
+    async def delete_history(self, game_id: str):
+        """Drop a game's logged moves and snapshots"""
+
+    # Archive
+    @abstractmethod
+    async def save_archive(self, doc: Dict[str, Any]):
+        """Insert or replace the archived record of a game"""
+
+    @abstractmethod
+    async def get_archive(self, game_id: str) -> Optional[Dict[str, Any]]: ...
+
+    # Status checks
+    @abstractmethod
+    async def insert_status_check(self, doc: Dict[str, Any]): ...
+
+    @abstractmethod
+    async def page_status_checks(self, after: Optional[str], limit: int) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Up to ``limit`` status checks in insertion order after an opaque cursor
+
+        Returns the page and the cursor of the next one (None on the last
+        page); raises ValueError for a cursor this backend did not issue.
+        """
+
+    async def iter_status_checks(self, after: Optional[str] = None, batch_size: int = 500) -> AsyncIterator[Dict[str, Any]]:
+        """Every status check after a cursor, fetched a batch at a time"""
+        while True:
+            docs, after = await self.page_status_checks(after, batch_size)
+            for doc in docs:
+                yield doc
+            if after is None:
+                return
+
+    @abstractmethod
+    async def expire_status_checks(self, before: datetime) -> int:
+        """Delete status checks older than ``before``, returning how many"""
+
+
+class MongoStorage(Storage):
+    name = "mongo"
+
+    def __init__(self, client, db):
+        self.client = client
+        self.db = db
+
+    @staticmethod
+    def version_filter(version: int) -> Dict[str, Any]:
+        """Match a game at a version; documents from before versioning count as 0"""
+        if version == 0:
+            return {"version": {"$in": [0, None]}}
+        return {"version": version}
+
+    async def ensure_indexes(self):
+        """Create the indexes every query relies on (idempotent)
+
+        The room code index only covers open games that have a code, so
+        finished games never block a code and local games (code null) never
+        block each other; partial indexes with $in need MongoDB 6.0 or newer.
+        An older definition of the index is replaced.
+        """
+        await self.db.games.create_index("id", unique=True)
+        open_room = {"game_status": {"$in": OPEN_STATUSES}, "room_code": {"$type": "string"}}
+        existing = (await self.db.games.index_information()).get("open_room_code")
+        if existing is not None and existing.get("partialFilterExpression") != open_room:
+            await self.db.games.drop_index("open_room_code")
+        await self.db.games.create_index(
+            "room_code", unique=True, name="open_room_code", partialFilterExpression=open_room
+        )
+        await self.db.games.create_index([("game_status", 1), ("updated_at", 1)])
+        await self.db.games.create_index(
+            [("map_size", 1), ("open_seats", 1), ("created_at", 1)], name="lobby",
+            partialFilterExpression={"game_status": "waiting"}
+        )
+        await self.db.game_moves.create_index([("game_id", 1), ("seq", 1)], unique=True)
+        await self.db.game_snapshots.create_index([("game_id", 1), ("seq", -1)], unique=True)
+        await self.db.games_archive.create_index("id", unique=True)
+        await self.db.status_checks.create_index("timestamp")
+
+    async def close(self):
+        self.client.close()
+
+    async def get_game(self, game_id):
+        return await self.db.games.find_one({"id": game_id})
+
+    @staticmethod
+    def room_filter(room_code: str) -> Dict[str, Any]:
+        """The open game holding a room code; implies the open_room_code index filter"""
+        return {"room_code": room_code, "game_status": {"$in": OPEN_STATUSES}}
+
+    async def get_game_by_room(self, room_code):
+        return await self.db.games.find_one(self.room_filter(room_code))
+
+    _SUMMARY_PROJECTION = {"_id": 0, **{name: 1 for name in SUMMARY_FIELDS}}
+
+    async def get_game_summary(self, game_id):
+        return await self.db.games.find_one({"id": game_id}, self._SUMMARY_PROJECTION)
+
+    async def get_game_summary_by_room(self, room_code):
+        return await self.db.games.find_one(self.room_filter(room_code), self._SUMMARY_PROJECTION)
+
+    async def get_game_summaries(self, game_ids):
+        return await self.db.games.find({"id": {"$in": list(game_ids)}}, self._SUMMARY_PROJECTION).to_list(None)
+
+    async def get_game_chunks(self, game_id, keys):
+        projection = {
+            **self._SUMMARY_PROJECTION,
+            **{name: 1 for name in UNCHUNKED_BOARD_FIELDS},
+            **{f"board_chunks.{key}": 1 for key in keys},
+        }
+        return await self.db.games.find_one({"id": game_id}, projection)
+
+    async def insert_game(self, doc):
+        from pymongo.errors import DuplicateKeyError
+        try:
+            await self.db.games.insert_one(dict(doc))
+        except DuplicateKeyError:
+            raise DuplicateGame(doc.get("room_code") or doc["id"])
+
+    async def insert_games(self, docs):
+        from pymongo.errors import BulkWriteError
+        if not docs:
+            return
+        try:
+            # Ordered, so the games before the first clash are exactly the ones inserted
+            await self.db.games.insert_many([dict(doc) for doc in docs], ordered=True)
+        except BulkWriteError as e:
+            error = DuplicateGame(f"game {e.details['nInserted']} of {len(docs)}")
+            await self._roll_back(docs[:e.details['nInserted']], error)
+            raise error
+
+    async def next_sequence(self, name, count=1):
+        from pymongo import ReturnDocument
+        counter = await self.db.counters.find_one_and_update(
+            {"_id": name}, {"$inc": {"value": count}}, upsert=True, return_document=ReturnDocument.AFTER
+        )
+        return counter["value"] - count
+
+    async def update_game(self, game_id, expected_version, fields):
+        result = await self.db.games.update_one(
+            {"id": game_id, **self.version_filter(expected_version)},
+            {"$set": fields}
+        )
+        return result.matched_count == 1
+
+    async def update_games(self, updates):
+        from pymongo import UpdateOne
+        if not updates:
+            return []
+        result = await self.db.games.bulk_write([
+            UpdateOne({"id": game_id, **self.version_filter(version)}, {"$set": fields})
+            for game_id, version, fields in updates
+        ], ordered=False)
+        if result.matched_count == len(updates):
+            return []
+        # The bulk result only counts matches, and a concurrent writer may have moved a game to
+        # the same version: an update was lost if the game does not hold the values it set
+        projection = {"_id": 0, "id": 1, **{path.split(".")[0]: 1 for _, _, fields in updates for path in fields}}
+        stored = {doc["id"]: doc async for doc in self.db.games.find(
+            {"id": {"$in": [game_id for game_id, _, _ in updates]}}, projection)}
+        return [game_id for game_id, _, fields in updates
+                if game_id not in stored or not self._holds(stored[game_id], fields)]
+
+    @staticmethod
+    def _holds(doc: Dict[str, Any], fields: Dict[str, Any]) -> bool:
+        """Whether a stored game has every value of a $set, compared as BSON stores them"""
+        for path, value in bson.decode(bson.encode({"fields": fields}))["fields"].items():
+            target: Any = doc
+            for part in path.split("."):
+                try:
+                    target = target[int(part)] if isinstance(target, list) else target[part]
+                except (IndexError, KeyError, ValueError):
+                    return False
+            if target != value:
+                return False
+        return True
+
+    async def list_games(self, game_status=None, limit=100):
+        query = {} if game_status is None else {"game_status": game_status}
+        return await self.db.games.find(query).to_list(limit)
+
+    async def list_idle_games(self, game_status, updated_before, limit):
+        return await self.db.games.find(
+            {"game_status": game_status, "updated_at": {"$lt": updated_before}}, self._SUMMARY_PROJECTION
+        ).sort("updated_at", 1).to_list(limit)
+
+    async def delete_game(self, game_id, expected_version):
+        result = await self.db.games.delete_one({"id": game_id, **self.version_filter(expected_version)})
+        return result.deleted_count == 1
+
+    _LOBBY_SORT = [("open_seats", 1), ("created_at", 1)]
+
+    @staticmethod
+    def _lobby_filter(map_size, min_seats, max_players) -> Dict[str, Any]:
+        query: Dict[str, Any] = {"game_status": "waiting", "open_seats": {"$gte": min_seats}}
+        if map_size is not None:
+            query["map_size"] = map_size
+        if max_players is not None:
+            query["max_players"] = max_players
+        return query
+
+    async def list_open_games(self, map_size=None, min_seats=1, max_players=None, limit=50):
+        return await self.db.games.find(
+            self._lobby_filter(map_size, min_seats, max_players), self._SUMMARY_PROJECTION
+        ).sort(self._LOBBY_SORT).limit(limit).to_list(limit)
+
+    async def put_moves(self, docs):
+        from pymongo import ReplaceOne
+        await self.db.game_moves.bulk_write([
+            ReplaceOne({"game_id": doc["game_id"], "seq": doc["seq"]}, dict(doc), upsert=True) for doc in docs
+        ])
+
+    async def list_moves(self, game_id, after_seq, upto_seq):
+        return await self.db.game_moves.find(
+            {"game_id": game_id, "seq": {"$gt": after_seq, "$lte": upto_seq}}
+        ).sort("seq", 1).to_list(None)
+
+    async def save_snapshot(self, doc):
+        await self.db.game_snapshots.replace_one(
+            {"game_id": doc["game_id"], "seq": doc["seq"]}, doc, upsert=True
+        )
+
+    async def latest_snapshot(self, game_id, upto_seq):
+        return await self.db.game_snapshots.find_one(
+            {"game_id": game_id, "seq": {"$lte": upto_seq}},
+            sort=[("seq", -1)]
+        )
+
+    async def delete_history(self, game_id):
+        await self.db.game_moves.delete_many({"game_id": game_id})
+        await self.db.game_snapshots.delete_many({"game_id": game_id})
+
+    async def save_archive(self, doc):
+        await self.db.games_archive.replace_one({"id": doc["id"]}, doc, upsert=True)
+
+    async def get_archive(self, game_id):
+        return await self.db.games_archive.find_one({"id": game_id}, {"_id": 0})
+
+    async def insert_status_check(self, doc):
+        await self.db.status_checks.insert_one(dict(doc))
+
+    @staticmethod
+    def _after_filter(after: Optional[str]) -> Dict[str, Any]:
+        from bson import ObjectId
+        from bson.errors import InvalidId
+        if after is None:
+            return {}
+        try:
+            return {"_id": {"$gt": ObjectId(after)}}
+        except InvalidId:
+            raise ValueError(f"Invalid cursor {after!r}")
+
+    async def page_status_checks(self, after, limit):
+        docs = await self.db.status_checks.find(self._after_filter(after)).sort("_id", 1).limit(limit).to_list(limit)
+        return docs, str(docs[-1]["_id"]) if len(docs) == limit else None
+
+    async def iter_status_checks(self, after=None, batch_size=500):
+        cursor = self.db.status_checks.find(self._after_filter(after)).sort("_id", 1).batch_size(batch_size)
+        async for doc in cursor:
+            yield doc
+
+    async def expire_status_checks(self, before):
+        result = await self.db.status_checks.delete_many({"timestamp": {"$lt": before}})
+        return result.deleted_count
+
+
+class MemoryStorage(Storage):
+    """Everything in process memory; documents are copied in and out"""
+
+    name = "memory"
+
+    def __init__(self):
+        self.games: Dict[str, Dict[str, Any]] = {}
+        self.rooms: Dict[str, str] = {}
+        self.moves: Dict[str, Dict[int, Dict[str, Any]]] = {}
+        self.snapshots: Dict[str, Dict[int, Dict[str, Any]]] = {}
+        self.status_checks: Dict[int, Dict[str, Any]] = {}  # insertion sequence -> document
+        self._status_seq = 0
+        self.counters: Dict[str, int] = {}
+        self.archive: Dict[str, Dict[str, Any]] = {}
+
+    async def get_game(self, game_id):
+        doc = self.games.get(game_id)
+        return copy.deepcopy(doc) if doc else None
+
+    def _open_room(self, room_code: str) -> Optional[str]:
+        game_id = self.rooms.get(room_code)
+        doc = self.games.get(game_id) if game_id else None
+        return game_id if doc is not None and doc.get("game_status") in OPEN_STATUSES else None
+
+    async def get_game_by_room(self, room_code):
+        game_id = self._open_room(room_code)
+        return await self.get_game(game_id) if game_id else None
+
+    async def get_game_summary(self, game_id):
+        doc = self.games.get(game_id)
+        return copy.deepcopy(summarize(doc)) if doc else None
+
+    async def get_game_summary_by_room(self, room_code):
+        game_id = self._open_room(room_code)
+        return await self.get_game_summary(game_id) if game_id else None
+
+    async def get_game_summaries(self, game_ids):
+        return [copy.deepcopy(summarize(self.games[game_id])) for game_id in game_ids if game_id in self.games]
+
+    async def get_game_chunks(self, game_id, keys):
+        doc = self.games.get(game_id)
+        return copy.deepcopy(select_chunks(doc, keys)) if doc else None
+
+    async def insert_game(self, doc):
+        if doc["id"] in self.games:
+            raise DuplicateGame(doc["id"])
+        room_code = doc.get("room_code")
+        if room_code and doc.get("game_status") in OPEN_STATUSES:
+            holder = self.games.get(self.rooms.get(room_code))
+            if holder is not None and holder.get("game_status") in OPEN_STATUSES:
+                raise DuplicateGame(room_code)
+            self.rooms[room_code] = doc["id"]
+        self.games[doc["id"]] = copy.deepcopy(doc)
+
+    async def next_sequence(self, name, count=1):
+        first = self.counters.get(name, 0)
+        self.counters[name] = first + count
+        return first
+
+    async def update_game(self, game_id, expected_version, fields):
+        doc = self.games.get(game_id)
+        if doc is None or (doc.get("version") or 0) != expected_version:
+            return False
+        apply_fields(doc, fields)
+        return True
+
+    async def list_games(self, game_status=None, limit=100):
+        docs = [doc for doc in self.games.values() if game_status is None or doc.get("game_status") == game_status]
+        return copy.deepcopy(docs[:limit])
+
+    async def list_idle_games(self, game_status, updated_before, limit):
+        docs = sorted(
+            (doc for doc in self.games.values()
+             if doc.get("game_status") == game_status and doc["updated_at"] < updated_before),
+            key=lambda doc: doc["updated_at"]
+        )
+        return [copy.deepcopy(summarize(doc)) for doc in docs[:limit]]
+
+    async def delete_game(self, game_id, expected_version):
+        doc = self.games.get(game_id)
+        if doc is None or (doc.get("version") or 0) != expected_version:
+            return False
+        del self.games[game_id]
+        if self.rooms.get(doc.get("room_code")) == game_id:
+            del self.rooms[doc["room_code"]]
+        return True
+
+    def _open_games(self, map_size, min_seats, max_players) -> List[Dict[str, Any]]:
+        docs = [
+            doc for doc in self.games.values()
+            if doc.get("game_status") == "waiting" and (doc.get("open_seats") or 0) >= min_seats
+            and (map_size is None or doc.get("map_size") == map_size)
+            and (max_players is None or doc.get("max_players") == max_players)
+        ]
+        return sorted(docs, key=lambda doc: (doc["open_seats"], doc["created_at"]))
+
+    async def list_open_games(self, map_size=None, min_seats=1, max_players=None, limit=50):
+        return [copy.deepcopy(summarize(doc)) for doc in self._open_games(map_size, min_seats, max_players)[:limit]]
+
+    async def put_moves(self, docs):
+        for doc in docs:
+            self.moves.setdefault(doc["game_id"], {})[doc["seq"]] = copy.deepcopy(doc)
+
+    async def list_moves(self, game_id, after_seq, upto_seq):
+        moves = self.moves.get(game_id, {})
+        return [copy.deepcopy(moves[seq]) for seq in sorted(moves) if after_seq < seq <= upto_seq]
+
+    async def save_snapshot(self, doc):
+        self.snapshots.setdefault(doc["game_id"], {})[doc["seq"]] = copy.deepcopy(doc)
+
+    async def latest_snapshot(self, game_id, upto_seq):
+        snapshots = self.snapshots.get(game_id, {})
+        seqs = [seq for seq in snapshots if seq <= upto_seq]
+        return copy.deepcopy(snapshots[max(seqs)]) if seqs else None
+
+    async def delete_history(self, game_id):
+        self.moves.pop(game_id, None)
+        self.snapshots.pop(game_id, None)
+
+    async def save_archive(self, doc):
+        self.archive[doc["id"]] = copy.deepcopy(doc)
+
+    async def get_archive(self, game_id):
+        doc = self.archive.get(game_id)
+        return copy.deepcopy(doc) if doc else None
+
+    async def insert_status_check(self, doc):
+        self._status_seq += 1
+        self.status_checks[self._status_seq] = copy.deepcopy(doc)
+
+    async def page_status_checks(self, after, limit):
+        try:
+            start = int(after) if after is not None else 0
+        except ValueError:
+            raise ValueError(f"Invalid cursor {after!r}")
+        seqs = [seq for seq in self.status_checks if seq > start][:limit]
+        docs = [copy.deepcopy(self.status_checks[seq]) for seq in seqs]
+        return docs, str(seqs[-1]) if len(seqs) == limit else None
+
+    async def expire_status_checks(self, before):
+        expired = [seq for seq, doc in self.status_checks.items() if doc["timestamp"] < before]
+        for seq in expired:
+            del self.status_checks[seq]
+        return len(expired)
+
+
+class SQLiteStorage(Storage):
+    """Documents stored as BSON blobs in SQLite, with the filtered fields as columns
+
+    Games also keep a BSON summary (SUMMARY_FIELDS) next to the full document
+    so summary reads never decode the board.
+
+    All statements run on one dedicated thread, which also makes each
+    read-check-write in update_game atomic.
+    """
+
+    name = "sqlite"
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS games (
+            id TEXT PRIMARY KEY,
+            room_code TEXT,
+            game_status TEXT,
+            version INTEGER NOT NULL DEFAULT 0,
+            doc BLOB NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS counters (
+            name TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS game_moves (
+            game_id TEXT NOT NULL,
+            seq INTEGER NOT NULL,
+            doc BLOB NOT NULL,
+            PRIMARY KEY (game_id, seq)
+        );
+        CREATE TABLE IF NOT EXISTS game_snapshots (
+            game_id TEXT NOT NULL,
+            seq INTEGER NOT NULL,
+            doc BLOB NOT NULL,
+            PRIMARY KEY (game_id, seq)
+        );
+        CREATE TABLE IF NOT EXISTS status_checks (
+            rowid INTEGER PRIMARY KEY,
+            doc BLOB NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS games_archive (
+            id TEXT PRIMARY KEY,
+            doc BLOB NOT NULL
+        );
+    """
+    # Columns added after the first release, created on open if missing
+    _ADDED_COLUMNS = {
+        "games": {
+            "summary": "BLOB", "updated_at": "TEXT",
+            "map_size": "TEXT", "max_players": "INTEGER", "open_seats": "INTEGER", "created_at": "TEXT",
+        },
+        "status_checks": {"timestamp": "TEXT"},
+    }
+    # Matches the games_open_room_code index, so room lookups use it
+    _OPEN = "game_status IN ('waiting', 'active')"
+    _INDEXES = """
+        CREATE INDEX IF NOT EXISTS games_room_code ON games (room_code);
+        CREATE UNIQUE INDEX IF NOT EXISTS games_open_room_code ON games (room_code)
+            WHERE game_status IN ('waiting', 'active');
+        DROP INDEX IF EXISTS games_status;
+        CREATE INDEX IF NOT EXISTS games_status_updated ON games (game_status, updated_at);
+        CREATE INDEX IF NOT EXISTS games_lobby ON games (map_size, open_seats, created_at)
+            WHERE game_status = 'waiting';
+        CREATE INDEX IF NOT EXISTS status_checks_timestamp ON status_checks (timestamp);
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite")
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.executescript(self._SCHEMA)
+            for table, added in self._ADDED_COLUMNS.items():
+                columns = {row[1] for row in self._conn.execute(f"PRAGMA table_info({table})")}
+                for column, kind in added.items():
+                    if column not in columns:
+                        self._conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {kind}")
+            self._conn.executescript(self._INDEXES)
+        return self._conn
+
+    async def _run(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, fn, *args)
+
+    @staticmethod
+    def _encode(doc: Dict[str, Any]) -> bytes:
+        return bson.encode({k: v for k, v in doc.items() if k != "_id"})
+
+    @staticmethod
+    def _decode(blob: bytes) -> Dict[str, Any]:
+        return bson.decode(blob)
+
+    @staticmethod
+    def _timestamp(value: Optional[datetime]) -> Optional[str]:
+        """Datetimes as sortable ISO strings"""
+        return value.isoformat(timespec="microseconds") if value is not None else None
+
+    # Every games column but id, in the order _game_row produces them
+    _GAME_COLUMNS = (
+        "room_code", "game_status", "version", "updated_at", "map_size", "max_players", "open_seats",
+        "created_at", "doc", "summary",
+    )
+
+    def _game_row(self, doc: Dict[str, Any]) -> tuple:
+        return (
+            doc.get("room_code"),
+            doc.get("game_status"),
+            doc.get("version") or 0,
+            self._timestamp(doc.get("updated_at")),
+            doc.get("map_size"),
+            doc.get("max_players"),
+            doc.get("open_seats"),
+            self._timestamp(doc.get("created_at")),
+            self._encode(doc),
+            self._encode(summarize(doc)),
+        )
+
+    async def ensure_indexes(self):
+        await self._run(self._connection)
+
+    async def close(self):
+        def close():
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+        await self._run(close)
+        self._executor.shutdown()
+
+    def _fetch_one(self, sql: str, params: tuple) -> Optional[Dict[str, Any]]:
+        row = self._connection().execute(sql, params).fetchone()
+        return self._decode(row[0]) if row else None
+
+    def _fetch_all(self, sql: str, params: tuple) -> List[Dict[str, Any]]:
+        return [self._decode(row[0]) for row in self._connection().execute(sql, params)]
+
+    async def get_game(self, game_id):
+        return await self._run(self._fetch_one, "SELECT doc FROM games WHERE id = ?", (game_id,))
+
+    async def get_game_by_room(self, room_code):
+        return await self._run(self._fetch_one, f"SELECT doc FROM games WHERE room_code = ? AND {self._OPEN} LIMIT 1",
+                               (room_code,))
+
+    async def get_game_summary(self, game_id):
+        return await self._run(self._fetch_summary, "id", game_id)
+
+    async def get_game_summary_by_room(self, room_code):
+        return await self._run(self._fetch_summary, "room_code", room_code, self._OPEN)
+
+    async def get_game_summaries(self, game_ids):
+        return await self._run(self._fetch_summaries, list(game_ids))
+
+    async def get_game_chunks(self, game_id, keys):
+        # Documents are stored whole here, so the chunks are picked after decoding
+        doc = await self.get_game(game_id)
+        return select_chunks(doc, keys) if doc else None
+
+    def _fetch_summary(self, column: str, value: str, condition: str = "1") -> Optional[Dict[str, Any]]:
+        row = self._connection().execute(
+            f"SELECT summary, id FROM games WHERE {column} = ? AND {condition} LIMIT 1", (value,)
+        ).fetchone()
+        if row is None:
+            return None
+        if row[0] is None:
+            # Written before the summary column existed
+            return summarize(self._fetch_one("SELECT doc FROM games WHERE id = ?", (row[1],)))
+        return self._decode(row[0])
+
+    def _fetch_summaries(self, game_ids: List[str]) -> List[Dict[str, Any]]:
+        if not game_ids:
+            return []
+        rows = self._connection().execute(
+            f"SELECT summary, id FROM games WHERE id IN ({', '.join('?' * len(game_ids))})", game_ids
+        ).fetchall()
+        return [
+            self._decode(summary) if summary is not None
+            # Written before the summary column existed
+            else summarize(self._fetch_one("SELECT doc FROM games WHERE id = ?", (game_id,)))
+            for summary, game_id in rows
+        ]
+
+    def _insert_games(self, docs):
+        # One transaction, so a clash inserts none of them
+        try:
+            with self._connection() as conn:
+                conn.executemany(
+                    f"INSERT INTO games (id, {', '.join(self._GAME_COLUMNS)}) "
+                    f"VALUES (?{', ?' * len(self._GAME_COLUMNS)})",
+                    [(doc["id"], *self._game_row(doc)) for doc in docs]
+                )
+        except sqlite3.IntegrityError as e:
+            raise DuplicateGame(str(e))
+
+    async def insert_game(self, doc):
+        await self._run(self._insert_games, [doc])
+
+    async def insert_games(self, docs):
+        await self._run(self._insert_games, list(docs))
+
+    def _next_sequence(self, name, count):
+        with self._connection() as conn:
+            conn.execute("INSERT OR IGNORE INTO counters (name, value) VALUES (?, 0)", (name,))
+            conn.execute("UPDATE counters SET value = value + ? WHERE name = ?", (count, name))
+            (value,) = conn.execute("SELECT value FROM counters WHERE name = ?", (name,)).fetchone()
+        return value - count
+
+    async def next_sequence(self, name, count=1):
+        return await self._run(self._next_sequence, name, count)
+
+    def _update_games(self, updates: Sequence[GameUpdate]) -> List[str]:
+        lost = []
+        with self._connection() as conn:
+            for game_id, expected_version, fields in updates:
+                row = conn.execute("SELECT doc FROM games WHERE id = ? AND version = ?",
+                                   (game_id, expected_version)).fetchone()
+                if row is None:
+                    lost.append(game_id)
+                    continue
+                doc = self._decode(row[0])
+                apply_fields(doc, fields)
+                self._write_game(conn, game_id, doc)
+        return lost
+
+    def _write_game(self, conn: sqlite3.Connection, game_id: str, doc: Dict[str, Any]):
+        conn.execute(
+            f"UPDATE games SET {', '.join(f'{column} = ?' for column in self._GAME_COLUMNS)} WHERE id = ?",
+            (*self._game_row(doc), game_id)
+        )
+
+    async def update_game(self, game_id, expected_version, fields):
+        return not await self._run(self._update_games, [(game_id, expected_version, fields)])
+
+    async def update_games(self, updates):
+        return await self._run(self._update_games, list(updates))
+
+    async def list_games(self, game_status=None, limit=100):
+        if game_status is None:
+            return await self._run(self._fetch_all, "SELECT doc FROM games LIMIT ?", (limit,))
+        return await self._run(self._fetch_all, "SELECT doc FROM games WHERE game_status = ? LIMIT ?",
+                               (game_status, limit))
+
+    async def list_idle_games(self, game_status, updated_before, limit):
+        return await self._run(
+            self._fetch_all,
+            "SELECT summary FROM games WHERE game_status = ? AND updated_at < ? ORDER BY updated_at LIMIT ?",
+            (game_status, self._timestamp(updated_before), limit)
+        )
+
+    @staticmethod
+    def _lobby_query(columns: str, map_size, min_seats, max_players, limit) -> Tuple[str, tuple]:
+        # The literal 'waiting' lets SQLite use the partial games_lobby index
+        where, params = ["game_status = 'waiting'", "open_seats >= ?"], [min_seats]
+        if map_size is not None:
+            where.append("map_size = ?")
+            params.append(map_size)
+        if max_players is not None:
+            where.append("max_players = ?")
+            params.append(max_players)
+        sql = f"SELECT {columns} FROM games WHERE {' AND '.join(where)} ORDER BY open_seats, created_at LIMIT ?"
+        return sql, (*params, limit)
+
+    async def list_open_games(self, map_size=None, min_seats=1, max_players=None, limit=50):
+        return await self._run(self._fetch_all, *self._lobby_query("summary", map_size, min_seats, max_players, limit))
+
+    def _delete_game(self, game_id, expected_version):
+        with self._connection() as conn:
+            cursor = conn.execute("DELETE FROM games WHERE id = ? AND version = ?", (game_id, expected_version))
+        return cursor.rowcount == 1
+
+    async def delete_game(self, game_id, expected_version):
+        return await self._run(self._delete_game, game_id, expected_version)
+
+    def _put_moves(self, docs):
+        with self._connection() as conn:
+            conn.executemany("INSERT OR REPLACE INTO game_moves (game_id, seq, doc) VALUES (?, ?, ?)",
+                             [(doc["game_id"], doc["seq"], self._encode(doc)) for doc in docs])
+
+    async def put_moves(self, docs):
+        await self._run(self._put_moves, list(docs))
+
+    async def list_moves(self, game_id, after_seq, upto_seq):
+        return await self._run(
+            self._fetch_all,
+            "SELECT doc FROM game_moves WHERE game_id = ? AND seq > ? AND seq <= ? ORDER BY seq",
+            (game_id, after_seq, upto_seq)
+        )
+
+    def _save_snapshot(self, doc):
+        with self._connection() as conn:
+            conn.execute("INSERT OR REPLACE INTO game_snapshots (game_id, seq, doc) VALUES (?, ?, ?)",
+                         (doc["game_id"], doc["seq"], self._encode(doc)))
+
+    async def save_snapshot(self, doc):
+        await self._run(self._save_snapshot, doc)
+
+    async def latest_snapshot(self, game_id, upto_seq):
+        return await self._run(
+            self._fetch_one,
+            "SELECT doc FROM game_snapshots WHERE game_id = ? AND seq <= ? ORDER BY seq DESC LIMIT 1",
+            (game_id, upto_seq)
+        )
+
+    def _delete_history(self, game_id):
+        with self._connection() as conn:
+            conn.execute("DELETE FROM game_moves WHERE game_id = ?", (game_id,))
+            conn.execute("DELETE FROM game_snapshots WHERE game_id = ?", (game_id,))
+
+    async def delete_history(self, game_id):
+        await self._run(self._delete_history, game_id)
+
+    def _save_archive(self, doc):
+        with self._connection() as conn:
+            conn.execute("INSERT OR REPLACE INTO games_archive (id, doc) VALUES (?, ?)", (doc["id"], self._encode(doc)))
+
+    async def save_archive(self, doc):
+        await self._run(self._save_archive, doc)
+
+    async def get_archive(self, game_id):
+        return await self._run(self._fetch_one, "SELECT doc FROM games_archive WHERE id = ?", (game_id,))
+
+    def _insert_status_check(self, doc):
+        with self._connection() as conn:
+            conn.execute("INSERT INTO status_checks (timestamp, doc) VALUES (?, ?)",
+                         (self._timestamp(doc.get("timestamp")), self._encode(doc)))
+
+    async def insert_status_check(self, doc):
+        await self._run(self._insert_status_check, doc)
+
+    def _page_status_checks(self, start: int, limit: int):
+        rows = self._connection().execute(
+            "SELECT rowid, doc FROM status_checks WHERE rowid > ? ORDER BY rowid LIMIT ?", (start, limit)
+        ).fetchall()
+        docs = [self._decode(doc) for _, doc in rows]
+        return docs, str(rows[-1][0]) if len(rows) == limit else None
+
+    async def page_status_checks(self, after, limit):
+        try:
+            start = int(after) if after is not None else 0
+        except ValueError:
+            raise ValueError(f"Invalid cursor {after!r}")
+        return await self._run(self._page_status_checks, start, limit)
+
+    def _expire_status_checks(self, before):
+        with self._connection() as conn:
+            cursor = conn.execute("DELETE FROM status_checks WHERE timestamp < ?", (self._timestamp(before),))
+        return cursor.rowcount
+
+    async def expire_status_checks(self, before):
+        return await self._run(self._expire_status_checks, before)
+
+
+def create_storage(event_listeners: Sequence[Any] = ()) -> Storage:
+    """Storage backend selected by the STORAGE_BACKEND env var
+
+    ``event_listeners`` are pymongo monitoring listeners, used by the mongo backend only.
+    """
+    backend = os.environ.get('STORAGE_BACKEND', 'mongo')
+    if backend == 'mongo':
+        from motor.motor_asyncio import AsyncIOMotorClient
+        client = AsyncIOMotorClient(os.environ['MONGO_URL'], event_listeners=list(event_listeners))
+        return MongoStorage(client, client[os.environ['DB_NAME']])
+    if backend == 'memory':
+        return MemoryStorage()
+    if backend == 'sqlite':
+        return SQLiteStorage(os.environ.get('SQLITE_PATH', 'elemental_conquest.db'))
+    raise ValueError(f"Unknown STORAGE_BACKEND {backend!r} (expected mongo, memory or sqlite)")
@@ -0,0 +1,72 @@
+"""Server-side AI: background turns against a human player"""
+
+import asyncio
+
+import pytest
+
+from board import all_lines
+from tests.conftest import line_move, new_game
+
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def ai_app(app, monkeypatch):
+    monkeypatch.setattr(app, "AI_MOVE_BUDGET", 0.01)
+    yield app
+    for task in app.ai_tasks.values():
+        task.cancel()
+    app.ai_tasks.clear()
+    app.ai.shutdown_pool()
+
+
+async def ai_turns_done(app, game_id: str):
+    """Wait for the game's AI task, and for any task it handed the game on to"""
+    while (task := app.ai_tasks.get(game_id)) is not None and not task.done():
+        await asyncio.wait_for(task, 10)
+
+
+async def human_turn(app, game_id: str):
+    """Draw free lines for player 0 until the turn passes or the game ends"""
+    state = await app.game_cache.get(game_id)
+    while state.game_status == "active" and state.current_player == 0:
+        board = state.live_board()
+        line = next(line for line in all_lines(board.size) if board.line_owner(*line) is None)
+        await app.make_move(game_id, line_move(game_id, 0, *line), if_match=None)
+        state = await app.game_cache.get(game_id)
+    return state
+
+
+async def test_ai_plays_every_turn_against_a_human(ai_app):
+    app = ai_app
+    game = await new_game(app, map_size="4x4")
+    assert [player.is_ai for player in game.players] == [False, True]
+
+    turns = 0
+    state = game
+    while state.game_status == "active":
+        state = await human_turn(app, game.id)
+        await ai_turns_done(app, game.id)
+        state = await app.game_cache.get(game.id)
+        assert state.game_status == "finished" or state.current_player == 0
+        turns += 1
+    assert turns > 3
+    logged = await app.storage.list_moves(game.id, 0, state.move_count)
+    assert {move["player_id"] for move in logged} == {0, 1}
+    assert len(logged) == state.move_count == 40
+
+
+async def test_finished_ai_task_does_not_block_the_next_turn(ai_app):
+    app = ai_app
+    game = await new_game(app, map_size="4x4")
+    # The last turn's task has returned but its entry is still there
+    finished = asyncio.ensure_future(asyncio.sleep(0))
+    await finished
+    app.ai_tasks[game.id] = finished
+
+    state = await human_turn(app, game.id)
+    assert state.current_player == 1
+    await ai_turns_done(app, game.id)
+    state = await app.game_cache.get(game.id)
+    assert state.current_player == 0 and state.version > 1
@@ -0,0 +1,81 @@
+"""Archiver: finished games move to the archive, idle rooms and status checks expire"""
+
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from archive import Archiver
+from board import all_lines
+from movelog import unpack_moves
+from tests.conftest import line_move, new_game
+
+
+pytestmark = pytest.mark.anyio
+
+
+def archiver_for(app, **ages) -> Archiver:
+    """An archiver that never runs by itself; unset ages are far away"""
+    settings = {"finished_after": 3600, "stale_after": 3600, "waiting_ttl": 3600, "status_check_ttl": 3600, **ages}
+    return Archiver(app.storage, app.game_cache, interval=0, **settings)
+
+
+async def finished_game(app):
+    game = await new_game(app, map_size="3x3")
+    for line in all_lines(3):
+        current = await app.game_cache.get(game.id)
+        await app.apply_move(game.id, line_move(game.id, current.current_player, *line))
+    game = await app.game_cache.get(game.id)
+    assert game.game_status == "finished"
+    return game
+
+
+async def test_finished_games_are_archived(app):
+    game = await finished_game(app)
+    playing = await new_game(app)
+    await asyncio.sleep(0.01)
+
+    counts = await archiver_for(app, finished_after=0.001).sweep()
+    assert counts == {"finished": 1, "abandoned": 0, "expired": 0, "status_checks": 0}
+
+    assert await app.storage.get_game(game.id) is None
+    assert await app.game_cache.get(game.id) is None
+    assert await app.storage.list_moves(game.id, 0, game.move_count) == []
+    record = await app.storage.get_archive(game.id)
+    assert record["reason"] == "finished" and record["move_count"] == game.move_count
+    assert [p["territories"] for p in record["players"]] == [p.territories for p in game.players]
+    assert [move["data"] for move in unpack_moves(record["moves"])] == [
+        {"is_horizontal": h, "x": x, "y": y} for h, x, y in all_lines(3)]
+    assert await app.storage.get_game(playing.id) is not None
+
+
+async def test_waiting_rooms_expire_without_an_archive(app):
+    room = await new_game(app, mode="online")
+    await asyncio.sleep(0.01)
+
+    counts = await archiver_for(app, waiting_ttl=0.001).sweep()
+    assert counts["expired"] == 1
+    assert await app.storage.get_game(room.id) is None
+    assert await app.storage.get_archive(room.id) is None
+    assert await app.game_cache.get_by_room(room.room_code) is None
+
+
+async def test_games_written_after_listing_are_kept(app):
+    game = await new_game(app)
+    listed = await app.storage.get_game_summary(game.id)
+    await app.apply_move(game.id, line_move(game.id, 0, True, 0, 0))
+
+    assert not await archiver_for(app).retire(listed, "abandoned")
+    assert await app.storage.get_game(game.id) is not None
+    assert await app.storage.get_archive(game.id) is None
+
+
+async def test_old_status_checks_expire(app):
+    now = datetime.utcnow()
+    for age in (10, 7200, 9000):
+        await app.storage.insert_status_check({"id": str(age), "client_name": "probe",
+                                               "timestamp": now - timedelta(seconds=age)})
+
+    assert (await archiver_for(app).sweep())["status_checks"] == 2
+    docs, _ = await app.storage.page_status_checks(None, 10)
+    assert [doc["id"] for doc in docs] == ["10"]
@@ -0,0 +1,129 @@
+"""Army phase: moves, combat, reinforcement and the whole-board queries"""
+
+import itertools
+import random
+
+import numpy as np
+import pytest
+from fastapi import HTTPException
+
+from army import ArmyEngine
+from board import EMPTY, PackedBoard
+from engine import IllegalMove
+from tests.conftest import line_move, new_game
+
+
+def test_move_onto_neutral_ground_claims_it_and_passes_the_turn():
+    board = PackedBoard(4)
+    board.set_cell(0, 0, 0, "wind", 4)
+    board.set_cell(3, 3, 1, "water", 1)
+    engine = ArmyEngine(board, ["wind", "water"])
+
+    result = engine.move(0, 0, 0, 1, 0)
+    assert result.claimed == ((1, 0),) and not result.conquered and not result.game_over
+    # All but one army move, and wind attacks with one extra
+    assert (board.armies(board.cell_index(0, 0)), board.armies(board.cell_index(1, 0))) == (1, 4)
+    assert engine.current_player == 1
+    assert engine.armies == [3, 4]
+    assert board.armies(board.cell_index(3, 3)) == 3
+
+
+def test_water_defends_and_fire_spreads_after_a_conquest():
+    board = PackedBoard(4)
+    board.set_cell(0, 0, 0, "fire", 3)
+    board.set_cell(1, 0, 1, "water", 1)
+    engine = ArmyEngine(board, ["fire", "water"], current_player=0)
+    result = engine.move(0, 0, 0, 1, 0)
+    assert not result.conquered and board.cell_owner[board.cell_index(1, 0)] == 1
+
+    board = PackedBoard(4)
+    board.set_cell(0, 0, 0, "fire", 6)
+    board.set_cell(1, 0, 1, "water", 1)
+    engine = ArmyEngine(board, ["fire", "water"])
+    result = engine.move(0, 0, 0, 1, 0)
+    assert result.conquered
+    assert sorted(result.claimed) == [(1, 0), (1, 1), (2, 0)]
+    assert board.armies(board.cell_index(1, 0)) == 3
+    assert engine.territories == [4, 0]
+
+
+def test_illegal_moves_are_rejected():
+    board = PackedBoard(4)
+    board.set_cell(1, 1, 0, "fire", 3)
+    board.set_cell(2, 2, 1, "water", 1)
+    engine = ArmyEngine(board, ["fire", "water"])
+    for move in [(1, 1, 1, 1, 2), (0, 1, 1, 3, 1), (0, 1, 1, 2, 2), (0, 2, 2, 2, 1), (0, 1, 1, 1, -1)]:
+        with pytest.raises(IllegalMove):
+            engine.move(*move)
+
+
+def test_holding_most_of_the_board_wins():
+    board = PackedBoard(3)
+    for x, y in [(0, 0), (1, 0), (2, 0), (0, 1)]:
+        board.set_cell(x, y, 0, "earth", 2)
+    engine = ArmyEngine(board, ["earth", "wind"])
+    result = engine.move(0, 0, 1, 1, 1)
+    assert result.game_over and engine.winner == 0
+    assert engine.current_player == 0
+
+
+def test_whole_board_queries_match_the_cell_rules():
+    rng = random.Random(5)
+    size = 7
+    board = PackedBoard(size)
+    for x, y in itertools.product(range(size), repeat=2):
+        if rng.random() < 0.7:
+            board.set_cell(x, y, rng.randrange(2), rng.choice(["wind", "water", "earth"]), rng.randrange(1, 4))
+    engine = ArmyEngine(board, ["wind", "water"])
+
+    legal = {tuple(move) for move in engine.legal_moves(0).tolist()}
+    cells = list(itertools.product(range(size), repeat=2))
+    assert legal == {(fx, fy, tx, ty) for (fx, fy), (tx, ty) in itertools.product(cells, cells)
+                     if engine.is_legal(0, fx, fy, tx, ty)}
+    assert len(engine.legal_moves(1)) == 0
+    assert engine.best_move(0) in legal
+
+    frontier = engine.frontier(0)
+    for x, y in cells:
+        around = [(x + dx, y + dy) for dx, dy in [(-1, 0), (1, 0), (0, -1), (0, 1)]]
+        # The edge of the board is not a front
+        exposed = any(0 <= nx < size and 0 <= ny < size and engine.owner[ny, nx] != 0 for nx, ny in around)
+        assert frontier[y, x] == (engine.owner[y, x] == 0 and exposed)
+
+
+def test_reinforcement_reaches_every_owned_cell():
+    board = PackedBoard(5)
+    owned = [(0, 0), (4, 4), (2, 3)]
+    for x, y in owned:
+        board.set_cell(x, y, 1, "water", 1)
+    engine = ArmyEngine(board, ["fire", "water"])
+    engine.reinforce(1)
+    armies = engine.cell_armies()
+    assert [int(armies[y, x]) for x, y in owned] == [3, 3, 3]
+    assert int(armies[np.asarray(engine.owner) == EMPTY].sum()) == 0
+    assert engine.armies == [3, 4]
+
+
+@pytest.mark.anyio
+async def test_army_moves_through_the_server(app):
+    game = await new_game(app, element="water")
+    # Player 0 takes the corner square and, once the turn comes back, its reinforcement
+    for player, line in [(0, (True, 0, 0)), (1, (False, 0, 0)), (0, (True, 0, 1)), (1, (True, 3, 3)),
+                         (0, (False, 1, 0)), (0, (True, 4, 4)), (1, (True, 5, 5))]:
+        await app.apply_move(game.id, line_move(game.id, player, *line))
+    army_move = app.GameMove(game_id=game.id, player_id=0, move_type="army_move",
+                             data={"from": {"x": 0, "y": 0}, "to": {"x": 1, "y": 0}})
+    with pytest.raises(HTTPException) as excinfo:
+        await app.apply_move(game.id, army_move)
+    assert excinfo.value.status_code == 400
+
+    await app.apply_move(game.id, app.GameMove(game_id=game.id, player_id=0, move_type="phase",
+                                               data={"phase": "army"}))
+    result = await app.apply_move(game.id, army_move)
+    assert result["captured"] == [{"x": 1, "y": 0}]
+    assert (result["current_player"], result["game_phase"]) == (1, "army")
+
+    state = await app.game_cache.get(game.id)
+    assert [player.territories for player in state.players] == [2, 0]
+    doc = await app.storage.get_game(game.id)
+    assert app.GameState.from_document(doc).live_board().cell_owner[1] == 0
@@ -0,0 +1,89 @@
+"""Packed boards: the binary blob, the legacy layout, chunks and the move journal"""
+
+import base64
+import random
+
+import orjson
+import pytest
+
+from board import REINFORCED_KEY, PackedBoard, all_lines, board_from_document, region_chunks
+from engine import LineEngine
+from tests.conftest import line_move, new_game
+
+
+def played_board(size: int, moves: int, seed: int = 0) -> PackedBoard:
+    rng = random.Random(seed)
+    engine = LineEngine(PackedBoard(size), ["earth", "water"])
+    lines = all_lines(size)
+    rng.shuffle(lines)
+    for line in lines[:moves]:
+        engine.apply_line(engine.current_player, *line)
+    engine.board.reinforce_cells(0, 4)
+    return engine.board
+
+
+def test_packed_board_round_trips():
+    board = played_board(12, 200)
+    assert PackedBoard.from_bytes(board.to_bytes()).to_bytes() == board.to_bytes()
+    # Legacy documents convert losslessly in both directions (reinforcements come out applied)
+    legacy = board.to_legacy()
+    assert PackedBoard.from_legacy(*legacy).to_legacy() == legacy
+    assert PackedBoard.for_map("large").to_bytes() == PackedBoard(12).to_bytes()
+
+
+def test_chunks_rebuild_the_board():
+    board = played_board(40, 2000)
+    assert PackedBoard.from_chunks(40, board.chunks()).to_bytes() == board.to_bytes()
+    assert PackedBoard.from_bytes(board.to_bytes()).to_bytes() == board.to_bytes()
+    # A chunk only overwrites the cells and lines it covers
+    partial = PackedBoard.from_chunks(40, board.chunks(["1-1", REINFORCED_KEY]))
+    assert partial.chunk_bytes("1-1") == board.chunk_bytes("1-1")
+    assert partial.chunk_bytes("0-0") == PackedBoard(40).chunk_bytes("0-0")
+
+
+def test_journal_undo_and_redo_restore_board_and_indexes():
+    board = played_board(12, 150)
+    before = board.to_bytes()
+    owned, free = board.owned_count(0), board.free_lines()
+
+    engine = LineEngine(board, ["earth", "water"], current_player=0)
+    journal = board.start_journal()
+    for line in [line for line in all_lines(12) if board.line_owner(*line) is None][:30]:
+        engine.apply_line(engine.current_player, *line)
+    board.end_journal()
+    after, owned_after = board.to_bytes(), board.owned_count(0)
+    assert board.free_lines() == free - 30
+
+    board.undo(journal)
+    assert board.to_bytes() == before
+    assert (board.owned_count(0), board.free_lines()) == (owned, free)
+    board.redo(journal)
+    assert board.to_bytes() == after
+    assert (board.owned_count(0), board.free_lines()) == (owned_after, free - 30)
+
+
+@pytest.mark.anyio
+async def test_chunked_game_round_trips_through_storage(app):
+    game = await new_game(app, element="earth", map_size="40x40")
+    lines = all_lines(40)
+    random.Random(1).shuffle(lines)
+    for line in lines[:300]:
+        current = await app.game_cache.get(game.id)
+        await app.apply_move(game.id, line_move(game.id, current.current_player, *line))
+
+    cached = await app.game_cache.get(game.id)
+    doc = await app.storage.get_game(game.id)
+    assert doc.get("board_chunks") and doc.get("board") is None
+    assert board_from_document(doc).to_bytes() == cached.board_bytes()
+
+    # Viewports of games that are not cached read only the chunks under them
+    app.game_cache.invalidate(game.id)
+    keys = region_chunks(40, 16, 0, 20, 10) + [REINFORCED_KEY]
+    partial = await app.storage.get_game_chunks(game.id, keys)
+    assert sorted(partial["board_chunks"]) == sorted(keys)
+    response = await app.get_board_region(game.id, x=16, y=0, width=20, height=10, format="packed",
+                                          if_none_match=None)
+    region = orjson.loads(response.body)
+    assert region["version"] == 300
+    assert {key: base64.urlsafe_b64decode(blob) for key, blob in region["chunks"].items()} == \
+        cached.live_board().chunks(keys)
@@ -0,0 +1,73 @@
+"""Bulk game creation and batch summary lookups"""
+
+import orjson
+import pytest
+from fastapi import HTTPException
+
+from tests.conftest import new_game
+
+
+pytestmark = pytest.mark.anyio
+
+
+def bulk_request(app, *modes):
+    return app.BulkCreateRequest(games=[
+        app.CreateGameRequest(element="fire", mode=mode, map_size="small", player_count=2) for mode in modes
+    ])
+
+
+async def stored_ids(app):
+    return {doc["id"] for doc in await app.storage.list_games(limit=1000)}
+
+
+async def test_bulk_create_returns_summaries_in_order(app):
+    response = await app.create_games(bulk_request(app, "online", "local", "online"))
+    games = orjson.loads(response.body)["games"]
+    assert [game["room_code"] is not None for game in games] == [True, False, True]
+    assert "board" not in games[0] and games[0]["open_seats"] == 1
+
+    ids = [game["id"] for game in games]
+    response = await app.get_game_summaries(app.GameLookupRequest(game_ids=[ids[2], "nope", ids[0]]))
+    found = orjson.loads(response.body)
+    assert [game["id"] for game in found["games"]] == [ids[2], ids[0]]
+    assert found["missing"] == ["nope"]
+
+
+async def test_bulk_create_is_all_or_nothing(app, monkeypatch):
+    taken = await new_game(app, mode="online")
+    before = await stored_ids(app)
+
+    async def clashing_codes(count):
+        return ["FRESH1", taken.room_code][:count]
+
+    monkeypatch.setattr(app.room_codes, "allocate_many", clashing_codes)
+    with pytest.raises(HTTPException) as excinfo:
+        await app.create_games(bulk_request(app, "local", "online", "online"))
+    assert excinfo.value.status_code == 409
+    assert await stored_ids(app) == before
+
+
+async def test_rollback_reports_games_changed_meanwhile(app, monkeypatch):
+    if app.storage.name == "sqlite":
+        pytest.skip("SQLite inserts the batch in one transaction, with nothing to roll back")
+    taken = await new_game(app, mode="online")
+    kept = []
+    delete_game = app.storage.delete_game
+
+    async def first_game_moved_on(game_id, expected_version):
+        # As if a player joined the first game before the rollback reached it
+        if not kept:
+            kept.append(game_id)
+            return False
+        return await delete_game(game_id, expected_version)
+
+    async def clashing_codes(count):
+        return ["FRESH1", taken.room_code][:count]
+
+    monkeypatch.setattr(app.room_codes, "allocate_many", clashing_codes)
+    monkeypatch.setattr(app.storage, "delete_game", first_game_moved_on)
+    with pytest.raises(HTTPException) as excinfo:
+        await app.create_games(bulk_request(app, "online", "local", "online"))
+    assert excinfo.value.status_code == 409
+    assert kept and kept[0] in excinfo.value.detail
+    assert await stored_ids(app) == {taken.id, kept[0]}
@@ -0,0 +1,104 @@
+"""Game cache: write-behind batching, the $set fields it flushes and lost flushes"""
+
+import pytest
+from fastapi import HTTPException
+
+from board import board_from_document
+from cache import merge_fields
+from tests.conftest import line_move, new_game
+
+
+pytestmark = pytest.mark.anyio
+
+
+def test_merge_fields_never_keeps_parent_and_child_paths():
+    pending = {"players.1": {"id": 1, "armies": 3}, "version": 1}
+    merge_fields(pending, {"players.1.armies": 5, "version": 2})
+    assert pending == {"players.1": {"id": 1, "armies": 5}, "version": 2}
+
+    merge_fields(pending, {"players": [{"id": 0}]})
+    assert pending == {"players": [{"id": 0}], "version": 2}
+
+
+async def test_write_behind_flushes_coalesced_changes(app, write_behind, monkeypatch):
+    game = await new_game(app, element="earth", mode="online")
+    await app.join_game(game.id, app.JoinGameRequest(room_code=game.room_code, element="water"), if_match=None)
+    # Passing the turn reinforces player 1, whose whole entry the join left pending
+    await app.apply_move(game.id, line_move(game.id, 0, True, 0, 0))
+    await app.apply_move(game.id, line_move(game.id, 1, False, 0, 0))
+    assert (await app.storage.get_game(game.id))["version"] == 0
+
+    flushed = []
+    update_games = app.storage.update_games
+
+    async def record(updates):
+        flushed.extend(updates)
+        return await update_games(updates)
+
+    monkeypatch.setattr(app.storage, "update_games", record)
+    await write_behind.flush()
+
+    [(game_id, base_version, fields)] = flushed
+    assert (game_id, base_version) == (game.id, 0)
+    # Mongo rejects an update setting both a path and one of its parents
+    assert not [(a, b) for a in fields for b in fields if b.startswith(a + ".")]
+
+    cached = await write_behind.get(game.id)
+    doc = await app.storage.get_game(game.id)
+    assert (doc["version"], doc["move_count"]) == (cached.version, cached.move_count) == (3, 2)
+    assert [player["armies"] for player in doc["players"]] == [player.armies for player in cached.players]
+    assert board_from_document(doc).to_bytes() == cached.board_bytes()
+    assert write_behind.stats.flushes == 1
+
+
+async def test_reads_that_bypass_the_cache_flush_first(app, write_behind):
+    game = await new_game(app)
+    await app.apply_move(game.id, line_move(game.id, 0, True, 0, 0))
+    write_behind.invalidate(game.id)  # as after an eviction, with the write still pending
+
+    summaries = await write_behind.get_summaries([game.id])
+    assert summaries[game.id].version == 1
+    assert (await app.storage.get_game(game.id))["version"] == 1
+
+
+async def test_lost_flush_drops_the_cached_copy_and_fails_the_next_commit(app, write_behind):
+    game = await new_game(app)
+    await app.apply_move(game.id, line_move(game.id, 0, True, 0, 0))
+    # Another worker writes the game while this worker's move is still pending
+    assert await app.storage.update_game(game.id, 0, {"version": 1, "current_player": 1, "move_count": 0})
+
+    await write_behind.flush()
+    assert write_behind.stats.conflicts == 1
+    cached = await write_behind.get(game.id)
+    assert (cached.version, cached.move_count) == (1, 0)
+
+    with pytest.raises(HTTPException) as excinfo:
+        await app.apply_move(game.id, line_move(game.id, 1, True, 1, 0))
+    assert excinfo.value.status_code == 409
+    await app.apply_move(game.id, line_move(game.id, 1, True, 1, 0))
+    await write_behind.flush()
+    assert (await app.storage.get_game(game.id))["version"] == 2
+
+
+async def test_failed_flush_is_requeued_under_newer_changes(app, write_behind, monkeypatch):
+    game = await new_game(app, element="earth", mode="online")
+    await app.join_game(game.id, app.JoinGameRequest(room_code=game.room_code, element="water"), if_match=None)
+    update_games = app.storage.update_games
+
+    async def fail_after_a_move(updates):
+        # Player 0 passes the turn while the flush is out, reinforcing the player the join left pending
+        await app.apply_move(game.id, line_move(game.id, 0, True, 0, 0))
+        raise ConnectionError("storage went away")
+
+    monkeypatch.setattr(app.storage, "update_games", fail_after_a_move)
+    with pytest.raises(ConnectionError):
+        await write_behind.flush()
+    monkeypatch.setattr(app.storage, "update_games", update_games)
+
+    _, fields = write_behind._dirty[game.id]
+    assert not [(a, b) for a in fields for b in fields if b.startswith(a + ".")]
+    await write_behind.flush()
+    cached = await write_behind.get(game.id)
+    doc = await app.storage.get_game(game.id)
+    assert [player["armies"] for player in doc["players"]] == [player.armies for player in cached.players]
+    assert doc["version"] == cached.version == 2
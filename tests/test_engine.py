@@ -0,0 +1,42 @@
+"""Line engine: captures, extra turns and the end of the game"""
+
+import random
+
+import pytest
+
+from board import PackedBoard, all_lines
+from engine import IllegalMove, LineEngine
+
+
+def test_capture_keeps_the_turn():
+    engine = LineEngine(PackedBoard(2), ["fire", "water"])
+    for player, line in enumerate([(True, 0, 0), (False, 0, 0), (True, 0, 1)]):
+        assert engine.apply_line(player % 2, *line).captured == ()
+    result = engine.apply_line(1, False, 1, 0)
+    assert result.captured == ((0, 0),) and result.extra_turn
+    assert (engine.current_player, engine.territories) == (1, [0, 1])
+    with pytest.raises(IllegalMove):
+        engine.apply_line(1, True, 0, 0)
+
+
+def test_game_ends_with_the_last_free_line():
+    engine = LineEngine(PackedBoard(6), ["fire", "water", "earth"])
+    lines = all_lines(6)
+    random.Random(3).shuffle(lines)
+    for drawn, line in enumerate(lines, 1):
+        assert not engine.game_over
+        result = engine.apply_line(engine.current_player, *line)
+        assert engine.board.free_lines() == len(lines) - drawn
+    assert engine.game_over and result.game_over and not result.extra_turn
+    assert sum(engine.territories) == 36
+
+
+def test_copy_is_independent():
+    engine = LineEngine(PackedBoard(8), ["fire", "water"])
+    for line in all_lines(8)[:60]:
+        engine.apply_line(engine.current_player, *line)
+    board = engine.board
+    copy = board.copy()
+    copy.set_line(*next(line for line in all_lines(8) if board.line_owner(*line) is None), 1)
+    assert copy.free_lines() == board.free_lines() - 1
+    assert board.to_bytes() != copy.to_bytes()
@@ -0,0 +1,150 @@
+"""Game change events: the buses between workers and the WebSocket fan-out"""
+
+import asyncio
+import shutil
+import tempfile
+from types import SimpleNamespace
+
+import pytest
+
+from events import LocalBus, UnixSocketBus
+from realtime import GameConnections
+from tests.conftest import line_move, new_game
+
+
+pytestmark = pytest.mark.anyio
+
+
+async def eventually(check, timeout: float = 5):
+    """Wait until ``check()`` holds"""
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not check():
+        assert asyncio.get_running_loop().time() < deadline, "timed out"
+        await asyncio.sleep(0.01)
+
+
+def collect(bus):
+    received = []
+
+    async def handler(event):
+        received.append(event)
+    bus.subscribe(handler)
+    return received
+
+
+async def test_local_bus_delivers_to_every_handler():
+    bus = LocalBus()
+
+    async def broken(event):
+        raise RuntimeError("handler bug")
+    bus.subscribe(broken)
+    received = collect(bus)
+
+    await bus.publish({"game_id": "g", "message": {"version": 1}})
+    assert received == [{"game_id": "g", "message": {"version": 1}, "origin": bus.origin}]
+    # Our own events coming back over the wire are not delivered twice
+    await bus._receive(received[0])
+    assert len(received) == 1 and bus.stats["received"] == 0
+
+
+@pytest.fixture
+def socket_path():
+    # Unix socket paths are short, so not under pytest's tmp_path
+    directory = tempfile.mkdtemp(prefix="bus", dir="/tmp")
+    yield f"{directory}/events.sock"
+    shutil.rmtree(directory)
+
+
+async def test_unix_bus_relays_between_workers_and_fails_over(socket_path):
+    buses = [UnixSocketBus(socket_path, retry_seconds=0.01) for _ in range(3)]
+    received = [collect(bus) for bus in buses]
+    for bus in buses:
+        await bus.start()
+    try:
+        await eventually(lambda: sum(bus.is_hub for bus in buses) == 1
+                         and all(bus.is_hub or bus._upstream is not None for bus in buses))
+        hub = next(bus for bus in buses if bus.is_hub)
+        await eventually(lambda: len(hub._peers) == 2)
+
+        for sender in buses:
+            await sender.publish({"game_id": sender.origin, "message": {"version": 1}})
+        await eventually(lambda: all(len(events) == 3 for events in received))
+        for events in received:
+            assert sorted(event["game_id"] for event in events) == sorted(bus.origin for bus in buses)
+
+        # Another worker takes over the socket when the hub goes away
+        await hub.stop()
+        rest = [bus for bus in buses if bus is not hub]
+        await eventually(lambda: sum(bus.is_hub for bus in rest) == 1
+                         and all(bus.is_hub or bus._upstream is not None for bus in rest))
+        await eventually(lambda: len(next(bus for bus in rest if bus.is_hub)._peers) == 1)
+        await rest[0].publish({"game_id": "after", "message": {"version": 2}})
+        await eventually(lambda: [event["game_id"] for event in received[buses.index(rest[1])]][-1:] == ["after"])
+    finally:
+        for bus in buses:
+            await bus.stop()
+
+
+class Peer:
+    """The hub's end of a worker connection with ``buffered`` bytes not yet sent"""
+
+    def __init__(self, buffered: int):
+        self.transport = SimpleNamespace(get_write_buffer_size=lambda: buffered)
+        self.written = []
+        self.closed = False
+
+    def write(self, data):
+        self.written.append(data)
+
+    def close(self):
+        self.closed = True
+
+
+def test_hub_drops_peers_that_stop_reading(socket_path):
+    bus = UnixSocketBus(socket_path, max_buffer=100)
+    fast, slow = Peer(0), Peer(101)
+    bus._peers = {fast, slow}
+
+    bus._relay(b"event\n", None)
+    assert bus._peers == {fast}
+    assert fast.written == [b"event\n"] and not fast.closed
+    assert slow.written == [] and slow.closed
+
+
+class StuckSocket:
+    """A WebSocket whose client never reads"""
+
+    def __init__(self):
+        self.closed = None
+
+    async def send_text(self, text):
+        await asyncio.Event().wait()
+
+    async def close(self, code, reason):
+        self.closed = code
+
+
+async def test_clients_that_fall_behind_are_disconnected():
+    connections = GameConnections(queue_size=2)
+    socket = StuckSocket()
+    connections.connect("g", socket, first={"type": "snapshot"})
+    for version in range(1, 5):
+        await connections.broadcast("g", {"type": "move", "version": version})
+    assert connections.count("g") == 0
+    await eventually(lambda: socket.closed is not None)
+    assert socket.closed == 1013
+
+
+async def test_events_from_other_workers_refresh_the_cache(app):
+    game = await new_game(app)
+    await app.apply_move(game.id, line_move(game.id, 0, True, 0, 0))
+    cached = await app.game_cache.get(game.id)
+
+    await app.on_game_event({"game_id": game.id, "message": {"type": "move", "version": cached.version}})
+    assert await app.game_cache.get(game.id) is cached
+
+    # Another worker committed the next version: reads go back to the store
+    await app.storage.update_game(game.id, cached.version, {"current_player": 0, "version": cached.version + 1})
+    await app.on_game_event({"game_id": game.id, "message": {"type": "move", "version": cached.version + 1}})
+    fresh = await app.game_cache.get(game.id)
+    assert fresh is not cached and fresh.version == cached.version + 1 and fresh.current_player == 0
@@ -0,0 +1,75 @@
+"""Legal moves: the free-line bitmasks and rejection of illegal lines"""
+
+import base64
+
+import numpy as np
+import orjson
+import pytest
+from fastapi import HTTPException
+
+from board import all_lines
+from tests.conftest import line_move, new_game
+
+
+pytestmark = pytest.mark.anyio
+
+
+def mask_lines(bits: str, is_horizontal: bool, size: int):
+    """(is_horizontal, x, y) of every set bit of a line bitmask"""
+    width = size if is_horizontal else size + 1
+    count = (size + 1) * size
+    flags = np.unpackbits(np.frombuffer(base64.urlsafe_b64decode(bits), dtype=np.uint8), bitorder="little")[:count]
+    return {(is_horizontal, int(i % width), int(i // width)) for i in np.nonzero(flags)[0]}
+
+
+async def legal_moves(app, game_id: str):
+    return orjson.loads((await app.get_legal_moves(game_id, if_none_match=None)).body)
+
+
+async def test_masks_list_the_free_lines_and_the_capturing_ones(app):
+    game = await new_game(app)
+    drawn = [(True, 0, 0), (False, 0, 0), (True, 0, 1), (True, 3, 2)]
+    for player, line in enumerate(drawn):
+        await app.apply_move(game.id, line_move(game.id, player % 2, *line))
+
+    legal = await legal_moves(app, game.id)
+    size = legal["size"]
+    free = mask_lines(legal["horizontal"], True, size) | mask_lines(legal["vertical"], False, size)
+    assert free == set(all_lines(size)) - set(drawn)
+    assert legal["count"] == len(free)
+    assert legal["capturing"] == [{"is_horizontal": False, "x": 1, "y": 0}]
+
+    await app.apply_move(game.id, app.GameMove(game_id=game.id, player_id=0, move_type="phase",
+                                               data={"phase": "army"}))
+    legal = await legal_moves(app, game.id)
+    assert legal["count"] == 0 and legal["capturing"] == []
+
+
+async def test_etag_follows_the_version(app):
+    game = await new_game(app)
+    first = await app.get_legal_moves(game.id, if_none_match=None)
+    assert first.headers["ETag"] == '"0"'
+    assert (await app.get_legal_moves(game.id, if_none_match='"0"')).status_code == 304
+    await app.apply_move(game.id, line_move(game.id, 0, True, 0, 0))
+    assert (await app.get_legal_moves(game.id, if_none_match='"0"')).status_code == 200
+
+
+@pytest.mark.parametrize("data", [
+    {"is_horizontal": True, "x": 0, "y": 0},  # already drawn
+    {"is_horizontal": True, "x": -1, "y": 0},
+    {"is_horizontal": False, "x": 0, "y": 999},
+    {"is_horizontal": "yes", "x": 0, "y": 0},
+    {"is_horizontal": True, "x": 1.5, "y": 0},
+    {"x": 0, "y": 0},
+])
+async def test_illegal_lines_are_rejected(app, data):
+    game = await new_game(app)
+    await app.apply_move(game.id, line_move(game.id, 0, True, 0, 0))
+    before = await app.game_cache.get(game.id)
+
+    with pytest.raises(HTTPException) as excinfo:
+        await app.apply_move(game.id, app.GameMove(game_id=game.id, player_id=1, move_type="line", data=data))
+    assert excinfo.value.status_code == 400
+    after = await app.game_cache.get(game.id)
+    assert (after.version, after.current_player, after.board_bytes()) == (1, 1, before.board_bytes())
+    assert (await legal_moves(app, game.id))["count"] == len(all_lines(after.live_board().size)) - 1
@@ -0,0 +1,85 @@
+"""Lobby: seats in online rooms, quick-match claims and rooms from before seat counts"""
+
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from tests.conftest import line_move, new_game
+
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_moves_wait_for_every_seat(app):
+    game = await new_game(app, mode="online")
+    assert game.game_status == "waiting"
+    with pytest.raises(HTTPException) as excinfo:
+        await app.apply_move(game.id, line_move(game.id, 0, True, 0, 0))
+    assert excinfo.value.status_code == 400
+
+
+async def test_quick_match_race_never_double_books(app):
+    requests = [app.QuickMatchRequest(element="fire", map_size="small", max_players=2) for _ in range(7)]
+    results = await asyncio.gather(*(app.quick_match(request) for request in requests))
+
+    seats = [(result["game_id"], result["player_id"]) for result in results]
+    assert len(set(seats)) == len(seats)
+    games = {}
+    for game_id, _ in seats:
+        games[game_id] = await app.storage.get_game(game_id)
+    assert len(games) == 4
+    assert sorted(len(doc["players"]) for doc in games.values()) == [1, 2, 2, 2]
+    for doc in games.values():
+        assert [player["id"] for player in doc["players"]] == list(range(len(doc["players"])))
+        assert doc["open_seats"] == doc["max_players"] - len(doc["players"])
+        assert doc["game_status"] == ("active" if doc["open_seats"] == 0 else "waiting")
+
+
+async def quick_match(app, element: str = "fire", max_players=None):
+    return await app.quick_match(app.QuickMatchRequest(element=element, map_size="small", max_players=max_players))
+
+
+async def test_quick_match_fills_the_fullest_room(app):
+    emptier = await new_game(app, mode="online", player_count=3)
+    fuller = await new_game(app, mode="online", player_count=3)
+    await app.join_game(fuller.id, app.JoinGameRequest(room_code=fuller.room_code, element="water"), if_match=None)
+
+    claimed = await quick_match(app, "earth")
+    assert (claimed["game_id"], claimed["player_id"], claimed["game_status"]) == (fuller.id, 2, "active")
+    claimed = await quick_match(app, "earth", max_players=3)
+    assert (claimed["game_id"], claimed["player_id"]) == (emptier.id, 1)
+    assert (await quick_match(app, max_players=2))["created"]
+    doc = await app.storage.get_game(fuller.id)
+    assert ([player["element"] for player in doc["players"]], doc["open_seats"]) == (["fire", "water", "earth"], 0)
+
+
+async def test_quick_match_keeps_joins_not_yet_written(app, write_behind):
+    room = await new_game(app, mode="online", player_count=3)
+    await app.join_game(room.id, app.JoinGameRequest(room_code=room.room_code, element="water"), if_match=None)
+    # The join is still pending, so storage shows two open seats
+    claimed = await quick_match(app, "earth")
+    assert (claimed["game_id"], claimed["player_id"], claimed["version"]) == (room.id, 2, 2)
+
+    await write_behind.flush()
+    assert write_behind.stats.conflicts == 0
+    doc = await app.storage.get_game(room.id)
+    assert [player["element"] for player in doc["players"]] == ["fire", "water", "earth"]
+    assert (doc["open_seats"], doc["game_status"], doc["version"]) == (0, "active", 2)
+
+
+async def test_legacy_waiting_room_takes_one_more_player(app):
+    room = await new_game(app, mode="online")
+    doc = await app.storage.get_game(room.id)
+    # Rooms stored before seat counts were kept
+    legacy = {key: value for key, value in doc.items() if key not in ("max_players", "open_seats", "_id")}
+    legacy.update(id="legacy", room_code="OLD001")
+    await app.storage.insert_game(legacy)
+
+    state = await app.game_cache.get("legacy")
+    assert (state.max_players, state.open_seats) == (2, 1)
+    await app.join_game("legacy", app.JoinGameRequest(room_code="OLD001", element="water"), if_match=None)
+    state = await app.game_cache.get("legacy")
+    assert (len(state.players), state.game_status) == (2, "active")
+    with pytest.raises(HTTPException):
+        await app.join_game("legacy", app.JoinGameRequest(room_code="OLD001", element="earth"), if_match=None)
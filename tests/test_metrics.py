@@ -0,0 +1,76 @@
+"""Metrics: the exposition format and per-route request metrics"""
+
+from types import SimpleNamespace
+
+from fastapi.testclient import TestClient
+
+import metrics
+
+
+def sample(text: str, line: str) -> float:
+    """Value of the exposition line starting with ``line``, 0 when absent"""
+    for row in text.splitlines():
+        if row.startswith(line + " "):
+            return float(row.rsplit(" ", 1)[1])
+    return 0.0
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = metrics.Histogram("demo_seconds", "Demo latency", ("route",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 5.0):
+        histogram.observe(value, "/a")
+    text = "\n".join(histogram.render())
+
+    assert "# TYPE demo_seconds histogram" in text
+    assert sample(text, 'demo_seconds_bucket{route="/a",le="0.1"}') == 1
+    assert sample(text, 'demo_seconds_bucket{route="/a",le="1.0"}') == 3
+    assert sample(text, 'demo_seconds_bucket{route="/a",le="+Inf"}') == 4
+    assert sample(text, 'demo_seconds_count{route="/a"}') == 4
+    assert sample(text, 'demo_seconds_sum{route="/a"}') == 6.05
+
+
+def test_labels_are_escaped_and_gauges_go_down():
+    gauge = metrics.Gauge("demo_open", "Demo gauge", ("name",))
+    gauge.inc('say "hi"\n', amount=3)
+    gauge.dec('say "hi"\n')
+    assert gauge.render()[-1] == 'demo_open{name="say \\"hi\\"\\n"} 2'
+
+
+def test_command_listener_counts_per_collection():
+    listener = metrics.CommandMetrics(measure_replies=True)
+    before = metrics.registry.render()
+    command = SimpleNamespace(command_name="find", command={"find": "games_metrics_test"}, request_id=1,
+                              operation_id=1)
+    listener.started(command)
+    listener.succeeded(SimpleNamespace(command_name="find", request_id=1, operation_id=1, duration_micros=1500,
+                                       reply={"ok": 1}))
+    after = metrics.registry.render()
+
+    ok = 'mongodb_commands_total{collection="games_metrics_test",command="find",outcome="ok"}'
+    assert sample(after, ok) - sample(before, ok) == 1
+    replies = 'mongodb_reply_bytes_count{collection="games_metrics_test",command="find"}'
+    assert sample(after, replies) - sample(before, replies) == 1
+    assert sample(after, 'mongodb_commands_in_flight{collection="games_metrics_test"}') == 0
+
+
+def test_requests_are_recorded_under_their_route(app):
+    # No lifespan: the fixture owns the store and closes it
+    client = TestClient(app.app)
+    game = client.post("/api/games", json={"element": "fire", "mode": "local", "map_size": "small",
+                                           "player_count": 2}).json()
+    before = client.get("/metrics").text
+    found = client.get(f"/api/games/{game['id']}")
+    missing = client.get("/api/games/missing")
+    assert missing.status_code == 404
+    after = client.get("/metrics")
+
+    assert after.headers["content-type"].startswith("text/plain")
+    text = after.text
+    for status in ("200", "404"):
+        line = f'http_requests_total{{method="GET",route="/api/games/{{game_id}}",status="{status}"}}'
+        assert sample(text, line) - sample(before, line) == 1
+    sent = 'http_response_bytes_sum{method="GET",route="/api/games/{game_id}"}'
+    assert sample(text, sent) - sample(before, sent) == len(found.content) + len(missing.content)
+    # The scrape itself is the one request in flight
+    assert sample(text, 'http_requests_in_flight{method="GET"}') == 1
+    assert "# TYPE game_cache gauge" in text
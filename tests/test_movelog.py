@@ -0,0 +1,52 @@
+"""Move log: packing and rebuilding games from snapshots and logged moves"""
+
+import random
+
+import pytest
+
+from board import all_lines
+from movelog import pack_moves, unpack_moves
+from tests.conftest import line_move, new_game
+
+
+def test_packed_moves_round_trip():
+    moves = [
+        {"seq": 1, "player_id": 0, "move_type": "line", "data": {"is_horizontal": True, "x": 3, "y": 4}},
+        {"seq": 2, "player_id": 1, "move_type": "army_move", "data": {"from": {"x": 0, "y": 0}, "to": {"x": 1, "y": 0}}},
+        {"seq": 3, "player_id": 1, "move_type": "line", "data": {"is_horizontal": False, "x": 8, "y": 0}},
+    ]
+    assert [{key: move[key] for key in ("player_id", "move_type", "data")} for move in unpack_moves(pack_moves(moves))] \
+        == [{key: move[key] for key in ("player_id", "move_type", "data")} for move in moves]
+
+
+@pytest.mark.anyio
+async def test_rebuild_matches_the_live_game(app, monkeypatch):
+    monkeypatch.setattr(app.move_log, "snapshot_interval", 7)
+    game = await new_game(app, element="earth")
+    elements = [player.element for player in game.players]
+    lines = all_lines(8)
+    random.Random(2).shuffle(lines)
+
+    seen = {}
+    for seq, line in enumerate(lines, 1):
+        current = await app.game_cache.get(game.id)
+        await app.apply_move(game.id, line_move(game.id, current.current_player, *line))
+        state = await app.game_cache.get(game.id)
+        seen[seq] = (state.board_bytes(), state.current_player, [p.territories for p in state.players],
+                     [p.armies for p in state.players])
+    assert state.game_status == "finished"
+
+    # Every snapshot point, the moves right after one, and the first and last moves
+    for seq in (1, 6, 7, 8, 20, 50, len(lines)):
+        rebuilt = await app.move_log.rebuild(game.id, seq, game.map_size, elements)
+        assert (rebuilt.board.to_bytes(), rebuilt.current_player, rebuilt.territories, rebuilt.armies) == seen[seq]
+    assert rebuilt.game_status == "finished"
+
+    # Without snapshots the moves replay from the empty board
+    monkeypatch.setattr(app.storage, "latest_snapshot", _no_snapshot)
+    rebuilt = await app.move_log.rebuild(game.id, 50, game.map_size, elements)
+    assert (rebuilt.board.to_bytes(), rebuilt.current_player, rebuilt.territories, rebuilt.armies) == seen[50]
+
+
+async def _no_snapshot(game_id, upto_seq):
+    return None
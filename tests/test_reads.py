@@ -0,0 +1,46 @@
+"""Trusted game reads: documents loaded and served without re-validation"""
+
+import orjson
+import pytest
+
+from tests.conftest import line_move, new_game
+
+
+pytestmark = pytest.mark.anyio
+
+
+async def played_state(app, board_format: str):
+    game = await new_game(app, map_size="medium")
+    for x in range(3):
+        await app.apply_move(game.id, line_move(game.id, game.current_player, True, x, 0))
+        game = await app.game_cache.get(game.id)
+    return game.with_format(board_format)
+
+
+@pytest.mark.parametrize("board_format", ["packed", "legacy"])
+async def test_trusted_load_matches_validation(app, board_format):
+    doc = (await played_state(app, board_format)).to_document()
+
+    trusted = app.GameState.from_document(doc)
+    validated = app.GameState(**doc)
+    assert trusted.model_dump() == validated.model_dump()
+    assert trusted.is_legacy == (board_format == "legacy")
+
+
+@pytest.mark.parametrize("board_format", ["packed", "legacy"])
+async def test_game_response_matches_the_response_model(app, board_format):
+    state = await played_state(app, board_format)
+
+    body = orjson.loads(app.GameResponse(state).body)
+    assert body == orjson.loads(app.GameState.model_validate(state.model_dump()).model_dump_json())
+
+
+async def test_get_game_serves_the_requested_format(app):
+    game = await played_state(app, "packed")
+
+    packed = orjson.loads((await app.get_game(game.id)).body)
+    assert packed["board"] and packed["grid"] == []
+    legacy = orjson.loads((await app.get_game(game.id, format="legacy")).body)
+    assert legacy["board"] is None
+    assert len(legacy["horizontal_lines"]) == game.live_board().size + 1
+    assert legacy["horizontal_lines"][0][0]["owner"] is not None
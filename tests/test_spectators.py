@@ -0,0 +1,88 @@
+"""Spectators: one encoded frame per game version, shared by every viewer"""
+
+import orjson
+import pytest
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+from tests.conftest import line_move, new_game
+
+
+def drain(viewer):
+    frames = []
+    while not viewer.queue.empty():
+        frames.append(viewer.queue.get_nowait())
+    return frames
+
+
+@pytest.fixture
+def spectators(app, monkeypatch):
+    monkeypatch.setattr(app.spectators, "snapshot_every", 3)
+    monkeypatch.setattr(app.spectators, "queue_size", 8)
+    monkeypatch.setattr(app.spectators, "stats", {"snapshots": 0, "deltas": 0, "skipped": 0})
+    return app.spectators
+
+
+async def play(app, game, moves: int, start: int = 0):
+    for x in range(start, start + moves):
+        current = await app.game_cache.get(game.id)
+        await app.apply_move(game.id, line_move(game.id, current.current_player, True, x % 5, x // 5))
+
+
+@pytest.mark.anyio
+async def test_viewers_share_the_same_frames(app, spectators):
+    game = await new_game(app)
+    viewers = [await spectators.join(game.id) for _ in range(50)]
+    try:
+        await play(app, game, 5)
+        frames = [drain(viewer) for viewer in viewers]
+        assert all(frame == frames[0] for frame in frames)
+        # Every viewer holds the very same strings
+        assert all(a is b for a, b in zip(frames[0], frames[-1]))
+
+        decoded = [orjson.loads(frame) for frame in frames[0]]
+        assert [(frame["type"], frame["version"]) for frame in decoded] == [
+            ("snapshot", 0), ("move", 1), ("move", 2), ("snapshot", 3), ("move", 4), ("move", 5)]
+        assert decoded[3]["game"]["id"] == game.id and decoded[3]["game"]["board"]
+        assert spectators.stats == {"snapshots": 2, "deltas": 4, "skipped": 0}
+    finally:
+        for viewer in viewers:
+            spectators.leave(game.id, viewer)
+    assert spectators.viewer_count() == 0
+
+
+@pytest.mark.anyio
+async def test_slow_viewers_skip_to_the_latest_snapshot(app, spectators, monkeypatch):
+    monkeypatch.setattr(spectators, "snapshot_every", 100)
+    game = await new_game(app)
+    slow = await spectators.join(game.id)
+    fast = await spectators.join(game.id)
+    try:
+        for start in range(0, 12, 4):
+            await play(app, game, 4, start)
+            drain(fast)
+        frames = [orjson.loads(frame) for frame in drain(slow)]
+        assert frames[0]["type"] == "snapshot" and spectators.stats["skipped"] >= 1
+        # After the skip the viewer follows the shared deltas again, up to the latest version
+        assert [frame["version"] for frame in frames] == list(range(frames[0]["version"], 13))
+    finally:
+        spectators.leave(game.id, slow)
+        spectators.leave(game.id, fast)
+
+
+def test_spectate_endpoint_streams_an_online_room(app, spectators):
+    client = TestClient(app.app)
+    game = client.post("/api/games", json={"element": "fire", "mode": "online", "map_size": "small",
+                                           "player_count": 2}).json()
+
+    with client.websocket_connect(f"/api/games/room/{game['room_code']}/spectate") as websocket:
+        snapshot = websocket.receive_json()
+        assert (snapshot["type"], snapshot["version"]) == ("snapshot", 0)
+        client.post(f"/api/games/{game['id']}/join", json={"room_code": game["room_code"], "element": "water"})
+        joined = websocket.receive_json()
+        assert (joined["type"], joined["version"]) == ("join", 1)
+
+    with client.websocket_connect("/api/games/room/NOPE99/spectate") as websocket:
+        with pytest.raises(WebSocketDisconnect) as excinfo:
+            websocket.receive_json()
+    assert excinfo.value.code == 4404
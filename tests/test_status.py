@@ -0,0 +1,49 @@
+"""GET /api/status: keyset pages and the NDJSON stream"""
+
+import orjson
+from fastapi.testclient import TestClient
+
+
+def post_checks(client, count: int):
+    return [client.post("/api/status", json={"client_name": f"probe-{i}"}).json()["id"] for i in range(count)]
+
+
+def test_pages_follow_the_cursor(app):
+    client = TestClient(app.app)
+    ids = post_checks(client, 5)
+
+    seen, pages, params = [], 0, {"limit": 2}
+    while True:
+        response = client.get("/api/status", params=params)
+        assert response.status_code == 200
+        seen += [check["id"] for check in response.json()]
+        pages += 1
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+        params = {"limit": 2, "after": cursor}
+    assert seen == ids
+    assert pages == 3
+    assert set(client.get("/api/status").json()[0]) == {"id", "client_name", "timestamp"}
+
+
+def test_stream_sends_every_check_after_the_cursor(app):
+    client = TestClient(app.app)
+    ids = post_checks(client, 4)
+
+    response = client.get("/api/status", params={"stream": True})
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert [orjson.loads(line)["id"] for line in response.text.splitlines()] == ids
+
+    cursor = client.get("/api/status", params={"limit": 1}).headers["X-Next-Cursor"]
+    rest = client.get("/api/status", params={"stream": True, "after": cursor})
+    assert [orjson.loads(line)["id"] for line in rest.text.splitlines()] == ids[1:]
+
+
+def test_bad_cursors_are_rejected(app):
+    client = TestClient(app.app)
+    post_checks(client, 1)
+
+    assert client.get("/api/status", params={"after": "not-a-cursor"}).status_code == 400
+    assert client.get("/api/status", params={"after": "not-a-cursor", "stream": True}).status_code == 400
+    assert client.get("/api/status", params={"limit": 0}).status_code == 422
@@ -0,0 +1,47 @@
+"""Storage backends: room code uniqueness and batch inserts"""
+
+from datetime import datetime
+
+import pytest
+
+from storage import DuplicateGame
+
+
+pytestmark = pytest.mark.anyio
+
+
+def game_doc(game_id: str, room_code=None, status: str = "active", **extra):
+    return {"id": game_id, "room_code": room_code, "game_status": status, "map_size": "small", "players": [],
+            "max_players": 2, "open_seats": 0, "created_at": datetime.utcnow(), "updated_at": datetime.utcnow(),
+            "version": 0, "move_count": 0, **extra}
+
+
+async def test_games_without_room_code_never_clash(storage):
+    # Local games have no room code; a unique index over null codes once let only one exist
+    await storage.insert_game(game_doc("a"))
+    await storage.insert_game(game_doc("b"))
+    assert await storage.get_game("b") is not None
+
+
+async def test_open_room_codes_are_unique(storage):
+    await storage.insert_game(game_doc("a", "ROOM01", "waiting", open_seats=1))
+    with pytest.raises(DuplicateGame):
+        await storage.insert_game(game_doc("b", "ROOM01", "active"))
+    # Finished games give their code back
+    await storage.insert_game(game_doc("c", "ROOM02", "finished"))
+    await storage.insert_game(game_doc("d", "ROOM02", "waiting", open_seats=1))
+    with pytest.raises(DuplicateGame):
+        await storage.insert_game(game_doc("a", "ROOM03"))
+
+
+async def test_batch_insert_is_all_or_nothing(storage):
+    await storage.insert_game(game_doc("taken", "ROOM01", "waiting", open_seats=1))
+    batch = [game_doc("a", "ROOM02", "waiting"), game_doc("b", "ROOM01", "waiting"), game_doc("c", "ROOM03", "waiting")]
+    with pytest.raises(DuplicateGame) as excinfo:
+        await storage.insert_games(batch)
+    assert excinfo.value.kept == []
+    for game_id in ("a", "b", "c"):
+        assert await storage.get_game(game_id) is None
+
+    await storage.insert_games([game_doc("a", "ROOM02", "waiting"), game_doc("c", "ROOM03", "waiting")])
+    assert [doc["id"] for doc in await storage.get_game_summaries(["a", "c"])] == ["a", "c"]
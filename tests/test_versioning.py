@@ -0,0 +1,103 @@
+"""Optimistic concurrency: versions, compare-and-swap writes and atomic batches"""
+
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+from tests.conftest import line_move, new_game
+
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_update_game_compares_versions(app):
+    game = await new_game(app)
+    assert await app.storage.update_game(game.id, 0, {"version": 1, "current_player": 1})
+    # A second writer that read version 0 loses
+    assert not await app.storage.update_game(game.id, 0, {"version": 1, "current_player": 0})
+    doc = await app.storage.get_game(game.id)
+    assert (doc["version"], doc["current_player"]) == (1, 1)
+
+
+async def test_stale_cache_gets_409_and_logs_nothing(app):
+    game = await new_game(app)
+    # Another worker writes the game behind this worker's cached copy
+    assert await app.storage.update_game(game.id, 0, {"version": 1})
+
+    with pytest.raises(HTTPException) as excinfo:
+        await app.apply_move(game.id, line_move(game.id, 0, True, 0, 0))
+    assert excinfo.value.status_code == 409
+    # The failed write left no move log entry behind for the retry to collide with
+    assert await app.storage.list_moves(game.id, 0, 10) == []
+
+    result = await app.apply_move(game.id, line_move(game.id, 0, True, 0, 0))
+    assert result["version"] == 2
+    assert [move["seq"] for move in await app.storage.list_moves(game.id, 0, 10)] == [1]
+
+
+async def test_expected_version_is_checked(app):
+    game = await new_game(app)
+    with pytest.raises(HTTPException) as excinfo:
+        await app.apply_move(game.id, line_move(game.id, 0, True, 0, 0), expected_version=3)
+    assert excinfo.value.status_code == 409
+    await app.apply_move(game.id, line_move(game.id, 0, True, 0, 0), expected_version=0)
+
+
+async def test_concurrent_moves_serialize(app):
+    game = await new_game(app)
+    # Both are player 0's move; only the first one in is still their turn
+    results = await asyncio.gather(
+        app.apply_move(game.id, line_move(game.id, 0, True, 0, 0)),
+        app.apply_move(game.id, line_move(game.id, 0, True, 1, 0)),
+        return_exceptions=True,
+    )
+    assert results[0]["version"] == 1
+    assert isinstance(results[1], HTTPException) and results[1].status_code == 400
+    doc = await app.storage.get_game(game.id)
+    assert (doc["version"], doc["move_count"]) == (1, 1)
+
+
+async def test_batch_is_all_or_nothing(app):
+    game = await new_game(app)
+    board_before = game.board_bytes()
+    moves = [line_move(game.id, 0, True, 0, 0), line_move(game.id, 1, True, 0, 0)]  # the line is taken by then
+
+    with pytest.raises(HTTPException) as excinfo:
+        await app.apply_moves(game.id, moves)
+    assert excinfo.value.status_code == 400
+    assert excinfo.value.detail.startswith("Move 1:")
+
+    cached = await app.game_cache.get(game.id)
+    assert (cached.version, cached.move_count) == (0, 0)
+    assert cached.board_bytes() == board_before
+    assert cached.live_board().line_owner(True, 0, 0) is None
+    doc = await app.storage.get_game(game.id)
+    assert (doc["version"], doc["move_count"]) == (0, 0)
+    assert await app.storage.list_moves(game.id, 0, 10) == []
+
+
+def test_if_match_and_etag(app):
+    # No lifespan: the fixture owns the store and closes it
+    client = TestClient(app.app)
+    game = client.post("/api/games", json={"element": "fire", "mode": "online", "map_size": "small",
+                                           "player_count": 2}).json()
+    joined = client.post(f"/api/games/{game['id']}/join", headers={"If-Match": '"0"'},
+                         json={"room_code": game["room_code"], "element": "water"})
+    assert joined.status_code == 200 and joined.json()["version"] == 1
+
+    status = client.get(f"/api/games/{game['id']}/status")
+    assert status.headers["ETag"] == '"1"'
+    assert client.get(f"/api/games/{game['id']}/status", headers={"If-None-Match": 'W/"1"'}).status_code == 304
+
+    move = {"game_id": game["id"], "player_id": 0, "move_type": "line",
+            "data": {"is_horizontal": True, "x": 0, "y": 0}}
+    stale = client.post(f"/api/games/{game['id']}/move", headers={"If-Match": '"0"'}, json=move)
+    assert stale.status_code == 409
+    assert client.post(f"/api/games/{game['id']}/move", headers={"If-Match": "nope"}, json=move).status_code == 400
+    moved = client.post(f"/api/games/{game['id']}/move", headers={"If-Match": 'W/"1"'}, json=move)
+    assert moved.status_code == 200 and moved.json()["version"] == 2
+
+    status = client.get(f"/api/games/{game['id']}/status", headers={"If-None-Match": '"1"'})
+    assert status.status_code == 200 and status.headers["ETag"] == '"2"'